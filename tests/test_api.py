@@ -0,0 +1,129 @@
+"""video_api บน localhost (port 0) โดยแทน process_single_video ด้วยงานปลอม ไม่ต้องใช้ ffmpeg"""
+import http.client
+import json
+import threading
+import time
+
+import pytest
+
+import video_api
+from video_api import ApiServer, JobManager
+from video_converter_core import STATUS_CANCELLED, STATUS_SUCCESS, JobResult
+
+
+def fake_process_single_video(input_path, output_folder, reduction_percent, message_queue, stop_event, *args):
+    message_queue.put(("file_progress", input_path, 50))
+    if 'slow' in input_path:
+        # งานยาว: รอจนถูกยกเลิก
+        stop_event.wait(10)
+        return JobResult(input_path=input_path, status=STATUS_CANCELLED, message="⚠️ ยกเลิก")
+    return JobResult(input_path=input_path, status=STATUS_SUCCESS, message="✅ สำเร็จ", duration=10.0,
+                     input_size=1000, output_size=400)
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    monkeypatch.setattr(video_api, 'process_single_video', fake_process_single_video)
+    manager = JobManager({}, output_folder=str(tmp_path / 'out'))
+    api = ApiServer(('127.0.0.1', 0), manager)
+    thread = threading.Thread(target=api.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    yield api
+    api.shutdown()
+    api.server_close()
+    manager.shutdown()
+
+
+def request(api, method, path, body=None):
+    conn = http.client.HTTPConnection('127.0.0.1', api.server_address[1], timeout=5)
+    try:
+        conn.request(method, path, body=json.dumps(body) if body is not None else None)
+        response = conn.getresponse()
+        data = response.read().decode('utf-8')
+        return response.status, response.getheader('Content-Type'), data
+    finally:
+        conn.close()
+
+
+def wait_for_state(api, job_id, state):
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        status, _, data = request(api, 'GET', f'/jobs/{job_id}')
+        job = json.loads(data)
+        if job['state'] == state:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"งาน {job_id} ไม่ถึงสถานะ {state}: {job['state']}")
+
+
+def make_input(tmp_path, name):
+    path = tmp_path / name
+    path.write_bytes(b'0' * 1000)
+    return str(path)
+
+
+def read_event(response):
+    event = {}
+    while True:
+        line = response.fp.readline().decode('utf-8').rstrip('\n')
+        if not line:
+            if event:
+                return event
+            continue
+        if line.startswith(':'):
+            continue
+        key, _, value = line.partition(': ')
+        event[key] = value
+
+
+def test_submit_status_metrics_and_events(server, tmp_path):
+    events = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=5)
+    events.request('GET', '/events')
+    stream = events.getresponse()
+    assert stream.status == 200
+    assert stream.getheader('Content-Type').startswith('text/event-stream')
+
+    # รอให้ handler ของ /events subscribe ก่อนส่งงาน
+    deadline = time.monotonic() + 5
+    while not server.manager._subscribers and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    status, content_type, data = request(server, 'POST', '/jobs', {'input': make_input(tmp_path, 'clip.mp4'), 'reduction': 40})
+    assert status == 201 and content_type.startswith('application/json')
+    job = json.loads(data)
+    assert job['reduction'] == 40
+
+    event = read_event(stream)
+    assert event['event'] == 'job'
+    assert json.loads(event['data'])['id'] == job['id']
+    events.close()
+
+    done = wait_for_state(server, job['id'], STATUS_SUCCESS)
+    assert done['result']['output_size'] == 400
+
+    status, content_type, metrics = request(server, 'GET', '/metrics')
+    assert status == 200 and content_type.startswith('text/plain; version=0.0.4')
+    lines = metrics.splitlines()
+    assert '# TYPE vbr_jobs_finished_total counter' in lines
+    assert 'vbr_jobs_finished_total{status="success"} 1' in lines
+    assert 'vbr_bytes_saved_total 600' in lines
+    assert 'vbr_jobs_in_flight 0' in lines
+
+
+def test_cancel_running_job(server, tmp_path):
+    status, _, data = request(server, 'POST', '/jobs', {'input': make_input(tmp_path, 'slow.mp4')})
+    job_id = json.loads(data)['id']
+    wait_for_state(server, job_id, video_api.JOB_RUNNING)
+
+    status, _, data = request(server, 'DELETE', f'/jobs/{job_id}')
+    assert status == 200
+    wait_for_state(server, job_id, STATUS_CANCELLED)
+    assert request(server, 'DELETE', '/jobs/999')[0] == 404
+
+
+@pytest.mark.parametrize("reduction", [0, 100, -5, 150, 'abc'])
+def test_invalid_reduction_rejected(server, tmp_path, reduction):
+    status, _, data = request(server, 'POST', '/jobs', {'input': make_input(tmp_path, 'clip.mp4'), 'reduction': reduction})
+    assert status == 400
+    assert 'reduction' in json.loads(data)['error']
+    assert server.manager.jobs() == []
@@ -0,0 +1,62 @@
+"""AsyncEngine: encode แบบแบ่งช่วงนับจำนวนช่วงเป็น slot ของ STEP_ENCODE"""
+import asyncio
+import functools
+import threading
+import time
+
+import video_async
+from video_async import AsyncEngine
+from video_converter_core import STEP_ENCODE
+
+
+class _Usage:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.max_parallel = []
+
+    def run(self, units):
+        with self.lock:
+            self.running += units
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= units
+
+
+def _job(step):
+    yield STEP_ENCODE, step
+    return 'done'
+
+
+def _run_jobs(monkeypatch, encode_workers, segments, singles):
+    usage = _Usage()
+
+    def fake_segmented(segments, max_parallel=None):
+        usage.max_parallel.append(max_parallel)
+        usage.run(max_parallel)
+
+    monkeypatch.setattr(video_async, 'encode_segmented', fake_segmented)
+
+    async def main():
+        engine = AsyncEngine(encode_workers)
+        jobs = [engine.run_job(_job(functools.partial(fake_segmented, segments=segments)))]
+        jobs += [engine.run_job(_job(functools.partial(usage.run, 1))) for _ in range(singles)]
+        return await asyncio.gather(*jobs)
+
+    return asyncio.run(main()), usage
+
+
+def test_segmented_encode_holds_one_slot_per_segment(monkeypatch):
+    results, usage = _run_jobs(monkeypatch, encode_workers=4, segments=3, singles=4)
+    assert results == ['done'] * 5
+    assert usage.max_parallel == [3]
+    assert usage.peak <= 4
+
+
+def test_segments_capped_at_encode_limit(monkeypatch):
+    results, usage = _run_jobs(monkeypatch, encode_workers=2, segments=8, singles=3)
+    assert results == ['done'] * 4
+    assert usage.max_parallel == [2]
+    assert usage.peak <= 2
@@ -0,0 +1,66 @@
+"""compare_results ของ video_benchmark (ไม่ต้องใช้ ffmpeg)"""
+import pytest
+
+from video_benchmark import COMPARE_METRICS, compare_results, config_key
+
+BASE_METRICS = {'wall_seconds': 100.0, 'realtime_factor': 4.0, 'cpu_seconds': 300.0,
+                'peak_rss_mb': 200.0, 'output_bytes': 1_000_000}
+
+
+def config(preset='basic', workers=2, encoder='libx264', **values):
+    return dict({'preset': preset, 'workers': workers, 'encoder': encoder}, **values)
+
+
+def results(*configs):
+    return {'configs': list(configs)}
+
+
+def scaled(metric, factor):
+    return config(**dict(BASE_METRICS, **{metric: BASE_METRICS[metric] * factor}))
+
+
+def test_identical_results_have_no_regression():
+    assert compare_results(results(config(**BASE_METRICS)), results(config(**BASE_METRICS))) == []
+
+
+@pytest.mark.parametrize("metric, higher_is_worse", COMPARE_METRICS)
+def test_threshold_direction(metric, higher_is_worse):
+    baseline = results(config(**BASE_METRICS))
+    worse, better = (1.2, 0.8) if higher_is_worse else (0.8, 1.2)
+
+    regressions = compare_results(baseline, results(scaled(metric, worse)), threshold=10)
+    assert [(key, name) for key, name, *_ in regressions] == [('basic|2|libx264', metric)]
+    key, name, old, new, change = regressions[0]
+    assert old == BASE_METRICS[metric] and new == pytest.approx(BASE_METRICS[metric] * worse)
+    assert change == pytest.approx((worse - 1) * 100)
+
+    # ดีขึ้น หรือแย่ลงไม่เกิน threshold ไม่นับเป็น regression
+    assert compare_results(baseline, results(scaled(metric, better)), threshold=10) == []
+    slightly = 1.05 if higher_is_worse else 0.95
+    assert compare_results(baseline, results(scaled(metric, slightly)), threshold=10) == []
+
+
+def test_error_in_current_is_regression():
+    regressions = compare_results(results(config(**BASE_METRICS)), results(config(error='ffmpeg crashed')))
+    assert regressions == [('basic|2|libx264', 'error', None, None, None)]
+
+
+def test_error_in_baseline_is_ignored():
+    assert compare_results(results(config(error='ffmpeg crashed')), results(config(**BASE_METRICS))) == []
+
+
+def test_config_missing_from_baseline_is_ignored():
+    baseline = results(config(**BASE_METRICS))
+    current = results(config(**BASE_METRICS), config(workers=8, error='ffmpeg crashed'),
+                      config(preset='quality', **dict(BASE_METRICS, wall_seconds=1000.0)))
+    assert compare_results(baseline, current) == []
+
+
+def test_missing_or_zero_baseline_metric_is_skipped():
+    baseline = results(config(**dict(BASE_METRICS, cpu_seconds=0, peak_rss_mb=None)))
+    current = results(config(**dict(BASE_METRICS, cpu_seconds=50.0, peak_rss_mb=500.0)))
+    assert compare_results(baseline, current) == []
+
+
+def test_config_key():
+    assert config_key(config()) == 'basic|2|libx264'
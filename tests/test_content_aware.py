@@ -0,0 +1,54 @@
+"""content-aware: sample encode ย่อภาพเหมือน output จริง (max_height)"""
+import subprocess
+
+import video_converter_core as core
+import video_quality
+from video_converter_core import QualityCache, VideoMetadata
+from video_encoders import ENCODER_BACKENDS
+
+
+def test_samples_use_job_scale(tmp_path, monkeypatch):
+    input_path = tmp_path / 'clip.mp4'
+    input_path.write_bytes(b'0' * 1000)
+    commands = []
+
+    def fake_run(command, timeout):
+        commands.append(command)
+        return subprocess.CompletedProcess(command, 0, '', 'SSIM Y:0.99 U:0.99 V:0.99 All:0.990 (20.0)')
+
+    monkeypatch.setattr(video_quality, '_run', fake_run)
+    monkeypatch.setattr(core, 'has_filter', lambda ffmpeg, name: False)
+    monkeypatch.setattr(core, 'QUALITY_CACHE', QualityCache(str(tmp_path / 'quality_cache.json')))
+    metadata = VideoMetadata(duration=60.0, video_bitrate=20_000_000, width=3840, height=2160, size=1000)
+    settings = {"max_height": 1080, "quality_metric": 'ssim', "quality_target": 0.98}
+
+    choice = core.content_aware_bitrate(str(input_path), metadata, ENCODER_BACKENDS['libx264'], settings)
+
+    assert choice is not None and choice['met']
+    encodes = [c for c in commands if '-c:v' in c]
+    compares = [c for c in commands if '-lavfi' in c]
+    assert encodes and compares
+    for command in encodes:
+        assert command[command.index('-vf') + 1] == 'scale=1920:1080:flags=fast_bilinear'
+    for command in compares:
+        assert '[1:v]scale=1920:1080,setpts=PTS-STARTPTS[r]' in command[command.index('-lavfi') + 1]
+
+
+def test_samples_without_scaling_keep_size(tmp_path, monkeypatch):
+    input_path = tmp_path / 'clip.mp4'
+    input_path.write_bytes(b'0' * 1000)
+    commands = []
+
+    def fake_run(command, timeout):
+        commands.append(command)
+        return subprocess.CompletedProcess(command, 0, '', 'SSIM All:0.990 (20.0)')
+
+    monkeypatch.setattr(video_quality, '_run', fake_run)
+    monkeypatch.setattr(core, 'QUALITY_CACHE', QualityCache(str(tmp_path / 'quality_cache.json')))
+    metadata = VideoMetadata(duration=60.0, video_bitrate=8_000_000, width=1280, height=720, size=1000)
+
+    core.content_aware_bitrate(str(input_path), metadata, ENCODER_BACKENDS['libx264'],
+                               {"max_height": 1080, "quality_metric": 'ssim'})
+
+    assert all('-vf' not in c for c in commands)
+    assert all('scale=' not in ' '.join(c) for c in commands)
@@ -0,0 +1,38 @@
+"""โฟลเดอร์ที่ไม่มีไฟล์วิดีโอได้สรุปว่างเหมือนกันทุกโหมด (ไม่ใช่ข้อผิดพลาดในการตั้งค่า)"""
+import asyncio
+import queue
+
+import pytest
+
+import video_converter_core as core
+from video_async import convert_async
+from video_encoders import ENCODER_BACKENDS
+
+
+@pytest.fixture
+def empty_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(core, 'get_encoder', lambda settings=None: ENCODER_BACKENDS['libx264'])
+    folder = tmp_path / 'in'
+    (folder / 'sub').mkdir(parents=True)
+    (folder / 'notes.txt').write_text('not a video')
+    return folder
+
+
+@pytest.mark.parametrize("recursive", [False, True])
+def test_start_conversion_empty(empty_folder, tmp_path, recursive):
+    summary = core.start_conversion(str(empty_folder), str(tmp_path / 'out'), 30, 2, queue.Queue(),
+                                    recursive=recursive, resume=False)
+    assert summary is not None
+    assert summary['total'] == 0 and summary['failed'] == 0 and summary['results'] == []
+
+
+@pytest.mark.parametrize("recursive", [False, True])
+def test_convert_async_empty(empty_folder, tmp_path, recursive):
+    summary = asyncio.run(convert_async(str(empty_folder), str(tmp_path / 'out'), 30, 2, queue.Queue(),
+                                        recursive=recursive, resume=False))
+    assert summary is not None
+    assert summary['total'] == 0 and summary['failed'] == 0 and summary['results'] == []
+
+
+def test_invalid_setup_still_returns_none(tmp_path):
+    assert core.start_conversion(str(tmp_path / 'missing'), '', 30, 2, queue.Queue()) is None
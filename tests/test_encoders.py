@@ -0,0 +1,21 @@
+"""arguments ของ thread และ two-pass ของ encoder บน CPU"""
+from video_encoders import ENCODER_BACKENDS
+
+
+def test_x264_two_pass_uses_passlogfile():
+    args = ENCODER_BACKENDS['libx264'].encode_args({}, 2_000_000, 4, 1, 'passlog')
+    assert args[-6:] == ['-threads', '4', '-pass', '1', '-passlogfile', 'passlog']
+
+
+def test_x265_two_pass_in_x265_params():
+    args = ENCODER_BACKENDS['libx265'].encode_args({}, 2_000_000, 4, 2, 'passlog')
+    assert '-pass' not in args
+    assert args[-2:] == ['-x265-params', 'pools=4:pass=2:stats=passlog.log']
+
+
+def test_svtav1_is_single_pass():
+    # ffmpeg ส่ง -svtav1-params ให้ library ซึ่งไม่รู้จัก passes/pass/stats
+    svtav1 = ENCODER_BACKENDS['libsvtav1']
+    assert not svtav1.supports_two_pass
+    assert svtav1.encode_args({}, 2_000_000, 4)[-2:] == ['-svtav1-params', 'lp=4']
+    assert '-svtav1-params' not in svtav1.encode_args({}, 2_000_000)
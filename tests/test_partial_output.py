@@ -0,0 +1,31 @@
+"""ไฟล์ .partial ที่ค้างจากรอบก่อนถูกลบก่อนเริ่มงาน"""
+import os
+
+import video_converter_core as core
+from video_converter_core import FfmpegRun, VideoMetadata, STATUS_FAILED, partial_output_path
+from video_encoders import ENCODER_BACKENDS
+
+
+def test_stale_partial_removed_before_job(tmp_path, monkeypatch):
+    input_path = tmp_path / 'clip.mp4'
+    input_path.write_bytes(b'0' * 1000)
+    output_folder = tmp_path / 'out'
+    output_folder.mkdir()
+    stale = partial_output_path(str(output_folder / 'clip.mp4'))
+    with open(stale, 'wb') as f:
+        f.write(b'stale')
+    seen = []
+
+    def fake_run_ffmpeg(command, *args, **kwargs):
+        seen.append(os.path.exists(stale))
+        return FfmpegRun(returncode=1, stderr='Conversion failed!')
+
+    monkeypatch.setattr(core, 'get_encoder', lambda settings=None: ENCODER_BACKENDS['libx264'])
+    monkeypatch.setattr(core, 'run_ffmpeg', fake_run_ffmpeg)
+    metadata = VideoMetadata(duration=10.0, video_codec='h264', video_bitrate=8_000_000, width=1280, height=720, size=1000)
+
+    result = core.process_single_video(str(input_path), str(output_folder), 50, encoding_settings={}, metadata=metadata)
+
+    assert result.status == STATUS_FAILED
+    assert seen == [False]
+    assert os.listdir(output_folder) == []
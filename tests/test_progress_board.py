@@ -0,0 +1,26 @@
+"""ProgressBoard: ความคืบหน้ารายไฟล์ของ GUI"""
+import os
+import queue
+
+from video_converter_core import ProgressBoard, STATUS_FAILED
+
+
+def test_same_name_in_different_folders_kept_apart():
+    board = ProgressBoard(queue.Queue())
+    first, second = os.path.join('a', 'clip.mp4'), os.path.join('b', 'clip.mp4')
+    board.put(("file_progress", first, 10))
+    board.put(("file_progress", second, 70))
+    board.put(("file_progress", first, 20))
+    assert board.take_changes() == {first: 20, second: 70}
+    assert board.take_changes() == {}
+
+
+def test_file_done_drops_pending_progress_and_is_forwarded():
+    message_queue = queue.Queue()
+    board = ProgressBoard(message_queue)
+    board.put(("file_progress", 'clip.mp4', 40))
+    board.put(("file_done", 'clip.mp4', STATUS_FAILED))
+    board.put(("text", "log\n", None))
+    assert board.take_changes() == {}
+    assert message_queue.get_nowait() == ("file_done", 'clip.mp4', STATUS_FAILED)
+    assert message_queue.get_nowait() == ("text", "log\n", None)
@@ -0,0 +1,143 @@
+"""การย่อภาพ (scaled_size/plan_scale), filter chain ของ VAAPI และการ encode ใหม่ด้วย libx264 เมื่อ hardware encoder ใช้ไม่ได้"""
+import os
+
+import pytest
+
+import video_converter_core as core
+from video_converter_core import FfmpegRun, VideoMetadata, STATUS_FAILED, STATUS_SUCCESS
+from video_encoders import ENCODER_BACKENDS, scaled_size
+
+
+@pytest.mark.parametrize("width, height, max_height, expected", [
+    (3840, 2160, 1080, (1920, 1080)),
+    (1080, 1920, 720, (720, 1280)),       # แนวตั้ง: ใช้ด้านสั้น
+    (1998, 1080, 720, (1332, 720)),
+    (1001, 753, 480, (638, 480)),         # ขนาดคี่ → ปัดเป็นเลขคู่
+    (1280, 720, 1080, None),              # เล็กกว่าอยู่แล้ว ไม่ขยาย
+    (1920, 1080, 1080, None),
+    (1920, 1080, None, None),
+    (None, 1080, 720, None),
+])
+def test_scaled_size(width, height, max_height, expected):
+    assert scaled_size(width, height, max_height) == expected
+
+
+def test_scaled_size_is_even():
+    for width, height in [(1001, 753), (777, 555), (4095, 2161)]:
+        w, h = scaled_size(width, height, 481)
+        assert w % 2 == 0 and h % 2 == 0
+
+
+def test_plan_scale_gpu_and_cpu(monkeypatch):
+    metadata = VideoMetadata(width=3840, height=2160)
+    vaapi = ENCODER_BACKENDS['h264_vaapi']
+    monkeypatch.setattr(core, 'has_filter', lambda ffmpeg, name: True)
+
+    settings = core.plan_scale(metadata, vaapi, {"max_height": 1080})
+    assert settings["scale_size"] == (1920, 1080)
+    assert settings["scale_on_gpu"] is True
+
+    settings = core.plan_scale(metadata, vaapi, {"max_height": 1080, "scaler": 'cpu'})
+    assert settings["scale_on_gpu"] is False
+
+    # libx264 ไม่มี filter ย่อบน GPU
+    settings = core.plan_scale(metadata, ENCODER_BACKENDS['libx264'], {"max_height": 1080})
+    assert settings["scale_on_gpu"] is False
+
+    # ffmpeg build นี้ไม่มี scale_vaapi
+    monkeypatch.setattr(core, 'has_filter', lambda ffmpeg, name: False)
+    assert core.plan_scale(metadata, vaapi, {"max_height": 1080})["scale_on_gpu"] is False
+
+
+def test_plan_scale_without_scaling():
+    settings = {"max_height": 1080}
+    assert core.plan_scale(VideoMetadata(width=1280, height=720), ENCODER_BACKENDS['libx264'], settings) is settings
+
+
+def test_vaapi_gpu_scale_chain():
+    vaapi = ENCODER_BACKENDS['h264_vaapi']
+    settings = {"scale_size": (1920, 1080), "scale_on_gpu": True}
+    assert vaapi.input_args(settings)[:2] == ['-hwaccel', 'vaapi']
+    assert '-hwaccel_output_format' in vaapi.input_args(settings)
+    args = vaapi.output_args(settings, 4_000_000)
+    assert args[args.index('-vf') + 1] == 'scale_vaapi=w=1920:h=1080'
+
+
+def test_vaapi_cpu_scale_chain():
+    vaapi = ENCODER_BACKENDS['h264_vaapi']
+    settings = {"scale_size": (1280, 720), "scale_on_gpu": False}
+    assert vaapi.input_args(settings)[0] == '-vaapi_device'
+    args = vaapi.output_args(settings, 4_000_000)
+    # ย่อบน CPU แล้วแปลงเป็น nv12 และ upload ไป GPU ใน -vf เดียว
+    assert args.count('-vf') == 1
+    assert args[args.index('-vf') + 1] == 'scale=1280:720:flags=fast_bilinear,format=nv12,hwupload'
+
+
+def test_vaapi_without_scaling_still_uploads():
+    args = ENCODER_BACKENDS['h264_vaapi'].output_args({}, 4_000_000)
+    assert args[args.index('-vf') + 1] == 'format=nv12,hwupload'
+
+
+def test_hardware_failure_falls_back_to_libx264(tmp_path, monkeypatch):
+    input_path = tmp_path / 'in' / 'clip.mp4'
+    input_path.parent.mkdir()
+    input_path.write_bytes(b'0' * 1000)
+    output_folder = tmp_path / 'out'
+    metadata = VideoMetadata(duration=10.0, format_bitrate=20_000_000, video_codec='h264',
+                             video_bitrate=16_000_000, width=3840, height=2160, size=1000)
+    commands = []
+
+    def fake_run_ffmpeg(command, *args, **kwargs):
+        commands.append(command)
+        if '-c:v' in command and command[command.index('-c:v') + 1] == 'h264_vaapi':
+            return FfmpegRun(returncode=1, stderr='Failed to initialise VAAPI connection')
+        with open(command[-1], 'wb') as f:
+            f.write(b'1' * 100)
+        return FfmpegRun(returncode=0, speed=2.0)
+
+    monkeypatch.setattr(core, 'get_encoder', lambda settings=None: ENCODER_BACKENDS['h264_vaapi'])
+    monkeypatch.setattr(core, 'has_filter', lambda ffmpeg, name: True)
+    monkeypatch.setattr(core, 'run_ffmpeg', fake_run_ffmpeg)
+
+    result = core.process_single_video(str(input_path), str(output_folder), 50,
+                                       encoding_settings={"max_height": 1080, "encoder": 'h264_vaapi'},
+                                       metadata=metadata)
+
+    assert result.status == STATUS_SUCCESS
+    codecs = [command[command.index('-c:v') + 1] for command in commands]
+    # GPU scale → CPU scale (ยัง VAAPI) → libx264
+    assert codecs == ['h264_vaapi', 'h264_vaapi', 'libx264']
+    last = commands[-1]
+    assert '-hwaccel' not in last and '-vaapi_device' not in last
+    assert last[last.index('-vf') + 1] == 'scale=1920:1080:flags=fast_bilinear'
+    assert 'libx264' in result.message
+    assert os.listdir(output_folder) == [os.path.basename(result.output_path)]
+    assert os.path.getsize(result.output_path) == 100
+
+
+def test_corrupt_input_does_not_fall_back(tmp_path, monkeypatch):
+    input_path = tmp_path / 'in' / 'clip.mp4'
+    input_path.parent.mkdir()
+    input_path.write_bytes(b'0' * 1000)
+    output_folder = tmp_path / 'out'
+    metadata = VideoMetadata(duration=10.0, format_bitrate=20_000_000, video_codec='h264',
+                             video_bitrate=16_000_000, width=3840, height=2160, size=1000)
+    commands = []
+
+    def fake_run_ffmpeg(command, *args, **kwargs):
+        commands.append(command)
+        return FfmpegRun(returncode=1, stderr='[mov,mp4] moov atom not found\nInvalid data found when processing input')
+
+    monkeypatch.setattr(core, 'get_encoder', lambda settings=None: ENCODER_BACKENDS['h264_vaapi'])
+    monkeypatch.setattr(core, 'has_filter', lambda ffmpeg, name: True)
+    monkeypatch.setattr(core, 'run_ffmpeg', fake_run_ffmpeg)
+
+    result = core.process_single_video(str(input_path), str(output_folder), 50,
+                                       encoding_settings={"max_height": 1080, "encoder": 'h264_vaapi'},
+                                       metadata=metadata)
+
+    # ไฟล์เสีย: รัน ffmpeg ครั้งเดียว และรายงาน error ของครั้งนั้น
+    assert result.status == STATUS_FAILED
+    assert len(commands) == 1
+    assert 'Invalid data found when processing input' in result.message
+    assert os.listdir(output_folder) == []
@@ -0,0 +1,27 @@
+"""เกณฑ์การข้ามไฟล์ (get_skip_reason)"""
+from video_converter_core import (
+    METHOD_COPY, METHOD_ENCODE, METHOD_REMUX, SkipPolicy, VideoMetadata, get_skip_reason,
+)
+
+METADATA = VideoMetadata(duration=100.0, video_bitrate=8_000_000, size=100_000_000)
+
+
+def test_min_savings_skips_small_encode_savings(tmp_path):
+    policy = SkipPolicy(min_savings_percent=20)
+    output = str(tmp_path / 'out.mp4')
+    assert get_skip_reason(policy, 'in.mp4', output, METADATA, 7_600_000, METHOD_ENCODE)
+    assert get_skip_reason(policy, 'in.mp4', output, METADATA, 4_000_000, METHOD_ENCODE) is None
+
+
+def test_min_savings_ignores_copy_and_remux(tmp_path):
+    # stream copy/remux ใช้ bitrate เดิม (ประหยัด ~0%) แต่ไม่ควรถูกข้ามด้วยเกณฑ์นี้
+    policy = SkipPolicy(min_savings_percent=20)
+    output = str(tmp_path / 'out.mp4')
+    for method in (METHOD_COPY, METHOD_REMUX):
+        assert get_skip_reason(policy, 'in.mp4', output, METADATA, METADATA.video_bitrate, method) is None
+
+
+def test_min_bitrate_applies_to_every_method(tmp_path):
+    policy = SkipPolicy(min_bitrate_bps=10_000_000)
+    output = str(tmp_path / 'out.mp4')
+    assert get_skip_reason(policy, 'in.mp4', output, METADATA, METADATA.video_bitrate, METHOD_COPY)
@@ -0,0 +1,26 @@
+"""การอัปโหลดที่ไม่สำเร็จคืนพื้นที่ scratch ที่จองไว้"""
+import shutil
+
+import video_staging
+from video_staging import ScratchStager
+
+
+def test_failed_upload_releases_reservation(tmp_path, monkeypatch):
+    stager = ScratchStager(str(tmp_path / 'scratch'), max_bytes=10_000, prefetch_depth=0)
+    output_path = str(tmp_path / 'out' / 'clip.mp4')
+    local_path = stager.scratch_output_path(output_path)
+    with open(local_path, 'wb') as f:
+        f.write(b'0' * 1000)
+
+    def fail_copy(src, dst):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(video_staging.shutil, 'copyfile', fail_copy)
+    stager.upload(local_path, output_path)
+    stats = stager.close()
+    monkeypatch.setattr(video_staging.shutil, 'copyfile', shutil.copyfile)
+
+    assert stats['upload_failed'] == 1
+    assert stager._used == 0
+    assert stager.upload_result(output_path) == (True, 'disk full')
+    shutil.rmtree(stager.root, ignore_errors=True)
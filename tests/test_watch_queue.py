@@ -0,0 +1,50 @@
+"""JobQueue ของ watch-folder daemon (SQLite)"""
+import sqlite3
+
+import video_watch
+from video_watch import JOB_RUNNING, JobQueue
+
+
+def test_claim_order_by_priority(tmp_path):
+    queue = JobQueue(str(tmp_path / 'queue.sqlite'))
+    for name, priority in [('a.mp4', 0), ('b.mp4', 10), ('c.mp4', 0)]:
+        path = tmp_path / name
+        path.write_bytes(b'0')
+        assert queue.enqueue(str(path), priority)
+    claimed = [queue.claim().input_path for _ in range(3)]
+    assert claimed == [str(tmp_path / name) for name in ('b.mp4', 'a.mp4', 'c.mp4')]
+    assert queue.claim() is None
+    queue.close()
+
+
+def test_claim_returns_none_while_database_locked(tmp_path, monkeypatch):
+    monkeypatch.setattr(video_watch, 'DB_BUSY_TIMEOUT', 0.1)
+    db_path = str(tmp_path / 'queue.sqlite')
+    queue = JobQueue(db_path)
+    path = tmp_path / 'a.mp4'
+    path.write_bytes(b'0')
+    queue.enqueue(str(path))
+
+    # process อื่น (เช่น `video_watch.py add`) ถือ write lock ไว้
+    other = sqlite3.connect(db_path, isolation_level=None)
+    other.execute('BEGIN IMMEDIATE')
+    assert queue.claim() is None
+    other.execute('COMMIT')
+    other.close()
+
+    job = queue.claim()
+    assert job.input_path == str(path) and job.state == JOB_RUNNING and job.attempts == 1
+    queue.close()
+
+
+def test_run_rejects_out_of_range_reduction(tmp_path, capsys):
+    for reduction in ('0', '100', '150'):
+        assert video_watch.main(['run', str(tmp_path), '-r', reduction]) == video_watch.EXIT_SETUP_ERROR
+        assert '--reduction' in capsys.readouterr().err
+
+
+def test_run_accepts_skip_options(tmp_path):
+    args = video_watch.build_parser().parse_args(['run', str(tmp_path), '--incremental', '--min-bitrate', '2000',
+                                                  '--min-savings', '15'])
+    policy = video_watch.skip_policy_from_args(args)
+    assert policy.skip_existing and policy.min_bitrate_bps == 2_000_000 and policy.min_savings_percent == 15
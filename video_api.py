@@ -0,0 +1,419 @@
+"""HTTP/JSON API สำหรับสั่งงานจากโปรแกรมอื่นบนเครื่องเดียวกัน (ค่าเริ่มต้นฟังเฉพาะ 127.0.0.1)
+
+    POST   /jobs              {"input": "...", "output": "...", "reduction": 30, "preset": "balanced", "settings": {...}}
+    GET    /jobs              รายการงานทั้งหมด
+    GET    /jobs/<id>         สถานะของงาน (รวม JobResult เมื่อจบ)
+    DELETE /jobs/<id>         ยกเลิกงาน (งานที่รออยู่จะไม่เริ่ม, งานที่กำลังแปลงจะหยุด ffmpeg)
+    GET    /events            Server-Sent Events: job, progress, log
+    GET    /metrics           Prometheus text format
+
+ตัวอย่าง:
+    python video_api.py --port 8765 -w 2 -p balanced
+    curl -X POST localhost:8765/jobs -d '{"input": "/data/clip.mp4", "settings": {"target_size_mb": 25}}'
+    curl -N localhost:8765/events
+"""
+import argparse
+import itertools
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from video_converter_cli import (EXIT_OK, EXIT_SETUP_ERROR, add_encoding_arguments, encoding_settings_from_args,
+                                 resolve_preset)
+from video_converter_core import (PRESETS, STATUS_CANCELLED, STATUS_FAILED, STATUS_SUCCESS, BatchProgress, JobResult,
+                                  get_encoder, process_single_video, PROBE_CACHE, QUALITY_CACHE)
+from video_scheduler import ThreadBudget
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+# งานที่จบแล้วใช้ status ของ JobResult (success/failed/skipped/cancelled)
+
+# ส่ง comment ใน SSE ทุกกี่วินาทีเพื่อให้ proxy/client ไม่ตัดการเชื่อมต่อ
+SSE_KEEPALIVE_SECONDS = 15.0
+# จำนวน event ที่ค้างได้ต่อ client (client ที่อ่านช้าจะพลาด event เก่าแทนที่จะทำให้ server ช้า)
+SSE_BUFFER_EVENTS = 1000
+MAX_REQUEST_BYTES = 1024 * 1024
+
+
+class ApiJob:
+    """งานหนึ่งงานที่ส่งผ่าน API พร้อม stop_event ของตัวเอง"""
+
+    def __init__(self, job_id, input_path, output_folder, reduction_percent, encoding_settings):
+        self.id = job_id
+        self.input_path = input_path
+        self.output_folder = output_folder
+        self.reduction_percent = reduction_percent
+        self.encoding_settings = encoding_settings
+        self.stop_event = threading.Event()
+        self.state = JOB_QUEUED
+        self.percent = 0.0
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'input': self.input_path,
+            'output_folder': self.output_folder,
+            'reduction': self.reduction_percent,
+            'state': self.state,
+            'percent': self.percent,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+            'result': asdict(self.result) if self.result else None,
+        }
+
+
+class _JobChannel:
+    """ใช้แทน message_queue ของงานหนึ่งงาน: แปลง message ของ process_single_video เป็น event ของงานนั้น"""
+
+    def __init__(self, manager, job):
+        self.manager = manager
+        self.job = job
+
+    def put(self, item):
+        msg_type, title, message = item
+        if msg_type == 'file_progress':
+            self.job.percent = message
+            self.manager.publish('progress', {'id': self.job.id, 'percent': message})
+        elif msg_type == 'text':
+            self.manager.publish('log', {'id': self.job.id, 'text': title.rstrip('\n')})
+
+
+class JobManager:
+    """รับงาน, รันใน worker pool และเก็บสถิติสำหรับ /metrics"""
+
+    def __init__(self, encoding_settings, reduction_percent=30, max_workers=2, output_folder=''):
+        self.encoding_settings = encoding_settings
+        self.reduction_percent = reduction_percent
+        self.output_folder = output_folder
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.budget = ThreadBudget(slots=max_workers)
+        self.progress = BatchProgress(0, 0)
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._subscribers = set()
+        self.finished_counts = {}
+        self.bytes_saved = 0
+
+    def submit(self, payload):
+        """สร้างงานจาก JSON ของ POST /jobs (raise ValueError ถ้าข้อมูลไม่ถูกต้อง)"""
+        input_path = payload.get('input')
+        if not input_path or not os.path.isfile(input_path):
+            raise ValueError(f"ไม่พบไฟล์ input: {input_path}")
+        settings = self.encoding_settings
+        if payload.get('preset'):
+            preset_name = resolve_preset(payload['preset'])
+            if preset_name is None:
+                raise ValueError(f"ไม่รู้จัก preset: {payload['preset']}")
+            settings = dict(settings, **PRESETS[preset_name])
+        if payload.get('settings'):
+            if not isinstance(payload['settings'], dict):
+                raise ValueError("settings ต้องเป็น object")
+            settings = dict(settings, **payload['settings'])
+        try:
+            reduction = int(payload.get('reduction', self.reduction_percent))
+        except (TypeError, ValueError):
+            raise ValueError("reduction ต้องเป็นตัวเลข")
+        if not 0 < reduction < 100:
+            raise ValueError("reduction ต้องอยู่ระหว่าง 1-99")
+        output_folder = (payload.get('output') or self.output_folder
+                         or os.path.join(os.path.dirname(os.path.abspath(input_path)), 'Output'))
+
+        with self._lock:
+            job = ApiJob(str(next(self._ids)), input_path, output_folder, reduction, settings)
+            self._jobs[job.id] = job
+        self.progress.add_files(1)
+        self.executor.submit(self._run, job)
+        self.publish('job', job.to_dict())
+        return job
+
+    def _run(self, job):
+        with self._lock:
+            # ตรวจและเปลี่ยนสถานะภายใต้ lock เดียวกับ cancel() เพื่อไม่ให้งานที่เพิ่งถูกยกเลิกเริ่มรัน
+            if job.stop_event.is_set():
+                return
+            job.state = JOB_RUNNING
+            job.started = time.time()
+        self.publish('job', job.to_dict())
+        try:
+            os.makedirs(job.output_folder, exist_ok=True)
+            result = process_single_video(job.input_path, job.output_folder, job.reduction_percent,
+                                          _JobChannel(self, job), job.stop_event, job.encoding_settings,
+                                          None, self.progress, None, None, None, self.executor, self.budget)
+        except Exception as e:  # งานที่พังต้องไม่ทำให้ worker หยุด
+            result = JobResult(input_path=job.input_path, status=STATUS_FAILED, message=f"❌ Error: {e}")
+        self.progress.finish(job.input_path, result.duration)
+        with self._lock:
+            self.finished_counts[result.status] = self.finished_counts.get(result.status, 0) + 1
+            if result.status == STATUS_SUCCESS and result.input_size and result.output_size is not None:
+                self.bytes_saved += result.input_size - result.output_size
+        job.result = result
+        job.state = result.status
+        job.finished = time.time()
+        PROBE_CACHE.save()
+        QUALITY_CACHE.save()
+        self.publish('job', job.to_dict())
+
+    def cancel(self, job_id):
+        """ยกเลิกงาน คืนค่า ApiJob หรือ None ถ้าไม่พบ"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            job.stop_event.set()
+            was_queued = job.state == JOB_QUEUED
+            if was_queued:
+                # ยังไม่เริ่ม: _run จะข้ามงานนี้เมื่อถึงคิว
+                job.state = STATUS_CANCELLED
+                job.finished = time.time()
+                self.finished_counts[STATUS_CANCELLED] = self.finished_counts.get(STATUS_CANCELLED, 0) + 1
+        if was_queued:
+            self.progress.finish(job.input_path)
+            self.publish('job', job.to_dict())
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def shutdown(self):
+        for job in self.jobs():
+            job.stop_event.set()
+        self.executor.shutdown(wait=True)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.put(None)
+
+    # --- Server-Sent Events ---
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=SSE_BUFFER_EVENTS)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((event, data))
+            except queue.Full:
+                pass
+
+    # --- Prometheus ---
+    def metrics(self):
+        """ค่าสำหรับ /metrics ในรูปแบบ Prometheus text exposition"""
+        stats = self.progress.snapshot()
+        jobs = self.jobs()
+        with self._lock:
+            finished_counts = dict(self.finished_counts)
+            bytes_saved = self.bytes_saved
+        lines = [
+            '# HELP vbr_jobs_in_flight Jobs currently encoding.',
+            '# TYPE vbr_jobs_in_flight gauge',
+            f'vbr_jobs_in_flight {sum(1 for job in jobs if job.state == JOB_RUNNING)}',
+            '# HELP vbr_jobs_queued Jobs waiting for a worker.',
+            '# TYPE vbr_jobs_queued gauge',
+            f'vbr_jobs_queued {sum(1 for job in jobs if job.state == JOB_QUEUED)}',
+            '# HELP vbr_jobs_finished_total Finished jobs by status.',
+            '# TYPE vbr_jobs_finished_total counter',
+        ]
+        lines += [f'vbr_jobs_finished_total{{status="{status}"}} {count}' for status, count in sorted(finished_counts.items())]
+        lines += [
+            '# HELP vbr_encoded_seconds_total Seconds of video encoded (including jobs in progress).',
+            '# TYPE vbr_encoded_seconds_total counter',
+            f"vbr_encoded_seconds_total {stats['encoded_seconds']:.3f}",
+            '# HELP vbr_realtime_factor Combined ffmpeg speed of running jobs (x realtime).',
+            '# TYPE vbr_realtime_factor gauge',
+            f"vbr_realtime_factor {stats['speed']:.3f}",
+            '# HELP vbr_bytes_saved_total Input bytes minus output bytes of successful jobs.',
+            '# TYPE vbr_bytes_saved_total counter',
+            f'vbr_bytes_saved_total {bytes_saved}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = 'VideoBitrateReducer/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def manager(self):
+        return self.server.manager
+
+    def log_message(self, format, *args):
+        # ไม่พิมพ์ access log ทุก request (SSE/metrics ถูกเรียกบ่อย)
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status, message):
+        self.send_json(status, {'error': message})
+
+    def _job_id(self):
+        parts = self.path.split('?', 1)[0].strip('/').split('/')
+        return parts[1] if len(parts) == 2 and parts[0] == 'jobs' else None
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0].rstrip('/')
+        if path == '/jobs':
+            self.send_json(200, {'jobs': [job.to_dict() for job in self.manager.jobs()]})
+        elif path == '/events':
+            self.stream_events()
+        elif path == '/metrics':
+            data = self.manager.metrics().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        elif self._job_id():
+            job = self.manager.get(self._job_id())
+            if job is None:
+                self.send_error_json(404, "ไม่พบงาน")
+            else:
+                self.send_json(200, job.to_dict())
+        else:
+            self.send_error_json(404, "ไม่พบ endpoint")
+
+    def do_POST(self):
+        if self.path.split('?', 1)[0].rstrip('/') != '/jobs':
+            self.send_error_json(404, "ไม่พบ endpoint")
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length <= 0 or length > MAX_REQUEST_BYTES:
+            self.send_error_json(400, "ต้องส่ง JSON body")
+            return
+        try:
+            payload = json.loads(self.rfile.read(length).decode('utf-8'))
+            if not isinstance(payload, dict):
+                raise ValueError("body ต้องเป็น JSON object")
+            job = self.manager.submit(payload)
+        except ValueError as e:
+            self.send_error_json(400, str(e))
+            return
+        self.send_json(201, job.to_dict())
+
+    def do_DELETE(self):
+        job_id = self._job_id()
+        job = self.manager.cancel(job_id) if job_id else None
+        if job is None:
+            self.send_error_json(404, "ไม่พบงาน")
+        else:
+            self.send_json(200, job.to_dict())
+
+    def stream_events(self):
+        subscriber = self.manager.subscribe()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            # สถานะปัจจุบันของทุกงานก่อน แล้วจึงส่ง event ใหม่
+            for job in self.manager.jobs():
+                self._write_event('job', job.to_dict())
+            while True:
+                try:
+                    item = subscriber.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    self.wfile.write(b': keepalive\n\n')
+                    self.wfile.flush()
+                    continue
+                if item is None:
+                    break
+                self._write_event(*item)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.manager.unsubscribe(subscriber)
+
+    def _write_event(self, event, data):
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, manager):
+        super().__init__(address, ApiHandler)
+        self.manager = manager
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="HTTP/JSON API สำหรับส่งงานลด Bitrate จากโปรแกรมอื่น")
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f"address ที่ฟัง (ค่าเริ่มต้น {DEFAULT_HOST} = เฉพาะเครื่องนี้)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"port (ค่าเริ่มต้น {DEFAULT_PORT})")
+    parser.add_argument('-o', '--output', default='', help="โฟลเดอร์ output ค่าเริ่มต้นของงานที่ไม่ระบุ (ค่าเริ่มต้น: <โฟลเดอร์ของ input>/Output)")
+    parser.add_argument('-w', '--workers', type=int, default=2, help="จำนวนงานที่แปลงพร้อมกัน (ค่าเริ่มต้น 2)")
+    add_encoding_arguments(parser)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    encoding_settings = encoding_settings_from_args(args)
+    if encoding_settings is None:
+        sys.stderr.write(f"ไม่รู้จัก preset: {args.preset}\n")
+        return EXIT_SETUP_ERROR
+    try:
+        encoder = get_encoder(encoding_settings)
+    except FileNotFoundError:
+        sys.stderr.write("ไม่พบ FFmpeg/FFprobe! กรุณาติดตั้ง FFmpeg และเพิ่มใน PATH\n")
+        return EXIT_SETUP_ERROR
+    encoding_settings = dict(encoding_settings, encoder=encoder.codec)
+
+    manager = JobManager(encoding_settings, args.reduction, args.workers, args.output)
+    try:
+        server = ApiServer((args.host, args.port), manager)
+    except OSError as e:
+        sys.stderr.write(f"เปิด port {args.port} ไม่ได้: {e}\n")
+        return EXIT_SETUP_ERROR
+    sys.stderr.write(f"API พร้อมที่ http://{args.host}:{server.server_address[1]} (Encoder: {encoder.codec})\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        sys.stderr.write("\nกำลังหยุด API และยกเลิกงานที่เหลือ...\n")
+    finally:
+        server.server_close()
+        manager.shutdown()
+    return EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
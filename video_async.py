@@ -0,0 +1,441 @@
+"""Engine แบบ asyncio: ดูแล ffprobe/ffmpeg หลายร้อย process จาก thread เดียว
+
+engine แบบ thread (start_conversion) ให้แต่ละงานถือ thread ของ ThreadPoolExecutor ไว้รอ pipe ของ subprocess
+engine นี้รัน probe, encode, การอ่าน progress และการยกเลิกเป็น coroutine บน event loop เดียว
+และจำกัดจำนวนพร้อมกันด้วย semaphore แยกตามประเภทงาน (probe / encode / copy)
+ขั้นตอนของแต่ละไฟล์มาจาก process_video_steps ชุดเดียวกับ engine แบบ thread (ผลลัพธ์และข้อความจึงเหมือนกัน)
+"""
+import asyncio
+import collections
+import functools
+import json
+import os
+import subprocess
+import sys
+import time
+
+from video_converter_core import (
+    DEFAULT_PROBE_WORKERS, PROBE_CACHE, QUALITY_CACHE, PROGRESS_INTERVAL, STDERR_TAIL_LINES,
+    STEP_PROBE, STEP_ENCODE, STEP_COPY, STEP_STAGE, STEP_FINALIZE, BatchProgress, FfmpegProgress, FfmpegRun, ReportWriter,
+    add_result_to_summary, admission_queue, encode_segmented, format_duration, format_progress_stats, new_summary,
+    open_job_log, order_jobs, parse_probe_output, prepare_batch, probe_command, probe_video, process_video_steps,
+    rejected_job_result, report_summary, resumed_job_result, run_ffmpeg, save_trace, settle_uploads,
+)
+from video_journal import BatchJournal
+
+# ความถี่ในการตรวจ stop_event ของ process ที่กำลังรัน (วินาที)
+STOP_POLL_INTERVAL = 0.2
+# จำนวนงาน copy/remux พร้อมกันเริ่มต้น เทียบกับจำนวนงาน encode (ใช้ I/O เป็นหลัก ไม่ใช้ CPU)
+COPY_WORKERS_FACTOR = 4
+
+
+def _creationflags():
+    return subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
+
+
+async def _terminate(proc):
+    """terminate แล้วรอ 5 วินาที ถ้ายังไม่ปิดจึง kill (เหมือน run_ffmpeg)"""
+    try:
+        proc.terminate()
+    except ProcessLookupError:
+        return
+    try:
+        await asyncio.wait_for(proc.wait(), timeout=5)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+
+
+async def probe_video_async(video_path, use_cache=True):
+    """probe_video แบบ coroutine (ใช้ PROBE_CACHE เดียวกัน)
+
+    คืนค่า VideoMetadata หรือ None ถ้า probe ไม่สำเร็จ (raise FileNotFoundError ถ้าไม่พบ ffprobe)
+    """
+    try:
+        st = os.stat(video_path)
+    except OSError:
+        return None
+
+    if use_cache:
+        cached = PROBE_CACHE.get(video_path, st.st_size, st.st_mtime_ns)
+        if cached is not None:
+            return cached
+
+    try:
+        proc = await asyncio.create_subprocess_exec(*probe_command(video_path), stdout=subprocess.PIPE,
+                                                    stderr=subprocess.PIPE, creationflags=_creationflags())
+    except FileNotFoundError:
+        raise FileNotFoundError("FFprobe not found")
+    try:
+        stdout, _ = await proc.communicate()
+    except asyncio.CancelledError:
+        await _terminate(proc)
+        raise
+    if proc.returncode != 0:
+        return None
+    try:
+        metadata = parse_probe_output(json.loads(stdout.decode('utf-8', errors='replace') or '{}'), st.st_size)
+    except ValueError:
+        return None
+
+    if use_cache:
+        PROBE_CACHE.put(video_path, st.st_size, st.st_mtime_ns, metadata)
+    return metadata
+
+
+async def _drain_stderr(stream, lines, log_file):
+    """อ่าน stderr ไปพร้อมกับ stdout (เก็บแค่บรรทัดท้ายใน lines และเขียนทั้งหมดลง log_file ถ้ามี)"""
+    while True:
+        try:
+            raw_line = await stream.readline()
+        except ValueError:
+            # บรรทัดยาวเกิน limit ของ StreamReader (ถูกทิ้งไปแล้ว) อ่านบรรทัดถัดไปต่อ
+            continue
+        if not raw_line:
+            return
+        line = raw_line.decode('utf-8', errors='replace')
+        lines.append(line.rstrip('\r\n'))
+        if log_file:
+            log_file.write(line)
+
+
+async def _watch_stop(proc, stop_event, run):
+    """terminate ffmpeg เมื่อ stop_event (threading.Event จาก GUI/CLI) ถูกตั้ง"""
+    while proc.returncode is None:
+        if stop_event.is_set():
+            run.cancelled = True
+            await _terminate(proc)
+            return
+        await asyncio.sleep(STOP_POLL_INTERVAL)
+
+
+async def run_ffmpeg_async(command, input_path, duration, message_queue=None, stop_event=None, progress=None, time_offset=0.0, time_scale=1.0, cwd=None, log_path=None):
+    """run_ffmpeg แบบ coroutine (argument และผลลัพธ์เหมือนกัน) อ่าน stdout/stderr พร้อมกันบน event loop
+
+    ยกเลิกได้ทั้งด้วย stop_event และการ cancel task (process ถูก terminate ทั้งสองกรณี)
+    raise FileNotFoundError ถ้าไม่พบ ffmpeg
+    """
+    run = FfmpegRun()
+    log_file = open_job_log(log_path, command)
+    spawn_start = time.perf_counter()
+    try:
+        proc = await asyncio.create_subprocess_exec(*command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                                    cwd=cwd, creationflags=_creationflags())
+    except OSError:
+        if log_file:
+            log_file.close()
+        raise
+    run.spawn_time = time.perf_counter() - spawn_start
+    lines = collections.deque(maxlen=STDERR_TAIL_LINES)
+    drain = asyncio.ensure_future(_drain_stderr(proc.stderr, lines, log_file))
+    watcher = asyncio.ensure_future(_watch_stop(proc, stop_event, run)) if stop_event else None
+    parser = FfmpegProgress(run, input_path, duration, message_queue, progress, time_offset, time_scale)
+    try:
+        async for raw_line in proc.stdout:
+            parser.feed(raw_line.decode('utf-8', errors='replace'))
+        returncode = await proc.wait()
+        await drain
+        if not run.cancelled:
+            run.returncode = returncode
+    except asyncio.CancelledError:
+        await _terminate(proc)
+        raise
+    finally:
+        if watcher:
+            watcher.cancel()
+        drain.cancel()
+        if log_file:
+            log_file.close()
+    run.stderr = '\n'.join(lines)
+    return run
+
+
+class AsyncEngine:
+    """ขับ process_video_steps หลายงานพร้อมกันบน event loop เดียว
+
+    จำนวนขั้นตอนที่รันพร้อมกันถูกจำกัดด้วย semaphore แยกตามประเภท (STEP_PROBE/STEP_ENCODE/STEP_COPY)
+    งานถือ semaphore ของประเภทปัจจุบันไว้จนกว่าจะเปลี่ยนประเภทหรือจบ (เช่น two-pass ถือ slot encode ทั้งสอง pass)
+    encode แบบแบ่งช่วงถือ slot เท่าจำนวนช่วงที่ encode พร้อมกัน (ดู step_slots)
+    ต้องสร้างภายใน event loop ที่จะใช้งาน tracer (video_trace.Tracer) บันทึกแต่ละงานบน lane ของตัวเอง
+    """
+
+    def __init__(self, encode_workers, copy_workers=None, probe_workers=None, stop_event=None, tracer=None):
+        self.limits = {
+            STEP_PROBE: max(1, int(probe_workers or DEFAULT_PROBE_WORKERS)),
+            STEP_ENCODE: max(1, int(encode_workers)),
+            STEP_COPY: max(1, int(copy_workers or encode_workers * COPY_WORKERS_FACTOR)),
+        }
+        # การรอ staging และการย้าย output ไม่ใช้ CPU จึงให้ทุกงานที่อาจรันพร้อมกันทำได้ (ScratchStager จำกัดการ copy เอง)
+        self.limits[STEP_STAGE] = self.limits[STEP_FINALIZE] = self.limits[STEP_ENCODE] + self.limits[STEP_COPY]
+        self.semaphores = {step_class: asyncio.Semaphore(limit) for step_class, limit in self.limits.items()}
+        # งานที่ต้องจองหลาย slot จองทีละงาน เพื่อไม่ให้สองงานต่างถือ slot ไว้บางส่วนแล้วรอกันเอง
+        self._multi_slot_lock = asyncio.Lock()
+        self.stop_event = stop_event
+        self.tracer = tracer
+
+    @property
+    def capacity(self):
+        """จำนวนงาน encode + copy ที่รันพร้อมกันได้สูงสุด"""
+        return self.limits[STEP_STAGE]
+
+    async def run_step(self, step, slots=1):
+        """รันหนึ่งขั้นตอน: ffmpeg/ffprobe เป็น coroutine ส่วนขั้นตอนอื่น (วัดคุณภาพ, แบ่งช่วง) รันใน thread pool ของ loop
+
+        slots = จำนวน slot ที่จองไว้ให้ขั้นตอนนี้ (encode แบบแบ่งช่วงรันพร้อมกันไม่เกินค่านี้)
+        """
+        func = step.func if isinstance(step, functools.partial) else None
+        if func is run_ffmpeg:
+            return await run_ffmpeg_async(*step.args, **step.keywords)
+        if func is probe_video:
+            return await probe_video_async(*step.args, **step.keywords)
+        if func is encode_segmented:
+            step = functools.partial(step, max_parallel=slots)
+        return await asyncio.get_running_loop().run_in_executor(None, step)
+
+    def step_slots(self, step_class, step):
+        """จำนวน slot ที่ขั้นตอนนี้ใช้: encode แบบแบ่งช่วงรัน ffmpeg พร้อมกันเท่าจำนวนช่วง (ไม่เกิน limit ของประเภทนั้น)"""
+        if isinstance(step, functools.partial) and step.func is encode_segmented:
+            return max(1, min(step.keywords.get('segments', 1), self.limits[step_class]))
+        return 1
+
+    async def acquire(self, step_class, slots=1):
+        semaphore = self.semaphores[step_class]
+        if slots == 1:
+            await semaphore.acquire()
+            return
+        acquired = 0
+        try:
+            async with self._multi_slot_lock:
+                while acquired < slots:
+                    await semaphore.acquire()
+                    acquired += 1
+        except BaseException:
+            self.release(step_class, acquired)
+            raise
+
+    def release(self, step_class, slots=1):
+        for _ in range(slots):
+            self.semaphores[step_class].release()
+
+    async def probe(self, video_path):
+        async with self.semaphores[STEP_PROBE]:
+            if not self.tracer:
+                return await probe_video_async(video_path)
+            trace = self.tracer.job_lane(os.path.basename(video_path))
+            start = time.perf_counter()
+            try:
+                return await probe_video_async(video_path)
+            finally:
+                trace.step(STEP_PROBE, start)
+                trace.release()
+
+    async def prescan(self, input_files):
+        """prescan_videos แบบ coroutine คืนค่า dict {input_path: VideoMetadata หรือ None}"""
+        metadata = await asyncio.gather(*(self.probe(input_path) for input_path in input_files))
+        return dict(zip(input_files, metadata))
+
+    async def run_job(self, steps, name=None):
+        """รัน generator ของ process_video_steps จนจบ คืนค่า JobResult
+
+        คืนค่า None ถ้าถูกสั่งหยุดก่อนได้ slot (งานที่ยังไม่เริ่มจะไม่ถูกนับ เหมือน start_conversion)
+        name = ชื่องานใน trace (เวลาของแต่ละขั้นตอนนับหลังได้ slot แล้ว)
+        """
+        held = None
+        held_slots = 0
+        result = None
+        trace = self.tracer.job_lane(name) if self.tracer else None
+        try:
+            step_class, step = next(steps)
+            while True:
+                slots = self.step_slots(step_class, step)
+                if step_class != held or slots != held_slots:
+                    if held:
+                        self.release(held, held_slots)
+                        held = None
+                    await self.acquire(step_class, slots)
+                    held, held_slots = step_class, slots
+                    if self.stop_event and self.stop_event.is_set():
+                        return None
+                start = time.perf_counter() if trace else None
+                try:
+                    value = await self.run_step(step, held_slots)
+                except Exception as e:
+                    if trace:
+                        trace.step(step_class, start)
+                    step_class, step = steps.throw(e)
+                else:
+                    if trace:
+                        trace.step(step_class, start, value)
+                    step_class, step = steps.send(value)
+        except StopIteration as done:
+            result = done.value
+            return result
+        finally:
+            if held:
+                self.release(held, held_slots)
+            steps.close()
+            if trace:
+                trace.close(result)
+
+
+async def convert_async(input_folder, output_folder, reduction_percent, max_workers, message_queue, stop_event=None, encoding_settings=None, probe_workers=None, copy_workers=None, job_order="longest_first", report_path=None, skip_policy=None, resume=True, recursive=False, include=None, exclude=None, stager=None, admission=True, tracer=None):
+    """start_conversion บน AsyncEngine (argument, ข้อความใน message_queue และค่าที่คืนเหมือนกัน)
+
+    max_workers = จำนวนงาน encode พร้อมกัน, copy_workers = จำนวนงาน stream copy/remux พร้อมกัน
+    (ค่าเริ่มต้น max_workers x COPY_WORKERS_FACTOR), probe_workers = จำนวน ffprobe พร้อมกัน
+    recursive ค้นหาไฟล์ทั้งหมดก่อนแล้ว pre-scan เหมือนโหมดปกติ (ไม่มีโหมด streaming)
+    stager (video_staging.ScratchStager) ถูก close เมื่อจบ batch, admission และ tracer ใช้แบบเดียวกับ start_conversion
+    """
+    setup = prepare_batch(input_folder, output_folder, reduction_percent, max_workers, message_queue,
+                          encoding_settings, recursive, include, exclude)
+    if setup is None:
+        return None
+    output_folder, input_root = setup.output_folder, setup.input_root
+    engine = AsyncEngine(setup.max_workers, copy_workers, probe_workers, stop_event, tracer)
+
+    journal = BatchJournal(output_folder) if resume else None
+    summary = new_summary()
+    results = []
+    try:
+        report = ReportWriter(report_path) if report_path else None
+    except OSError as e:
+        message_queue.put(("text", f"⚠️ ไม่สามารถสร้างไฟล์รายงาน: {e}\n", None))
+        report = None
+
+    def record(result):
+        add_result_to_summary(summary, result)
+        results.append(result)
+        if report:
+            report.write(result)
+
+    input_files = []
+    resumed_count = 0
+    for input_path in setup.file_source:
+        resumed = resumed_job_result(journal, input_path, output_folder, input_root)
+        if resumed:
+            record(resumed)
+            resumed_count += 1
+        else:
+            input_files.append(input_path)
+
+    if not input_files and not resumed_count:
+        # ไม่มีไฟล์ให้แปลงไม่ใช่ข้อผิดพลาด: คืนสรุปว่างเหมือน start_conversion
+        message_queue.put(("text", f"ไม่พบไฟล์วิดีโอใน: {input_root}\n", None))
+        if stager:
+            summary['staging'] = await asyncio.get_running_loop().run_in_executor(None, stager.close)
+        if report:
+            report.close()
+        message_queue.put(("done", None, None))
+        summary['results'] = results
+        return summary
+    if resumed_count:
+        message_queue.put(("text", f"รันต่อจากรอบก่อน: ข้าม {resumed_count} ไฟล์ที่แปลงเสร็จแล้ว\n", None))
+
+    message_queue.put(("text", f"พบ {len(input_files)} ไฟล์. กำลังตรวจสอบข้อมูลวิดีโอ (ffprobe)...\n", None))
+    try:
+        metadata_map = await engine.prescan(input_files)
+    except FileNotFoundError:
+        message_queue.put(("error", "Error", "ไม่พบ FFmpeg/FFprobe! กรุณาติดตั้ง FFmpeg และเพิ่มใน PATH"))
+        message_queue.put(("done", None, None))
+        return None
+    input_files = order_jobs(input_files, metadata_map, job_order)
+    total_duration = sum(meta.duration or 0 for meta in metadata_map.values() if meta)
+    progress = BatchProgress(total_duration, len(input_files))
+    if stager:
+        stager.schedule(input_files)
+
+    message_queue.put(("init_files", input_files, None))
+    message_queue.put(("overall_progress", None, 0))
+    message_queue.put(("text", f"ความยาววิดีโอรวม: {format_duration(total_duration)}. กำลังเริ่มประมวลผลด้วย asyncio "
+                               f"(encode {engine.limits[STEP_ENCODE]} | copy {engine.limits[STEP_COPY]} งานพร้อมกัน)...\n", None))
+    message_queue.put(("text", f"--- ใช้ Encoder: {setup.encoder.codec} ---\n", None))
+
+    # สร้าง task ทีละน้อย (bounded) เหมือน start_conversion เพื่อให้ memory คงที่ไม่ว่าจะมีไฟล์มากแค่ไหน
+    max_in_flight = engine.capacity * 2
+    gate = admission_queue(input_files, admission, output_folder, input_root, setup.reduction_percent,
+                           setup.encoding_settings, metadata_map, max_in_flight, message_queue)
+    if gate.admission and gate.admission.per_device:
+        message_queue.put(("text", f"จำกัดงานพร้อมกัน {gate.admission.per_device} งานต่อ device\n", None))
+    tasks = {}
+    completed = 0
+
+    # งานที่ encode สำเร็จแต่ output ยังอัปโหลดจาก scratch ไม่เสร็จ (นับผลเมื่ออัปโหลดเสร็จ เหมือน start_conversion)
+    awaiting_upload = {}
+
+    def report_job(input_path, result):
+        nonlocal completed
+        completed += 1
+        record(result)
+        message_queue.put(("text", f"[{completed}/{len(input_files)}] {result}\n", None))
+
+    def finish_job(input_path, result):
+        progress.finish(input_path, result.duration)
+        if stager and result.ok:
+            awaiting_upload[result.output_path] = (input_path, result)
+        else:
+            report_job(input_path, result)
+
+    while True:
+        while not gate.done and len(tasks) < max_in_flight:
+            if stop_event and stop_event.is_set():
+                gate.close()
+                break
+            input_path = gate.next()
+            for rejected_path, hold in gate.rejected:
+                if stager:
+                    stager.release(rejected_path)
+                finish_job(rejected_path, rejected_job_result(rejected_path, hold, output_folder, input_root))
+            gate.rejected.clear()
+            if input_path is None:
+                break
+            steps = process_video_steps(input_path, output_folder, setup.reduction_percent, message_queue, stop_event,
+                                        setup.encoding_settings, metadata_map.get(input_path), progress,
+                                        skip_policy, journal, input_root, stager=stager)
+            tasks[asyncio.ensure_future(engine.run_job(steps, os.path.basename(input_path)))] = input_path
+        if not tasks:
+            if gate.done:
+                break
+            continue
+
+        done, _ = await asyncio.wait(tasks, timeout=PROGRESS_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            input_path = tasks.pop(task)
+            result = task.result()
+            gate.release(input_path)
+            if stager:
+                stager.release(input_path)
+            if result is None:
+                continue
+            finish_job(input_path, result)
+        if awaiting_upload:
+            settle_uploads(stager, awaiting_upload, journal, report_job)
+        stats = progress.snapshot()
+        stats['workers'] = engine.limits[STEP_ENCODE]
+        message_queue.put(("overall_progress", None, int(stats['percent'])))
+        message_queue.put(("stats", format_progress_stats(stats), stats))
+
+    if stager:
+        message_queue.put(("text", "กำลังรออัปโหลด output ที่เหลือจาก scratch...\n", None))
+        summary['staging'] = await asyncio.get_running_loop().run_in_executor(None, stager.close)
+        settle_uploads(stager, awaiting_upload, journal, report_job)
+    if tracer:
+        save_trace(tracer, summary, message_queue)
+
+    # บันทึก cache ของ ffprobe สำหรับการรันครั้งถัดไป
+    PROBE_CACHE.save()
+    QUALITY_CACHE.save()
+    if journal:
+        journal.compact()
+    if report:
+        report.close()
+        message_queue.put(("text", f"บันทึกรายงานผลลัพธ์ที่: {report_path}\n", None))
+
+    report_summary(message_queue, summary)
+    message_queue.put(("done", None, None))
+    summary['results'] = results
+    return summary
+
+
+def start_conversion_async(*args, **kwargs):
+    """รัน convert_async บน event loop ใหม่ (เรียกจาก thread ของ GUI/CLI แทน start_conversion ได้ทันที)"""
+    return asyncio.run(convert_async(*args, **kwargs))
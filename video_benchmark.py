@@ -0,0 +1,289 @@
+"""Benchmark ของ Video Bitrate Reducer: วัด throughput ของ batch ด้วยคลิปสังเคราะห์ที่สร้างจาก ffmpeg (testsrc2 + sine)
+
+ตัวอย่าง:
+    python video_benchmark.py run --presets basic,balanced --workers 1,4 --encoders libx264 -o results.json
+    python video_benchmark.py compare baseline.json results.json --threshold 10
+    python video_benchmark.py threads --files 8 --workers 8 --encoder libx264
+"""
+import argparse
+import json
+import os
+import platform
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows ไม่มี resource (CPU/RSS จะเป็น null ในผลลัพธ์)
+    resource = None
+
+from video_converter_core import FFMPEG_PATH, PRESETS, start_conversion
+from video_converter_cli import resolve_preset
+
+# ชุดคลิปทดสอบเริ่มต้น: ความละเอียด × ความยาว (วินาที)
+DEFAULT_SIZES = ('640x360', '1280x720', '1920x1080')
+DEFAULT_LENGTHS = (10, 30)
+# เกณฑ์ (%) ที่ถือว่าแย่ลงใน compare
+DEFAULT_THRESHOLD = 10.0
+RESULTS_VERSION = 1
+
+
+def make_clip(path, seconds, size='1280x720', rate=30):
+    """สร้างคลิปทดสอบแบบ deterministic (ภาพ testsrc2 + เสียง sine) ที่ bitrate สูงพอให้ลดได้"""
+    command = [
+        FFMPEG_PATH, '-y', '-v', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate={rate}:duration={seconds}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={seconds}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-b:v', '8M', '-g', str(rate * 2),
+        '-c:a', 'aac', '-b:a', '128k', '-shortest', path,
+    ]
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+
+
+def make_media_set(media_folder, sizes=DEFAULT_SIZES, lengths=DEFAULT_LENGTHS):
+    """สร้างชุดคลิปทดสอบ (ข้ามคลิปที่มีอยู่แล้ว เพราะเนื้อหาเหมือนเดิมทุกครั้ง) คืนค่า list ของ path"""
+    os.makedirs(media_folder, exist_ok=True)
+    paths = []
+    for size in sizes:
+        for seconds in lengths:
+            path = os.path.join(media_folder, f'testsrc2_{size}_{seconds}s.mp4')
+            if not os.path.exists(path):
+                make_clip(path, seconds, size)
+            paths.append(path)
+    return paths
+
+
+def run_batch(input_folder, output_folder, workers, encoding_settings, **options):
+    """รัน start_conversion หนึ่งรอบแล้วคืนค่า dict ของเวลาและ throughput"""
+    shutil.rmtree(output_folder, ignore_errors=True)
+    start = time.monotonic()
+    summary = start_conversion(input_folder, output_folder, 30, workers, queue.Queue(), None,
+                               encoding_settings, resume=False, **options)
+    wall = time.monotonic() - start
+    encoded = sum(r.duration or 0 for r in summary['results'] if r.ok) if summary else 0
+    return {
+        'wall_seconds': wall,
+        'encoded_seconds': encoded,
+        'realtime_factor': encoded / wall if wall > 0 else 0.0,
+        'output_bytes': summary['total_output_size'] if summary else 0,
+        'successful': summary['successful'] if summary else 0,
+        'failed': summary['failed'] if summary else 0,
+    }
+
+
+def _resource_usage():
+    """(CPU วินาที, peak RSS MB) ของ process นี้รวม ffmpeg ที่รันเสร็จแล้ว หรือ (None, None) ถ้าวัดไม่ได้"""
+    if resource is None:
+        return None, None
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+    # ru_maxrss เป็น KB บน Linux และ bytes บน macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return cpu, max(own.ru_maxrss, children.ru_maxrss) / scale
+
+
+def bench_one(args):
+    """(ใช้ภายใน) รันหนึ่ง configuration ใน process แยกแล้วพิมพ์ผลเป็น JSON
+    เพื่อให้ CPU time และ peak RSS ของ ffmpeg นับเฉพาะ configuration นี้"""
+    settings = dict(PRESETS[args.preset], encoder=args.encoder)
+    result = run_batch(args.input, args.output, args.workers, settings)
+    result['cpu_seconds'], result['peak_rss_mb'] = _resource_usage()
+    print(json.dumps(result))
+    return 0
+
+
+def run_config(media_folder, output_folder, preset, workers, encoder):
+    """รัน bench_one ใน subprocess แล้วคืนค่า dict ผลลัพธ์"""
+    command = [sys.executable, os.path.abspath(__file__), '_one', '--input', media_folder, '--output', output_folder,
+               '--preset', preset, '--workers', str(workers), '--encoder', encoder]
+    completed = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', errors='replace')
+    if completed.returncode != 0:
+        return {'error': (completed.stderr or '').strip().splitlines()[-1:] or ['unknown error']}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def ffmpeg_version():
+    try:
+        output = subprocess.run([FFMPEG_PATH, '-version'], capture_output=True, text=True, timeout=10).stdout
+        return output.splitlines()[0] if output else None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def config_key(config):
+    return f"{config['preset']}|{config['workers']}|{config['encoder']}"
+
+
+def bench_run(args):
+    """รัน matrix ของ preset × workers × encoder แล้วบันทึกผลเป็น JSON"""
+    presets = []
+    for name in args.presets.split(','):
+        preset = resolve_preset(name.strip())
+        if preset is None:
+            sys.stderr.write(f"ไม่รู้จัก preset: {name}\n")
+            return 2
+        presets.append(preset)
+    workers_list = [int(w) for w in args.workers.split(',')]
+    encoders = [e.strip() for e in args.encoders.split(',')]
+
+    media_folder = args.media or os.path.join(tempfile.gettempdir(), 'vbr_bench_media')
+    clips = make_media_set(media_folder, args.sizes.split(','), [int(s) for s in args.lengths.split(',')])
+    print(f"คลิปทดสอบ {len(clips)} ไฟล์ที่ {media_folder}")
+
+    configs = []
+    output_folder = tempfile.mkdtemp(prefix='vbr_bench_out_')
+    try:
+        for preset in presets:
+            for workers in workers_list:
+                for encoder in encoders:
+                    config = {'preset': preset, 'workers': workers, 'encoder': encoder}
+                    config.update(run_config(media_folder, output_folder, preset, workers, encoder))
+                    configs.append(config)
+                    if 'error' in config:
+                        print(f"{config_key(config):40s} ❌ {config['error'][0]}")
+                        continue
+                    cpu = f"{config['cpu_seconds']:.1f}s" if config['cpu_seconds'] is not None else 'n/a'
+                    rss = f"{config['peak_rss_mb']:.0f}MB" if config['peak_rss_mb'] is not None else 'n/a'
+                    print(f"{config_key(config):40s} wall {config['wall_seconds']:7.2f}s | {config['realtime_factor']:6.2f}x"
+                          f" | cpu {cpu} | rss {rss} | out {config['output_bytes'] / (1024 * 1024):.2f}MB")
+    finally:
+        shutil.rmtree(output_folder, ignore_errors=True)
+
+    results = {
+        'version': RESULTS_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'ffmpeg': ffmpeg_version(),
+        'clips': [os.path.basename(c) for c in clips],
+        'configs': configs,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"บันทึกผลที่ {args.output}")
+    return 0
+
+
+# metric ที่ตรวจใน compare: (ชื่อ, True ถ้าค่ามากกว่า = แย่ลง)
+COMPARE_METRICS = (
+    ('wall_seconds', True),
+    ('realtime_factor', False),
+    ('cpu_seconds', True),
+    ('peak_rss_mb', True),
+    ('output_bytes', True),
+)
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """เทียบผลสองชุดตาม configuration เดียวกัน คืนค่า list ของ (key, metric, ค่าเดิม, ค่าใหม่, % ที่เปลี่ยน) ที่แย่ลงเกิน threshold"""
+    base_configs = {config_key(c): c for c in baseline.get('configs', []) if 'error' not in c}
+    regressions = []
+    for config in current.get('configs', []):
+        key = config_key(config)
+        base = base_configs.get(key)
+        if base is None:
+            continue
+        if 'error' in config:
+            regressions.append((key, 'error', None, None, None))
+            continue
+        for metric, higher_is_worse in COMPARE_METRICS:
+            old, new = base.get(metric), config.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            if (change if higher_is_worse else -change) > threshold:
+                regressions.append((key, metric, old, new, change))
+    return regressions
+
+
+def bench_compare(args):
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, 'r', encoding='utf-8') as f:
+        current = json.load(f)
+    regressions = compare_results(baseline, current, args.threshold)
+    if not regressions:
+        print(f"✅ ไม่พบ regression (เกณฑ์ {args.threshold:g}%)")
+        return 0
+    for key, metric, old, new, change in regressions:
+        if metric == 'error':
+            print(f"❌ {key}: รันไม่สำเร็จ")
+        else:
+            print(f"❌ {key}: {metric} {old:.2f} → {new:.2f} ({change:+.1f}%)")
+    return 1
+
+
+def bench_threads(args):
+    """เทียบ throughput ระหว่างให้ ffmpeg เลือก thread เอง (แบบเดิม) กับ ThreadBudget"""
+    work_dir = tempfile.mkdtemp(prefix='vbr_bench_')
+    try:
+        input_folder = os.path.join(work_dir, 'input')
+        os.makedirs(input_folder)
+        for i in range(args.files):
+            make_clip(os.path.join(input_folder, f'clip_{i:02d}.mp4'), args.seconds, args.size)
+        settings = dict(PRESETS["พื้นฐาน (Basic)"], encoder=args.encoder)
+        results = {}
+        for label, budget in (('ffmpeg-default', False), ('thread-budget', True)):
+            results[label] = run_batch(input_folder, os.path.join(work_dir, 'output'), args.workers,
+                                       settings, thread_budget=budget)
+            r = results[label]
+            print(f"{label:15s} wall {r['wall_seconds']:7.2f}s | {r['realtime_factor']:6.2f}x realtime"
+                  f" | ok {r['successful']} failed {r['failed']}")
+        base = results['ffmpeg-default']['realtime_factor']
+        if base:
+            print(f"thread-budget / ffmpeg-default: {results['thread-budget']['realtime_factor'] / base:.2f}x")
+        return 0
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark throughput ของ Video Bitrate Reducer")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="รัน matrix ของ preset × workers × encoder แล้วบันทึกผลเป็น JSON")
+    run.add_argument('--presets', default='basic', help="รายการ preset คั่นด้วย , (เช่น basic,balanced)")
+    run.add_argument('--workers', default='1,4', help="รายการจำนวนไฟล์พร้อมกัน คั่นด้วย ,")
+    run.add_argument('--encoders', default='libx264', help="รายการ encoder คั่นด้วย ,")
+    run.add_argument('--sizes', default=','.join(DEFAULT_SIZES), help="ความละเอียดของคลิปทดสอบ คั่นด้วย ,")
+    run.add_argument('--lengths', default=','.join(str(s) for s in DEFAULT_LENGTHS), help="ความยาวคลิป (วินาที) คั่นด้วย ,")
+    run.add_argument('--media', default=None, help="โฟลเดอร์เก็บคลิปทดสอบ (ใช้ซ้ำได้ระหว่างรอบ)")
+    run.add_argument('-o', '--output', default='benchmark_results.json', help="ไฟล์ผลลัพธ์ JSON")
+    run.set_defaults(func=bench_run)
+
+    compare = commands.add_parser('compare', help="เทียบผลกับ baseline และแจ้ง regression (exit code 1 ถ้าพบ)")
+    compare.add_argument('baseline', help="ไฟล์ผลลัพธ์ที่บันทึกไว้เป็น baseline")
+    compare.add_argument('current', help="ไฟล์ผลลัพธ์ล่าสุด")
+    compare.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="แย่ลงเกินกี่ %% จึงถือว่าเป็น regression")
+    compare.set_defaults(func=bench_compare)
+
+    threads = commands.add_parser('threads', help="เทียบ ThreadBudget กับการให้ ffmpeg เลือกจำนวน thread เอง")
+    threads.add_argument('--files', type=int, default=8, help="จำนวนคลิปทดสอบ")
+    threads.add_argument('--seconds', type=int, default=20, help="ความยาวของแต่ละคลิป (วินาที)")
+    threads.add_argument('--size', default='1280x720', help="ความละเอียดของคลิป")
+    threads.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 4, help="จำนวนไฟล์พร้อมกัน")
+    threads.add_argument('-e', '--encoder', default='libx264', help="encoder ที่ใช้ทดสอบ")
+    threads.set_defaults(func=bench_threads)
+
+    one = commands.add_parser('_one', help=argparse.SUPPRESS)
+    one.add_argument('--input', required=True)
+    one.add_argument('--output', required=True)
+    one.add_argument('--preset', required=True)
+    one.add_argument('--workers', type=int, required=True)
+    one.add_argument('--encoder', required=True)
+    one.set_defaults(func=bench_one)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""Video Bitrate Reducer แบบ Command Line (ไม่ใช้ tkinter เหมาะกับ server/cron/render node)
+
+ตัวอย่าง:
+    python video_converter_cli.py D:\\Videos -o D:\\Videos\\Output -r 40 -w 4 -p balanced
+    python video_converter_cli.py /mnt/ingest --format jsonl > progress.jsonl
+    python video_converter_cli.py clips -e libx264 --target-size 25 --two-pass
+    python video_converter_cli.py archive --content-aware --quality-metric ssim --quality-target 0.97
+    python video_converter_cli.py recording.mkv -w 8 --segments 8
+    python video_converter_cli.py /mnt/ingest -w 16 --adaptive --min-workers 2
+    python video_converter_cli.py legacy_flv --copy-below 2500
+    python video_converter_cli.py footage_4k -e h264_nvenc --max-height 1080
+    python video_converter_cli.py /mnt/ingest --log-dir logs
+    python video_converter_cli.py /mnt/archive -R --engine asyncio -w 4 --copy-below 4000
+    python video_converter_cli.py \\\\nas\\media -o \\\\nas\\reduced --scratch D:\\scratch --scratch-max-gb 200 --prefetch 3
+    python video_converter_cli.py /mnt/hdd/raw -o /mnt/hdd/out -w 8 --per-device 2
+    python video_converter_cli.py /mnt/ingest -w 8 --trace batch_trace.json
+"""
+import argparse
+import functools
+import json
+import queue
+import sys
+import threading
+import time
+
+from video_async import start_conversion_async
+from video_converter_core import PRESETS, SkipPolicy, start_conversion
+from video_encoders import SCALERS
+from video_quality import QUALITY_METRICS
+from video_scheduler import DeviceAdmission
+from video_staging import DEFAULT_PREFETCH_DEPTH, ScratchStager
+from video_trace import Tracer
+
+# Exit codes
+EXIT_OK = 0
+EXIT_FAILED = 1       # มีบางไฟล์แปลงไม่สำเร็จ
+EXIT_SETUP_ERROR = 2  # input/ค่าตั้งค่าไม่ถูกต้อง หรือไม่พบ FFmpeg
+EXIT_CANCELLED = 130
+
+# แสดงสถิติความเร็วในโหมด text ทุกกี่วินาที
+TEXT_STATS_INTERVAL = 5.0
+
+
+def resolve_preset(name):
+    """หา preset จากชื่อเต็ม (เช่น 'สมดุล (Balanced)') หรือชื่อภาษาอังกฤษในวงเล็บ (เช่น 'balanced')"""
+    if name in PRESETS:
+        return name
+    wanted = name.strip().lower()
+    for preset_name in PRESETS:
+        if '(' in preset_name and preset_name.rsplit('(', 1)[1].rstrip(')').lower() == wanted:
+            return preset_name
+    return None
+
+
+def add_encoding_arguments(parser):
+    """ตัวเลือกการ encode ที่ใช้ร่วมกันระหว่าง CLI และ watch-folder daemon"""
+    preset_aliases = [p.rsplit('(', 1)[1].rstrip(')').lower() for p in PRESETS if '(' in p]
+    parser.add_argument('-r', '--reduction', type=int, default=30, help="เปอร์เซ็นต์ที่ต้องการลด bitrate (1-99, ค่าเริ่มต้น 30)")
+    parser.add_argument('-p', '--preset', default='basic', help=f"preset การ encode: {', '.join(preset_aliases)} (ค่าเริ่มต้น basic)")
+    parser.add_argument('-e', '--encoder', default='auto', help="ชื่อ encoder ใน ffmpeg เช่น libx264, libx265, libsvtav1, h264_nvenc (ค่าเริ่มต้น auto)")
+    parser.add_argument('--target-size', type=float, default=None, metavar='MB', help="ขนาดไฟล์เป้าหมายต่อไฟล์ (MB) ใช้แทน --reduction")
+    parser.add_argument('--two-pass', action='store_true', help="encode สองรอบเพื่อให้ได้ bitrate/ขนาดใกล้เป้าหมายมากขึ้น (ช้ากว่า)")
+    parser.add_argument('--max-height', type=int, default=None, metavar='P', help="ย่อภาพให้ด้านสั้นไม่เกินค่านี้ เช่น 1080 (คงอัตราส่วน, ไม่ขยายไฟล์ที่เล็กกว่า)")
+    parser.add_argument('--scaler', choices=SCALERS, default='auto', help="ย่อภาพบน GPU (zero-copy) หรือ CPU (auto = GPU ถ้าใช้ได้ ไม่เช่นนั้น CPU)")
+    parser.add_argument('--stream-copy', action='store_true', help="คัดลอก stream (-c copy) แทนการ encode ถ้า codec เป็น H.264/HEVC และไม่ต้องลด bitrate (.flv/.avi จะ remux เป็น .mp4)")
+    parser.add_argument('--copy-below', type=int, default=None, metavar='KBPS', help="คัดลอก stream ถ้า video bitrate เดิมไม่เกินค่านี้ (kbps, เปิด --stream-copy ให้อัตโนมัติ)")
+    parser.add_argument('--segments', type=int, default=0, metavar='N', help="แบ่งไฟล์ยาวเป็น N ช่วง (ตัดที่ keyframe) แล้ว encode พร้อมกันใน worker pool (0 = ไม่แบ่ง)")
+    parser.add_argument('--content-aware', action='store_true', help="เลือก bitrate ต่อไฟล์จากการ encode ตัวอย่างและวัดคุณภาพ (ผลถูก cache ไว้)")
+    parser.add_argument('--quality-metric', choices=QUALITY_METRICS, default='auto', help="metric ที่ใช้วัดคุณภาพ (auto = VMAF ถ้ามี ไม่เช่นนั้น SSIM)")
+    parser.add_argument('--quality-target', type=float, default=None, help="คะแนนขั้นต่ำ (ค่าเริ่มต้น VMAF 93, SSIM 0.98, PSNR 40)")
+    parser.add_argument('--log-dir', default=None, metavar='DIR', help="เก็บ stderr ทั้งหมดของ ffmpeg แยกไฟล์ต่องาน (<ชื่อไฟล์>.log) ในโฟลเดอร์นี้")
+
+
+def add_skip_arguments(parser):
+    """ตัวเลือกการข้ามไฟล์ที่ใช้ร่วมกันระหว่าง CLI และ watch-folder daemon"""
+    parser.add_argument('--incremental', action='store_true', help="ข้ามไฟล์ที่มี output ใหม่กว่า input อยู่แล้ว")
+    parser.add_argument('--min-bitrate', type=int, default=None, help="ข้ามไฟล์ที่ video bitrate เดิมต่ำกว่าค่านี้ (kbps)")
+    parser.add_argument('--min-savings', type=float, default=None, help="ข้ามไฟล์ที่คาดว่าจะลดขนาดได้น้อยกว่ากี่ %%")
+
+
+def skip_policy_from_args(args):
+    """สร้าง SkipPolicy จาก args ของ add_skip_arguments"""
+    return SkipPolicy(
+        skip_existing=args.incremental,
+        min_bitrate_bps=args.min_bitrate * 1000 if args.min_bitrate else None,
+        min_savings_percent=args.min_savings,
+    )
+
+
+def encoding_settings_from_args(args):
+    """สร้าง encoding_settings จาก args ของ add_encoding_arguments (None ถ้าไม่รู้จัก preset)"""
+    preset_name = resolve_preset(args.preset)
+    if preset_name is None:
+        return None
+    return dict(PRESETS[preset_name], encoder=args.encoder,
+                target_size_mb=args.target_size, two_pass=args.two_pass,
+                content_aware=args.content_aware, quality_metric=args.quality_metric,
+                quality_target=args.quality_target, segments=args.segments,
+                stream_copy=args.stream_copy or bool(args.copy_below), copy_below_kbps=args.copy_below,
+                max_height=args.max_height, scaler=args.scaler, log_dir=args.log_dir)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="ลด Bitrate ของไฟล์วิดีโอแบบ batch ด้วย FFmpeg (ไม่ต้องใช้ GUI)")
+    parser.add_argument('input', help="โฟลเดอร์หรือไฟล์วิดีโอต้นฉบับ")
+    parser.add_argument('-o', '--output', default='', help="โฟลเดอร์ output (ค่าเริ่มต้น: <input>/Output)")
+    parser.add_argument('-w', '--workers', type=int, default=4, help="จำนวนไฟล์ที่แปลงพร้อมกัน (ค่าเริ่มต้น 4)")
+    parser.add_argument('--adaptive', action='store_true', help="ปรับจำนวนไฟล์พร้อมกันอัตโนมัติตาม CPU/memory/speed (สูงสุด --workers)")
+    parser.add_argument('--min-workers', type=int, default=None, help="จำนวนงานพร้อมกันขั้นต่ำในโหมด --adaptive (ค่าเริ่มต้น ครึ่งหนึ่งของจำนวน core)")
+    parser.add_argument('--no-thread-budget', action='store_true', help="ไม่จำกัด thread ของ ffmpeg แต่ละตัว (ให้ ffmpeg เลือกเอง)")
+    parser.add_argument('--engine', choices=['threads', 'asyncio'], default='threads', help="threads = worker pool (ค่าเริ่มต้น), asyncio = ดูแลทุก process จาก event loop เดียว (เหมาะกับไฟล์จำนวนมาก/งาน copy)")
+    parser.add_argument('--copy-workers', type=int, default=None, help="จำนวนงาน stream copy/remux พร้อมกันใน --engine asyncio (ค่าเริ่มต้น 4 เท่าของ --workers)")
+    parser.add_argument('--scratch', default=None, metavar='DIR', help="copy input มาไว้ที่ดิสก์ในเครื่องก่อน encode และเขียน output ที่นี่แล้วอัปโหลดกลับใน background (สำหรับ NAS/SMB/NFS)")
+    parser.add_argument('--scratch-max-gb', type=float, default=None, metavar='GB', help="พื้นที่ scratch สูงสุด (ค่าเริ่มต้น พื้นที่ว่างทั้งหมดของดิสก์นั้น)")
+    parser.add_argument('--prefetch', type=int, default=DEFAULT_PREFETCH_DEPTH, metavar='N', help=f"จำนวน input ที่ copy ล่วงหน้าใน --scratch (ค่าเริ่มต้น {DEFAULT_PREFETCH_DEPTH})")
+    parser.add_argument('--per-device', type=int, default=None, metavar='N', help="จำนวนงานพร้อมกันสูงสุดที่อ่าน/เขียนดิสก์ (device) เดียวกัน เช่น 1-2 สำหรับ HDD (ค่าเริ่มต้น ไม่จำกัด)")
+    parser.add_argument('--no-space-check', action='store_true', help="ไม่พักงานเมื่อพื้นที่ว่างของ output ไม่พอสำหรับขนาด output ที่คาดไว้")
+    add_encoding_arguments(parser)
+    parser.add_argument('--probe-workers', type=int, default=None, help="จำนวน ffprobe ที่รันพร้อมกันตอน pre-scan")
+    parser.add_argument('--order', choices=['longest_first', 'input'], default='longest_first', help="ลำดับการ encode")
+    parser.add_argument('--format', choices=['text', 'jsonl'], default='text', help="รูปแบบการแสดงความคืบหน้า")
+    parser.add_argument('-R', '--recursive', action='store_true', help="ค้นหาในโฟลเดอร์ย่อยด้วย (คงโครงสร้างโฟลเดอร์ใน output)")
+    parser.add_argument('--include', action='append', default=None, metavar='GLOB', help="แปลงเฉพาะไฟล์ที่ตรงกับ pattern (ระบุได้หลายครั้ง)")
+    parser.add_argument('--exclude', action='append', default=None, metavar='GLOB', help="ไม่แปลงไฟล์ที่ตรงกับ pattern (ระบุได้หลายครั้ง)")
+    parser.add_argument('--no-resume', action='store_true', help="ไม่ใช้ journal ของรอบก่อน (แปลงใหม่ทั้งหมด)")
+    add_skip_arguments(parser)
+    parser.add_argument('--report', default=None, help="บันทึกผลลัพธ์รายไฟล์เป็น .csv หรือ .json")
+    parser.add_argument('--trace', default=None, metavar='FILE', help="บันทึกเวลาของแต่ละขั้นตอน (probe/spawn/encode/finalize) ต่องานเป็น Chrome trace JSON และแสดง histogram ท้าย batch")
+    return parser
+
+
+def emit_jsonl(msg_type, title, message, stream):
+    """แปลง message จาก message_queue เป็น JSON หนึ่งบรรทัด"""
+    if msg_type == 'text':
+        record = {'type': 'text', 'text': title.rstrip('\n')}
+    elif msg_type == 'error':
+        record = {'type': 'error', 'title': title, 'message': message}
+    elif msg_type == 'init_files':
+        record = {'type': 'init_files', 'files': title}
+    elif msg_type == 'file_progress':
+        record = {'type': 'file_progress', 'file': title, 'percent': message}
+    elif msg_type == 'file_done':
+        record = {'type': 'file_done', 'file': title, 'status': message}
+    elif msg_type == 'overall_progress':
+        record = {'type': 'overall_progress', 'percent': message}
+    elif msg_type == 'stats':
+        record = dict(message, type='stats')
+    elif msg_type == 'workers':
+        record = {'type': 'workers', 'workers': title, 'max_workers': message}
+    elif msg_type == 'backlog':
+        record = {'type': 'backlog', 'backlog': title, 'counts': message}
+    else:
+        record = {'type': msg_type}
+    record['time'] = time.time()
+    stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+    stream.flush()
+
+
+def emit_text(msg_type, title, message, stream, state):
+    """แสดงผลแบบข้อความธรรมดา (ข้ามความคืบหน้ารายไฟล์เพื่อไม่ให้ log ยาวเกินไป)"""
+    if msg_type == 'text':
+        stream.write(title)
+    elif msg_type == 'error':
+        sys.stderr.write(f"{title}: {message}\n")
+    elif msg_type == 'stats':
+        now = time.monotonic()
+        if now - state.get('last_stats', 0) < TEXT_STATS_INTERVAL:
+            return
+        state['last_stats'] = now
+        stream.write(f"[progress] {title}\n")
+    elif msg_type == 'backlog':
+        stream.write(f"[queue] backlog {title} | running {message.get('running', 0)} | done {message.get('done', 0)} | failed {message.get('failed', 0)}\n")
+    else:
+        return
+    stream.flush()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    encoding_settings = encoding_settings_from_args(args)
+    if encoding_settings is None:
+        sys.stderr.write(f"ไม่รู้จัก preset: {args.preset}\n")
+        return EXIT_SETUP_ERROR
+
+    message_queue = queue.Queue()
+    stop_event = threading.Event()
+    outcome = {}
+
+    skip_policy = skip_policy_from_args(args)
+
+    stager = None
+    if args.scratch:
+        try:
+            stager = ScratchStager(args.scratch, int(args.scratch_max_gb * 1024 ** 3) if args.scratch_max_gb else None,
+                                   args.prefetch, message_queue)
+        except OSError as e:
+            sys.stderr.write(f"ไม่สามารถใช้โฟลเดอร์ scratch: {e}\n")
+            return EXIT_SETUP_ERROR
+
+    common = dict(probe_workers=args.probe_workers, job_order=args.order, report_path=args.report,
+                  skip_policy=skip_policy, resume=not args.no_resume, recursive=args.recursive,
+                  include=args.include, exclude=args.exclude, stager=stager,
+                  admission=DeviceAdmission(args.per_device, check_space=not args.no_space_check),
+                  tracer=Tracer(args.trace) if args.trace else None)
+    if args.engine == 'asyncio':
+        if args.adaptive:
+            sys.stderr.write("--adaptive ใช้ได้กับ --engine threads เท่านั้น (asyncio ใช้จำนวนงานพร้อมกันคงที่)\n")
+        convert = functools.partial(start_conversion_async, copy_workers=args.copy_workers, **common)
+    else:
+        convert = functools.partial(start_conversion, adaptive=args.adaptive, min_workers=args.min_workers,
+                                    thread_budget=not args.no_thread_budget, **common)
+
+    def run():
+        try:
+            outcome['summary'] = convert(args.input, args.output, args.reduction, args.workers, message_queue,
+                                         stop_event, encoding_settings)
+        finally:
+            # start_conversion ปิด stager เองเมื่อจบ batch (กรณีเริ่มงานไม่ได้ต้องปิดที่นี่)
+            if stager:
+                stager.close()
+        message_queue.put(('exit', None, None))
+
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+
+    text_state = {}
+    cancelled = False
+    while True:
+        try:
+            msg_type, title, message = message_queue.get(timeout=0.5)
+        except queue.Empty:
+            if not worker.is_alive():
+                break
+            continue
+        except KeyboardInterrupt:
+            # Ctrl+C: หยุดงานที่เหลือและรอให้ ffmpeg ปิดตัว
+            cancelled = True
+            stop_event.set()
+            sys.stderr.write("\nกำลังยกเลิก...\n")
+            continue
+        if msg_type == 'exit':
+            break
+        if args.format == 'jsonl':
+            emit_jsonl(msg_type, title, message, sys.stdout)
+        else:
+            emit_text(msg_type, title, message, sys.stdout, text_state)
+
+    summary = outcome.get('summary')
+    if cancelled:
+        return EXIT_CANCELLED
+    if summary is None:
+        return EXIT_SETUP_ERROR
+    return EXIT_FAILED if summary['failed'] else EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
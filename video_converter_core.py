@@ -0,0 +1,2063 @@
+"""Conversion engine ของ Video Bitrate Reducer (ไม่ขึ้นกับ tkinter ใช้ร่วมกันระหว่าง GUI และ CLI)"""
+import os
+import subprocess
+import json
+import collections
+import csv
+import fnmatch
+import functools
+import pathlib
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+import threading
+import sys
+import time
+from dataclasses import dataclass, field, fields, asdict
+from typing import List, Optional
+
+from video_encoders import select_encoder, list_encoders, scaled_size, ENCODER_BACKENDS
+from video_quality import choose_bitrate, has_filter, resolve_metric, DEFAULT_QUALITY_TARGETS
+from video_scheduler import AdaptiveScheduler, AdmissionQueue, DeviceAdmission, ThreadBudget, default_min_workers
+from video_journal import BatchJournal, STATE_PENDING, STATE_RUNNING, STATE_DONE, STATE_FAILED
+from video_trace import format_trace_stats
+
+# --- Helpers ---
+def format_size(num_bytes):
+    """Format byte count into human readable string."""
+    for unit in ['B','KB','MB','GB','TB']:
+        if abs(num_bytes) < 1024.0:
+            return f"{num_bytes:3.2f}{unit}"
+        num_bytes /= 1024.0
+    return f"{num_bytes:.2f}PB"
+
+def format_duration(seconds):
+    """Format seconds as H:MM:SS."""
+    seconds = int(max(0, seconds or 0))
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+# ความถี่ในการส่ง overall progress/ETA ไปยัง GUI (วินาที)
+PROGRESS_INTERVAL = 0.5
+
+# --- การตั้งค่า Encoder ---
+# 'auto' = ตรวจสอบด้วย `ffmpeg -encoders` แล้วเลือก encoder ที่เร็วที่สุดที่ใช้ได้จริง
+# (NVENC → QSV → AMF → VAAPI → libx264) หรือระบุชื่อ encoder ตรงๆ เช่น 'h264_amf', 'h264_nvenc', 'libx265'
+GPU_ENCODER = 'auto'
+# encoder บน CPU ที่ใช้ encode ใหม่เมื่อ hardware encoder ใช้กับไฟล์นั้นไม่ได้
+CPU_FALLBACK_ENCODER = 'libx264'
+# ข้อความใน stderr ที่แปลว่าเปิด hardware encoder/อุปกรณ์/hwaccel ไม่ได้ (ไม่ใช่ไฟล์เสีย) จึงควรลองใหม่แบบอื่น
+HARDWARE_INIT_ERRORS = (
+    'Cannot load', 'No NVENC capable devices', 'OpenEncodeSessionEx failed', 'Error initializing output stream',
+    'Device creation failed', 'Failed to initialise VAAPI', 'No VA display found', 'Failed to create a VAAPI device',
+    'No device available for decoder', 'hwaccel initialisation returned error', 'Failed setup for format',
+    'Impossible to convert between the formats', 'Error reinitializing filters',
+)
+
+# --- Preset การตั้งค่า ---
+PRESETS = {
+    "เร็วที่สุด (Fast)": {
+        "quality": "speed",
+        "rc": "vbr_latency",
+        "usage": "ultralowlatency",
+        "preanalysis": "0",
+        "hwaccel": "auto"
+    },
+    "สมดุล (Balanced)": {
+        "quality": "balanced",
+        "rc": "vbr_peak",
+        "usage": "transcoding",
+        "preanalysis": "1",
+        "hwaccel": "auto"
+    },
+    "คุณภาพสูง (Quality)": {
+        "quality": "quality",
+        "rc": "vbr_peak",
+        "usage": "transcoding",
+        "preanalysis": "1",
+        "hwaccel": "auto"
+    },
+    "พื้นฐาน (Basic)": {
+        "quality": None,
+        "rc": None,
+        "usage": None,
+        "preanalysis": None,
+        "hwaccel": "auto"
+    }
+}
+
+# นามสกุลไฟล์วิดีโอที่รองรับ
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.mkv', '.avi', '.webm', '.flv')
+
+# --- หาตำแหน่ง ffmpeg และ ffprobe ---
+def find_ffmpeg_path():
+    """ค้นหา ffmpeg ในโฟลเดอร์โปรแกรมก่อน ถ้าไม่มีใช้จาก system PATH"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    
+    # ตรวจสอบในโฟลเดอร์เดียวกับโปรแกรม
+    local_ffmpeg = os.path.join(script_dir, 'ffmpeg.exe')
+    local_ffprobe = os.path.join(script_dir, 'ffprobe.exe')
+    
+    if os.path.exists(local_ffmpeg) and os.path.exists(local_ffprobe):
+        return local_ffmpeg, local_ffprobe
+    
+    # ถ้าไม่มี ใช้จาก PATH (จะ error ถ้าไม่มี)
+    return 'ffmpeg', 'ffprobe'
+
+FFMPEG_PATH, FFPROBE_PATH = find_ffmpeg_path()
+
+# --- ข้อมูลวิดีโอจาก FFprobe (probe ครั้งเดียวต่อไฟล์) ---
+@dataclass
+class VideoMetadata:
+    """ข้อมูลของไฟล์วิดีโอที่ได้จากการเรียก ffprobe เพียงครั้งเดียว"""
+    duration: Optional[float] = None
+    format_bitrate: Optional[int] = None
+    video_codec: Optional[str] = None
+    video_bitrate: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    fps: Optional[float] = None
+    audio_streams: List[dict] = field(default_factory=list)
+    size: int = 0
+
+    @property
+    def estimated_video_bitrate(self):
+        """Video bitrate (bps) จาก stream ถ้าไม่มีให้ประมาณจาก format หรือขนาดไฟล์ (80% ของ total)"""
+        if self.video_bitrate:
+            return self.video_bitrate
+        if self.format_bitrate:
+            return int(self.format_bitrate * 0.8)
+        if self.duration and self.size:
+            return int((self.size * 8) / self.duration * 0.8)
+        return None
+
+    @classmethod
+    def from_dict(cls, data):
+        known = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in data.items() if k in known})
+
+
+def _to_int(value):
+    try:
+        return int(value) if value not in (None, '', 'N/A') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(value) if value not in (None, '', 'N/A') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_frame_rate(value):
+    """แปลงค่า frame rate แบบ '30000/1001' เป็น float"""
+    if not value or value in ('0/0', 'N/A'):
+        return None
+    if '/' in value:
+        num, den = value.split('/', 1)
+        num, den = _to_float(num), _to_float(den)
+        return num / den if num and den else None
+    return _to_float(value)
+
+
+def parse_probe_output(data, file_size=0):
+    """แปลง JSON ที่ได้จาก ffprobe เป็น VideoMetadata"""
+    fmt = data.get('format', {})
+    meta = VideoMetadata(
+        duration=_to_float(fmt.get('duration')),
+        format_bitrate=_to_int(fmt.get('bit_rate')),
+        size=file_size,
+    )
+    for stream in data.get('streams', []):
+        codec_type = stream.get('codec_type')
+        if codec_type == 'video' and meta.video_codec is None:
+            meta.video_codec = stream.get('codec_name')
+            meta.video_bitrate = _to_int(stream.get('bit_rate'))
+            meta.width = _to_int(stream.get('width'))
+            meta.height = _to_int(stream.get('height'))
+            meta.fps = _parse_frame_rate(stream.get('avg_frame_rate')) or _parse_frame_rate(stream.get('r_frame_rate'))
+            # บาง container (เช่น mkv) ไม่มี duration ใน format
+            if meta.duration is None:
+                meta.duration = _to_float(stream.get('duration'))
+        elif codec_type == 'audio':
+            meta.audio_streams.append({
+                'index': stream.get('index'),
+                'codec': stream.get('codec_name'),
+                'bitrate': _to_int(stream.get('bit_rate')),
+                'channels': _to_int(stream.get('channels')),
+                'sample_rate': _to_int(stream.get('sample_rate')),
+            })
+    return meta
+
+
+# --- Cache ผลการ probe บนดิสก์ (key = path, size, mtime) ---
+class ProbeCache:
+    """เก็บ VideoMetadata ลงไฟล์ JSON เพื่อไม่ต้อง probe ไฟล์ที่ไม่เปลี่ยนแปลงซ้ำ"""
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        self._entries = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def get(self, path, size, mtime_ns):
+        with self._lock:
+            self._load()
+            entry = self._entries.get(os.path.abspath(path))
+        if entry and entry.get('size') == size and entry.get('mtime_ns') == mtime_ns:
+            return self._decode(entry['metadata'])
+        return None
+
+    def put(self, path, size, mtime_ns, metadata):
+        with self._lock:
+            self._load()
+            self._entries[os.path.abspath(path)] = {
+                'size': size,
+                'mtime_ns': mtime_ns,
+                'metadata': self._encode(metadata),
+            }
+            self._dirty = True
+
+    def _encode(self, value):
+        return asdict(value)
+
+    def _decode(self, data):
+        return VideoMetadata.from_dict(data)
+
+    def save(self):
+        """เขียน cache ลงดิสก์ (atomic rename) เฉพาะเมื่อมีการเปลี่ยนแปลง"""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+                tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self._entries, f, ensure_ascii=False)
+                os.replace(tmp_path, self.cache_path)
+                self._dirty = False
+            except OSError:
+                pass
+
+
+class QualityCache(ProbeCache):
+    """ผลการเลือก bitrate แบบ content-aware ต่อไฟล์ (หนึ่งไฟล์เก็บได้หลายผลตาม encoder/metric/เป้าหมาย)"""
+
+    def _encode(self, value):
+        return value
+
+    def _decode(self, data):
+        return data
+
+    def lookup(self, path, size, mtime_ns, key):
+        entry = self.get(path, size, mtime_ns)
+        return entry.get(key) if entry else None
+
+    def store(self, path, size, mtime_ns, key, value):
+        entry = dict(self.get(path, size, mtime_ns) or {})
+        entry[key] = value
+        self.put(path, size, mtime_ns, entry)
+
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.video_bitrate_reducer')
+PROBE_CACHE = ProbeCache(os.path.join(CACHE_DIR, 'probe_cache.json'))
+QUALITY_CACHE = QualityCache(os.path.join(CACHE_DIR, 'quality_cache.json'))
+
+
+def probe_command(video_path):
+    """คำสั่ง ffprobe ที่ดึงข้อมูลทั้งหมดที่ parse_probe_output ใช้ในครั้งเดียว (output เป็น JSON)"""
+    return [
+        FFPROBE_PATH,
+        '-v', 'error',
+        '-show_entries',
+        'format=duration,bit_rate:'
+        'stream=index,codec_type,codec_name,bit_rate,width,height,avg_frame_rate,r_frame_rate,duration,channels,sample_rate',
+        '-of', 'json',
+        video_path
+    ]
+
+
+def probe_video(video_path, use_cache=True):
+    """เรียก ffprobe ครั้งเดียวเพื่อดึง duration, bitrate, codec, ความละเอียด, fps และ audio streams
+
+    คืนค่า VideoMetadata หรือ None ถ้า probe ไม่สำเร็จ (raise FileNotFoundError ถ้าไม่พบ ffprobe)
+    """
+    try:
+        st = os.stat(video_path)
+    except OSError:
+        return None
+
+    if use_cache:
+        cached = PROBE_CACHE.get(video_path, st.st_size, st.st_mtime_ns)
+        if cached is not None:
+            return cached
+
+    try:
+        result = subprocess.run(probe_command(video_path), capture_output=True, text=True, check=True,
+                                encoding='utf-8', errors='replace',
+                                creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0)
+        metadata = parse_probe_output(json.loads(result.stdout or '{}'), st.st_size)
+    except FileNotFoundError:
+        raise FileNotFoundError("FFprobe not found")
+    except Exception:
+        return None
+
+    if use_cache:
+        PROBE_CACHE.put(video_path, st.st_size, st.st_mtime_ns, metadata)
+    return metadata
+
+
+# --- Pre-scan: probe ไฟล์ทั้งหมดก่อนเริ่ม encode ---
+DEFAULT_PROBE_WORKERS = min(8, (os.cpu_count() or 2) * 2)
+
+def prescan_videos(input_files, max_probe_workers=None, stop_event=None, tracer=None):
+    """Probe ไฟล์ทั้งหมดพร้อมกันด้วย pool แยกจาก encoder (จำกัดจำนวนด้วย max_probe_workers)
+
+    คืนค่า dict {input_path: VideoMetadata หรือ None} (raise FileNotFoundError ถ้าไม่พบ ffprobe)
+    tracer (video_trace.Tracer) บันทึก span 'probe' ของแต่ละไฟล์
+    """
+    max_probe_workers = max(1, int(max_probe_workers or DEFAULT_PROBE_WORKERS))
+    results = {}
+
+    def probe_video_traced(input_path):
+        with tracer.span('probe', file=os.path.basename(input_path)):
+            return probe_video(input_path)
+
+    probe = probe_video_traced if tracer else probe_video
+    with ThreadPoolExecutor(max_workers=max_probe_workers) as probe_pool:
+        futures = {}
+        for input_path in input_files:
+            if stop_event and stop_event.is_set():
+                break
+            futures[probe_pool.submit(probe, input_path)] = input_path
+        for fut in as_completed(futures):
+            results[futures[fut]] = fut.result()
+    return results
+
+
+def order_jobs(input_files, metadata_map, job_order="longest_first"):
+    """เรียงลำดับงาน encode: 'longest_first' (ไฟล์ยาวก่อน ช่วยให้ batch จบเร็วขึ้น) หรือ 'input' (ตามลำดับเดิม)"""
+    if job_order != "longest_first":
+        return list(input_files)
+
+    def sort_key(path):
+        meta = metadata_map.get(path)
+        # ไฟล์ที่ไม่ทราบความยาวให้ไปอยู่ท้ายสุด
+        return -(meta.duration or 0) if meta else 0
+
+    return sorted(input_files, key=sort_key)
+
+
+# --- ค้นหาไฟล์วิดีโอ (generator ด้วย os.scandir) ---
+def _matches_any(rel_path, patterns):
+    name = rel_path.rsplit('/', 1)[-1]
+    return any(fnmatch.fnmatch(rel_path, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+
+def iter_video_files(root, recursive=False, include=None, exclude=None, skip_dirs=()):
+    """yield path ของไฟล์วิดีโอใน root ทีละไฟล์ (ไม่สร้าง list ของทั้ง tree)
+
+    include/exclude เป็น glob pattern เทียบกับ path สัมพัทธ์ (คั่นด้วย '/') หรือชื่อไฟล์
+    skip_dirs คือโฟลเดอร์ที่ไม่ต้องค้นหา (เช่น โฟลเดอร์ output ที่อยู่ใน input)
+    """
+    skip = {os.path.normcase(os.path.abspath(d)) for d in skip_dirs if d}
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        subdirs = []
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if recursive and os.path.normcase(os.path.abspath(entry.path)) not in skip:
+                                subdirs.append(entry.path)
+                            continue
+                        if not entry.is_file():
+                            continue
+                    except OSError:
+                        continue
+                    if os.path.splitext(entry.name)[1].lower() not in VIDEO_EXTENSIONS:
+                        continue
+                    if include or exclude:
+                        rel_path = os.path.relpath(entry.path, root).replace(os.sep, '/')
+                        if include and not _matches_any(rel_path, include):
+                            continue
+                        if exclude and _matches_any(rel_path, exclude):
+                            continue
+                    yield entry.path
+        except OSError:
+            continue
+        # depth-first ตามลำดับชื่อโฟลเดอร์
+        stack.extend(sorted(subdirs, reverse=True))
+
+
+# --- ความคืบหน้ารวมแบบถ่วงน้ำหนักด้วยความยาววิดีโอ ---
+class BatchProgress:
+    """รวมวินาทีที่ encode แล้วจากทุก worker เพื่อคำนวณ % รวม, ความเร็ว (×realtime), MB/s และ ETA"""
+
+    def __init__(self, total_duration, total_files):
+        self.total_duration = total_duration or 0.0
+        self.total_files = total_files
+        self.start_time = time.monotonic()
+        self._lock = threading.Lock()
+        self._encoded = {}      # input_path -> วินาทีที่ encode แล้ว
+        self._speed = {}        # input_path -> speed ล่าสุดจาก ffmpeg (เฉพาะงานที่กำลังทำ)
+        self._output_bytes = {}  # input_path -> ขนาด output ล่าสุด
+        self._finished = set()
+
+    def update(self, input_path, encoded_seconds=None, speed=None, output_bytes=None):
+        with self._lock:
+            if encoded_seconds is not None:
+                self._encoded[input_path] = max(encoded_seconds, self._encoded.get(input_path, 0.0))
+            if speed is not None:
+                self._speed[input_path] = speed
+            if output_bytes is not None:
+                self._output_bytes[input_path] = output_bytes
+
+    def add_files(self, count):
+        """โหมด streaming: เพิ่มจำนวนไฟล์ที่พบระหว่างทำงาน"""
+        with self._lock:
+            self.total_files += count
+
+    def add_duration(self, seconds):
+        """โหมด streaming: เพิ่มความยาวของไฟล์ที่เพิ่ง probe เข้าไปในยอดรวม"""
+        with self._lock:
+            self.total_duration += seconds
+
+    def finish(self, input_path, duration=None):
+        """ทำเครื่องหมายว่างานจบแล้ว (สำเร็จ/ล้มเหลว/ข้าม) ให้นับเต็มความยาวของไฟล์"""
+        with self._lock:
+            self._finished.add(input_path)
+            self._speed.pop(input_path, None)
+            # ลบความคืบหน้าของแต่ละช่วง (segment-parallel ใช้ key "<path>#<index>")
+            prefix = f"{input_path}#"
+            for values in (self._encoded, self._speed):
+                for key in [k for k in values if k.startswith(prefix)]:
+                    values.pop(key)
+            part_bytes = [k for k in self._output_bytes if k.startswith(prefix)]
+            if part_bytes:
+                self._output_bytes[input_path] = sum(self._output_bytes.pop(k) for k in part_bytes)
+            if duration:
+                self._encoded[input_path] = duration
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = max(time.monotonic() - self.start_time, 1e-6)
+            encoded = sum(self._encoded.values())
+            speed = sum(self._speed.values())
+            output_bytes = sum(self._output_bytes.values())
+            finished = len(self._finished)
+
+        if self.total_duration > 0:
+            percent = min(100.0, encoded / self.total_duration * 100)
+            remaining = max(self.total_duration - encoded, 0.0)
+            rate = encoded / elapsed  # วินาทีวิดีโอต่อวินาทีจริง
+            eta = remaining / rate if rate > 0 else None
+        else:
+            percent = (finished / self.total_files * 100) if self.total_files else 100.0
+            eta = None
+        return {
+            'percent': percent,
+            'encoded_seconds': encoded,
+            'total_seconds': self.total_duration,
+            'speed': speed,
+            'output_mb_per_s': output_bytes / elapsed / (1024 * 1024),
+            'eta_seconds': eta,
+            'elapsed_seconds': elapsed,
+            'finished_files': finished,
+            'total_files': self.total_files,
+        }
+
+
+class ProgressBoard:
+    """ความคืบหน้ารายไฟล์แบบ shared state สำหรับ GUI
+
+    ใช้แทน message_queue ได้โดยตรง: put() ของ "file_progress" จะเขียนทับค่าล่าสุดของไฟล์นั้น (ไม่เข้าคิว)
+    ส่วน message ชนิดอื่นส่งต่อไปยัง message_queue จริง GUI เรียก take_changes() ครั้งเดียวต่อ frame
+    จึงได้เฉพาะไฟล์ที่เปลี่ยนตั้งแต่ frame ก่อน ไม่ว่า worker จะรายงานถี่แค่ไหน
+    key คือ path เต็มของ input (ไฟล์ชื่อซ้ำในโฟลเดอร์ย่อยต่างกันจึงไม่ปนกัน)
+    """
+
+    def __init__(self, message_queue):
+        self.message_queue = message_queue
+        self._lock = threading.Lock()
+        self._changed = {}  # input_path -> percent ล่าสุดที่ยังไม่ได้วาด
+
+    def put(self, item):
+        msg_type, title, message = item
+        if msg_type == 'file_progress':
+            with self._lock:
+                self._changed[title] = message
+            return
+        if msg_type == 'file_done':
+            # งานจบแล้ว: ทิ้งความคืบหน้าที่ยังไม่ได้วาด ไม่ให้ไปจองแถวหลังจากคืนแถวไปแล้ว
+            with self._lock:
+                self._changed.pop(title, None)
+        self.message_queue.put(item)
+
+    def take_changes(self):
+        """dict ของ input_path -> percent ที่เปลี่ยนตั้งแต่ครั้งก่อน (ล้างรายการหลังอ่าน)"""
+        with self._lock:
+            changes, self._changed = self._changed, {}
+        return changes
+
+
+def format_progress_stats(stats):
+    """ข้อความสรุปความเร็วสำหรับแสดงผล"""
+    eta = format_duration(stats['eta_seconds']) if stats['eta_seconds'] is not None else '--:--:--'
+    return (f"{stats['percent']:.1f}% | {format_duration(stats['encoded_seconds'])}/{format_duration(stats['total_seconds'])}"
+            f" | speed {stats['speed']:.2f}x | {stats['output_mb_per_s']:.2f} MB/s | ETA {eta}"
+            + (f" | workers {stats['workers']}" if stats.get('workers') else ""))
+
+
+def _format_throughput(num_bytes, seconds):
+    return f"{format_size(num_bytes / seconds)}/s" if seconds > 0 else "-"
+
+
+def format_staging_stats(stats):
+    """ข้อความสรุปของ staging (ScratchStager.stats) สำหรับท้าย batch"""
+    text = (f"ดึง input {stats['staged']} ไฟล์ {format_size(stats['input_bytes'])} "
+            f"({_format_throughput(stats['input_bytes'], stats['input_seconds'])})"
+            f" | อัปโหลด {stats['uploaded']} ไฟล์ {format_size(stats['output_bytes'])} "
+            f"({_format_throughput(stats['output_bytes'], stats['output_seconds'])})"
+            f" | รอ staging รวม {stats['wait_seconds']:.1f} วินาที")
+    if stats['direct']:
+        text += f" | อ่านจากต้นทางโดยตรง {stats['direct']} ไฟล์"
+    if stats['upload_failed']:
+        text += f" | อัปโหลดไม่สำเร็จ {stats['upload_failed']} ไฟล์"
+    return text
+
+
+# --- เลือก Encoder ---
+def get_encoder(encoding_settings=None):
+    """คืนค่า EncoderBackend ตาม encoding_settings['encoder'] (ถ้าไม่ระบุใช้ GPU_ENCODER)"""
+    requested = (encoding_settings or {}).get("encoder") or GPU_ENCODER
+    return select_encoder(FFMPEG_PATH, requested)
+
+
+def available_encoders():
+    """รายชื่อ encoder ที่รองรับและมีอยู่ใน ffmpeg build นี้ (สำหรับให้ผู้ใช้เลือก)"""
+    try:
+        listed = list_encoders(FFMPEG_PATH)
+    except FileNotFoundError:
+        return []
+    return [codec for codec in ENCODER_BACKENDS if codec in listed]
+
+
+# --- ฟังก์ชันย่อย: ดึง Bitrate เดิม (ใช้ FFprobe) ---
+def get_video_bitrate(video_path):
+    """ใช้ ffprobe เพื่อดึงค่า Video Bitrate เดิม (เป็น bps)"""
+    metadata = probe_video(video_path)
+    return metadata.estimated_video_bitrate if metadata else None
+
+# --- ผลลัพธ์ของแต่ละงาน ---
+STATUS_SUCCESS = 'success'
+STATUS_FAILED = 'failed'
+STATUS_SKIPPED = 'skipped'
+STATUS_CANCELLED = 'cancelled'
+
+# จำนวนบรรทัดท้ายของ stderr ที่เก็บไว้ใน JobResult.error_tail
+ERROR_TAIL_LINES = 10
+# จำนวนบรรทัดท้ายของ stderr ที่เก็บใน memory ระหว่างรัน ffmpeg (ring buffer ต่อ process)
+STDERR_TAIL_LINES = 200
+
+FFMPEG_NOT_FOUND_MESSAGE = "❌ Error: ไม่พบ FFmpeg/FFprobe! กรุณาติดตั้ง FFmpeg และเพิ่มใน PATH\nดาวน์โหลดได้ที่: https://ffmpeg.org/download.html"
+
+
+@dataclass
+class JobResult:
+    """ผลลัพธ์ของการแปลงไฟล์หนึ่งไฟล์ (message คือข้อความสำหรับแสดงใน log)"""
+    input_path: str
+    status: str = STATUS_FAILED
+    message: str = ''
+    output_path: Optional[str] = None
+    original_bitrate: Optional[int] = None
+    new_bitrate: Optional[int] = None
+    duration: Optional[float] = None
+    input_size: Optional[int] = None
+    output_size: Optional[int] = None
+    wall_time: float = 0.0
+    speed: Optional[float] = None
+    returncode: Optional[int] = None
+    error_tail: str = ''
+    target_size: Optional[int] = None
+    quality_metric: Optional[str] = None
+    quality_score: Optional[float] = None
+    method: Optional[str] = None
+    log_path: Optional[str] = None
+    stage_wait: Optional[float] = None
+
+    @property
+    def filename(self):
+        return os.path.basename(self.input_path)
+
+    @property
+    def ok(self):
+        return self.status == STATUS_SUCCESS
+
+    def __str__(self):
+        return self.message
+
+
+REPORT_FIELDS = [f.name for f in fields(JobResult)]
+
+
+class ReportWriter:
+    """เขียนผลลัพธ์ทีละงานลงไฟล์ CSV หรือ JSON (เลือกตามนามสกุลไฟล์) โดยไม่ต้องเก็บทั้งหมดไว้ใน memory"""
+
+    def __init__(self, report_path):
+        self.is_csv = pathlib.Path(report_path).suffix.lower() == '.csv'
+        self._file = open(report_path, 'w', encoding='utf-8', newline='' if self.is_csv else None)
+        self._count = 0
+        if self.is_csv:
+            self._writer = csv.DictWriter(self._file, fieldnames=REPORT_FIELDS)
+            self._writer.writeheader()
+        else:
+            self._file.write('[')
+
+    def write(self, result):
+        row = asdict(result)
+        if self.is_csv:
+            self._writer.writerow(row)
+        else:
+            self._file.write((',\n' if self._count else '\n') + json.dumps(row, ensure_ascii=False))
+        self._count += 1
+
+    def close(self):
+        if not self.is_csv:
+            self._file.write('\n]\n')
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def export_results(results, report_path):
+    """บันทึกผลลัพธ์ทั้งหมดเป็น CSV หรือ JSON (เลือกตามนามสกุลไฟล์)"""
+    with ReportWriter(report_path) as report:
+        for r in results:
+            report.write(r)
+
+
+def new_summary():
+    """สรุปของ batch ที่ยังว่าง (เพิ่มผลลัพธ์ทีละงานด้วย add_result_to_summary)"""
+    return {
+        'total': 0,
+        'successful': 0,
+        'failed': 0,
+        'skipped': 0,
+        'cancelled': 0,
+        'total_original_size': 0,
+        'total_output_size': 0,
+        'total_wall_time': 0.0,
+        'methods': {},
+    }
+
+
+def add_result_to_summary(summary, r):
+    summary['total'] += 1
+    summary['total_wall_time'] += r.wall_time
+    if r.status == STATUS_SUCCESS:
+        summary['successful'] += 1
+        if r.method:
+            summary['methods'][r.method] = summary['methods'].get(r.method, 0) + 1
+        # นับขนาดเฉพาะไฟล์ที่สำเร็จและทราบขนาดทั้งสองฝั่ง
+        if r.input_size and r.output_size is not None:
+            summary['total_original_size'] += r.input_size
+            summary['total_output_size'] += r.output_size
+    elif r.status == STATUS_SKIPPED:
+        summary['skipped'] += 1
+    elif r.status == STATUS_CANCELLED:
+        summary['cancelled'] += 1
+    else:
+        summary['failed'] += 1
+
+
+def summarize_results(results):
+    """รวมผลลัพธ์ของทุกงานเป็นสรุปของ batch (ไม่เรียก filesystem เพิ่ม)"""
+    summary = new_summary()
+    for r in results:
+        add_result_to_summary(summary, r)
+    return summary
+
+
+# --- Incremental mode: ข้ามไฟล์ที่ไม่คุ้มค่าจะแปลงซ้ำ ---
+@dataclass
+class SkipPolicy:
+    """เงื่อนไขการข้ามไฟล์
+
+    skip_existing: ข้ามถ้า output มีอยู่แล้วและใหม่กว่า input
+    min_bitrate_bps: ข้ามถ้า video bitrate เดิมต่ำกว่าค่านี้อยู่แล้ว
+    min_savings_percent: ข้ามถ้าคาดว่าจะลดขนาดไฟล์ได้น้อยกว่ากี่ % (เฉพาะงาน encode)
+    """
+    skip_existing: bool = False
+    min_bitrate_bps: Optional[int] = None
+    min_savings_percent: Optional[float] = None
+
+
+def estimate_output_size(metadata, new_bitrate_bps):
+    """ประมาณขนาด output (bytes) จาก video bitrate ใหม่ + audio bitrate เดิม × duration"""
+    if not metadata.duration:
+        return None
+    audio_bps = sum(a.get('bitrate') or 0 for a in metadata.audio_streams)
+    return int((new_bitrate_bps + audio_bps) * metadata.duration / 8)
+
+
+def predict_output_size(metadata, input_path, reduction_percent, encoding_settings):
+    """ขนาด output ที่คาดไว้ก่อนเริ่มงาน (bitrate เป้าหมาย × ความยาว) สำหรับการจองพื้นที่ของ admission control
+
+    ใช้ขนาด input แทนเมื่อยังไม่ทราบ metadata (โหมด streaming probe ภายใน worker) หรือเมื่อเป็น stream copy
+    """
+    if metadata is None or not metadata.duration or not metadata.estimated_video_bitrate:
+        try:
+            return os.path.getsize(input_path)
+        except OSError:
+            return None
+    if encoding_settings.get("target_size_mb"):
+        # bitrate ไม่เกินต้นฉบับ output จึงไม่ใหญ่กว่า input
+        target_size = int(float(encoding_settings["target_size_mb"]) * 1024 * 1024)
+        return min(target_size, metadata.size or target_size)
+    new_bitrate_bps = int(metadata.estimated_video_bitrate * (1.0 - reduction_percent / 100.0))
+    if choose_method(metadata, input_path, new_bitrate_bps, encoding_settings) != METHOD_ENCODE:
+        return metadata.size or None
+    return estimate_output_size(metadata, new_bitrate_bps)
+
+
+def get_skip_reason(skip_policy, input_path, output_path, metadata, new_bitrate_bps, method=None):
+    """คืนค่าเหตุผลที่ควรข้ามไฟล์นี้ หรือ None ถ้าควรแปลง
+
+    method = วิธีแปลงจาก choose_method: stream copy/remux ไม่ได้ลดขนาด จึงไม่ใช้เกณฑ์ min_savings_percent
+    """
+    if skip_policy is None:
+        return None
+    if skip_policy.skip_existing:
+        try:
+            if os.stat(output_path).st_mtime >= os.stat(input_path).st_mtime:
+                return "มีไฟล์ output ที่ใหม่กว่าอยู่แล้ว"
+        except OSError:
+            pass
+    original_bitrate_bps = metadata.estimated_video_bitrate
+    if skip_policy.min_bitrate_bps and original_bitrate_bps and original_bitrate_bps <= skip_policy.min_bitrate_bps:
+        return f"bitrate {original_bitrate_bps / 1_000_000:.2f} Mbps ต่ำกว่าเกณฑ์ {skip_policy.min_bitrate_bps / 1_000_000:.2f} Mbps อยู่แล้ว"
+    if skip_policy.min_savings_percent and metadata.size and method not in (METHOD_COPY, METHOD_REMUX):
+        estimated = estimate_output_size(metadata, new_bitrate_bps)
+        if estimated is not None:
+            savings = (metadata.size - estimated) / metadata.size * 100
+            if savings < skip_policy.min_savings_percent:
+                return f"คาดว่าจะลดขนาดได้เพียง {savings:.1f}% (เกณฑ์ {skip_policy.min_savings_percent:g}%)"
+    return None
+
+
+def get_output_path(input_path, output_folder, input_root=None):
+    """path ของไฟล์ output (ใช้ชื่อไฟล์เดิมเลย ไม่ต่อท้าย _reduced)
+
+    ถ้าระบุ input_root จะคงโครงสร้างโฟลเดอร์ย่อยเทียบกับ input_root ไว้ใต้ output_folder
+    """
+    if input_root:
+        rel_path = os.path.relpath(input_path, input_root)
+        if not rel_path.startswith(os.pardir):
+            return os.path.join(output_folder, rel_path)
+    return os.path.join(output_folder, os.path.basename(input_path))
+
+
+def job_log_path(log_dir, input_path, input_root=None):
+    """path ของ spool file ที่เก็บ stderr ทั้งหมดของงานนี้ (ชื่อตาม path เทียบกับ input_root เพื่อไม่ให้ชนกัน)"""
+    name = os.path.basename(input_path)
+    if input_root:
+        rel_path = os.path.relpath(input_path, input_root)
+        if not rel_path.startswith(os.pardir):
+            name = rel_path.replace(os.sep, '__')
+    return os.path.join(log_dir, name + '.log')
+
+
+def finalize_output(temp_output_path, output_path, stager=None):
+    """ย้ายไฟล์ชั่วคราวที่ encode สำเร็จไปเป็นชื่อจริง คืนค่าขนาด output (None ถ้า stat ไม่ได้) raise OSError ถ้าย้ายไม่ได้
+
+    ขนาดไฟล์อ่านก่อนย้าย เพราะ output ที่ staging ยังอัปโหลดไม่เสร็จ
+    """
+    try:
+        out_size = os.path.getsize(temp_output_path)
+    except OSError:
+        out_size = None
+    # rename แบบ atomic บน volume เดียวกัน หรือส่งให้ uploader ของ staging copy กลับปลายทางแล้ว rename เองใน background
+    if stager:
+        stager.upload(temp_output_path, output_path)
+    else:
+        os.replace(temp_output_path, output_path)
+    return out_size
+
+
+def partial_output_path(output_path):
+    """ไฟล์ชั่วคราวระหว่าง encode (คงนามสกุลเดิมไว้ให้ ffmpeg เลือก container ได้ถูก)"""
+    folder, name = os.path.split(output_path)
+    stem, ext = os.path.splitext(name)
+    return os.path.join(folder, f".{stem}.partial{ext}")
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# --- Stream copy / remux (fast path ที่ไม่ต้อง encode) ---
+METHOD_ENCODE = 'encode'
+METHOD_COPY = 'copy'
+METHOD_REMUX = 'remux'
+# codec ที่คัดลอก stream ไปใช้ต่อได้โดยไม่ต้อง encode ใหม่
+COPYABLE_VIDEO_CODECS = ('h264', 'hevc')
+# container เก่าที่ย้ายไปเป็น .mp4 เมื่อคัดลอก stream
+REMUX_SOURCE_EXTENSIONS = ('.flv', '.avi')
+REMUX_EXTENSION = '.mp4'
+# container ที่ใช้ -movflags +faststart ได้ (ย้าย moov ไปต้นไฟล์ให้เล่นบนเว็บได้ทันที)
+FASTSTART_EXTENSIONS = ('.mp4', '.mov')
+# audio codec ที่ใส่ใน mp4/mov ได้ตรงๆ (นอกนั้นแปลงเป็น AAC ระหว่าง remux)
+MP4_AUDIO_CODECS = ('aac', 'mp3', 'ac3', 'eac3', 'alac', 'opus', 'flac')
+
+
+def choose_method(metadata, input_path, new_bitrate_bps, encoding_settings):
+    """เลือกวิธีแปลง: METHOD_ENCODE, METHOD_COPY หรือ METHOD_REMUX (ใช้ได้เมื่อเปิด encoding_settings["stream_copy"])
+
+    คัดลอก stream เมื่อ codec เป็น H.264/HEVC และ bitrate เดิมไม่เกินเป้าหมายอยู่แล้ว
+    (bitrate ที่คำนวณได้ไม่ต่ำกว่าเดิม เช่นไฟล์ที่เล็กกว่า target size หรือ bitrate ไม่เกิน copy_below_kbps)
+    ถ้า input เป็น .flv/.avi จะ remux เป็น .mp4 แทน (ไฟล์ที่ต้องย่อภาพต้อง encode เสมอ)
+    """
+    if not encoding_settings.get("stream_copy") or metadata.video_codec not in COPYABLE_VIDEO_CODECS:
+        return METHOD_ENCODE
+    if scaled_size(metadata.width, metadata.height, encoding_settings.get("max_height")):
+        return METHOD_ENCODE
+    original_bitrate_bps = metadata.estimated_video_bitrate
+    copy_below_bps = (encoding_settings.get("copy_below_kbps") or 0) * 1000
+    if not original_bitrate_bps or (new_bitrate_bps < original_bitrate_bps and original_bitrate_bps > copy_below_bps):
+        return METHOD_ENCODE
+    if pathlib.Path(input_path).suffix.lower() in REMUX_SOURCE_EXTENSIONS:
+        return METHOD_REMUX
+    return METHOD_COPY
+
+
+def stream_copy_command(input_path, output_path, metadata):
+    """คำสั่ง ffmpeg ที่คัดลอก stream ลง output_path (เลือก container ตามนามสกุล) พร้อม progress"""
+    command = [FFMPEG_PATH, '-y']
+    if pathlib.Path(input_path).suffix.lower() in REMUX_SOURCE_EXTENSIONS:
+        # flv/avi มักไม่มี pts ครบ สร้างใหม่ให้ muxer ของ mp4
+        command += ['-fflags', '+genpts']
+    command += ['-i', os.path.abspath(input_path), '-c', 'copy']
+    output_ext = os.path.splitext(output_path)[1].lower()
+    if output_ext in FASTSTART_EXTENSIONS:
+        if any(a.get('codec') not in MP4_AUDIO_CODECS for a in metadata.audio_streams):
+            command += ['-c:a', 'aac', '-b:a', f"{DEFAULT_AUDIO_BITRATE // 1000}k"]
+        if metadata.video_codec == 'hevc':
+            # tag hvc1 ให้เล่นได้บน QuickTime/Safari
+            command += ['-tag:v', 'hvc1']
+        command += ['-movflags', '+faststart']
+    return command + ['-progress', 'pipe:1', '-nostats', output_path]
+
+
+# --- Target size / two-pass ---
+# เผื่อ overhead ของ container (header, index) จาก budget ขนาดไฟล์
+CONTAINER_OVERHEAD = 0.02
+# audio bitrate ที่สมมติไว้เมื่อ ffprobe ไม่รายงาน bitrate ของ audio stream
+DEFAULT_AUDIO_BITRATE = 128_000
+# video bitrate ต่ำสุดที่ยอมให้ encode ในโหมด target size (ต่ำกว่านี้ภาพจะเสียจนใช้ไม่ได้)
+MIN_TARGET_VIDEO_BITRATE = 100_000
+
+
+def compute_target_bitrate(metadata, target_bytes):
+    """video bitrate (bps) ที่ทำให้ไฟล์ output มีขนาดประมาณ target_bytes หรือ None ถ้าไม่ทราบความยาว
+
+    หัก overhead ของ container และ audio bitrate (audio ถูก copy มาตามเดิม) ออกจาก budget ก่อน
+    """
+    if not metadata.duration or not target_bytes:
+        return None
+    audio_bps = sum(a.get('bitrate') or DEFAULT_AUDIO_BITRATE for a in metadata.audio_streams)
+    total_bps = target_bytes * 8 * (1 - CONTAINER_OVERHEAD) / metadata.duration
+    return int(total_bps - audio_bps)
+
+
+def content_aware_bitrate(input_path, metadata, encoder, encoding_settings, stop_event=None, message_queue=None):
+    """เลือก bitrate ด้วย sample encode + quality metric (ใช้ผลใน QUALITY_CACHE ถ้าไฟล์ไม่เปลี่ยน)
+
+    คืนค่า dict จาก video_quality.choose_bitrate หรือ None ถ้าวัดไม่ได้
+    """
+    metric = resolve_metric(FFMPEG_PATH, encoding_settings.get("quality_metric") or 'auto')
+    target = float(encoding_settings.get("quality_target") or DEFAULT_QUALITY_TARGETS[metric])
+    # ตัวอย่างต้องย่อภาพเหมือน output จริง (max_height) คะแนนจึงตรงกับไฟล์ที่ได้
+    encoding_settings = plan_scale(metadata, encoder, encoding_settings)
+    key = f"{encoder.codec}|{encoding_settings.get('quality')}|{metric}|{target:g}"
+    if encoding_settings.get("scale_size"):
+        width, height = encoding_settings["scale_size"]
+        key += f"|{width}x{height}"
+    try:
+        st = os.stat(input_path)
+    except OSError:
+        return None
+    cached = QUALITY_CACHE.lookup(input_path, st.st_size, st.st_mtime_ns, key)
+    if cached:
+        return cached
+    if message_queue:
+        message_queue.put(("text", f"🔬 กำลังวัดคุณภาพตัวอย่าง: {os.path.basename(input_path)}\n", None))
+    choice = choose_bitrate(FFMPEG_PATH, encoder, encoding_settings, input_path, metadata.duration,
+                            metadata.estimated_video_bitrate, metric, target, stop_event)
+    if choice:
+        QUALITY_CACHE.store(input_path, st.st_size, st.st_mtime_ns, key, choice)
+    return choice
+
+
+@dataclass
+class FfmpegRun:
+    """ผลลัพธ์ของการรัน ffmpeg หนึ่งครั้ง"""
+    returncode: Optional[int] = None
+    stderr: str = ''  # เฉพาะ STDERR_TAIL_LINES บรรทัดท้าย (log เต็มอยู่ใน spool file ถ้าเปิดไว้)
+    speed: Optional[float] = None
+    cancelled: bool = False
+    spawn_time: Optional[float] = None  # วินาทีที่ใช้สร้าง process (สำหรับ trace)
+
+
+def open_job_log(log_path, command):
+    """เปิด spool file ของงาน (append) และเขียนหัวข้อของคำสั่งนี้ คืนค่า None ถ้าไม่ได้เปิด log หรือเปิดไม่ได้"""
+    if not log_path:
+        return None
+    try:
+        log_file = open(log_path, 'a', encoding='utf-8', errors='replace')
+    except OSError:
+        return None
+    log_file.write(f"\n# {time.strftime('%Y-%m-%d %H:%M:%S')} {subprocess.list2cmdline(command)}\n")
+    return log_file
+
+
+def append_job_log(log_path, command, output):
+    """เขียน output ของคำสั่งที่รันด้วย subprocess.run (เช่น split/join ของโหมดแบ่งช่วง) ลง spool file"""
+    log_file = open_job_log(log_path, command)
+    if log_file:
+        with log_file:
+            log_file.write(output or '')
+
+
+class StderrDrain:
+    """อ่าน stderr ของ ffmpeg ใน thread แยกตลอดเวลาที่ process รัน
+
+    ถ้าอ่าน stderr หลัง stdout จบเท่านั้น ffmpeg ที่เขียน stderr จน pipe เต็มจะค้างรอ (deadlock)
+    เก็บไว้ใน memory แค่ max_lines บรรทัดล่าสุด ส่วนทุกบรรทัดเขียนลง log_file ถ้ามี
+    """
+
+    def __init__(self, stream, max_lines=None, log_file=None):
+        self.lines = collections.deque(maxlen=max_lines or STDERR_TAIL_LINES)
+        self._stream = stream
+        self._log_file = log_file
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def _drain(self):
+        try:
+            for line in self._stream:
+                self.lines.append(line.rstrip('\n'))
+                if self._log_file:
+                    self._log_file.write(line)
+        except (OSError, ValueError) as e:
+            # pipe ถูกปิดระหว่างอ่าน (เช่น ตอนยกเลิก)
+            self.lines.append(f'Error reading stderr: {e}')
+
+    def text(self, timeout=5):
+        """รอให้อ่านจนจบ (process ปิด stderr แล้ว) และคืนค่าบรรทัดท้ายที่เก็บไว้"""
+        self._thread.join(timeout)
+        return '\n'.join(self.lines)
+
+
+def run_ffmpeg(command, input_path, duration, message_queue=None, stop_event=None, progress=None, time_offset=0.0, time_scale=1.0, cwd=None, log_path=None):
+    """รัน ffmpeg (ที่มี -progress pipe:1) และรายงานความคืบหน้าระหว่างทาง
+
+    time_offset/time_scale ใช้แปลงเวลาที่ encode แล้วของ pass นี้เป็นความคืบหน้าของทั้งไฟล์
+    (เช่น two-pass: pass 1 = 0-50%, pass 2 = 50-100%)
+    stderr ถูกอ่านพร้อมกันใน thread แยก (เก็บแค่บรรทัดท้าย) และเขียนทั้งหมดต่อท้าย log_path ถ้าระบุ
+    raise FileNotFoundError ถ้าไม่พบ ffmpeg
+    """
+    run = FfmpegRun()
+    log_file = open_job_log(log_path, command)
+    spawn_start = time.perf_counter()
+    try:
+        proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd,
+                                text=True, bufsize=1, encoding='utf-8', errors='replace',
+                                creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0)
+    except OSError:
+        if log_file:
+            log_file.close()
+        raise
+    run.spawn_time = time.perf_counter() - spawn_start
+    drain = StderrDrain(proc.stderr, log_file=log_file)
+    try:
+        _read_progress(proc, run, input_path, duration, message_queue, stop_event, progress, time_offset, time_scale)
+        if not run.cancelled:
+            run.returncode = proc.wait()
+        run.stderr = drain.text()
+    finally:
+        if log_file:
+            log_file.close()
+    return run
+
+
+class FfmpegProgress:
+    """แปลงบรรทัด -progress ของ ffmpeg เป็นความคืบหน้า (ใช้ร่วมกันระหว่าง run_ffmpeg และ engine แบบ asyncio)"""
+
+    def __init__(self, run, input_path, duration, message_queue=None, progress=None, time_offset=0.0, time_scale=1.0):
+        self.run = run
+        self.input_path = input_path
+        self.duration = duration
+        self.message_queue = message_queue
+        self.progress = progress
+        self.time_offset = time_offset
+        self.time_scale = time_scale
+        self.last_percent = -1
+
+    def report_percent(self, encoded_seconds):
+        if self.duration and self.duration > 0:
+            return min(100, int((self.time_offset + encoded_seconds * self.time_scale) / self.duration * 100))
+        return 0
+
+    def _post(self, percent):
+        if self.message_queue:
+            try:
+                self.message_queue.put(("file_progress", self.input_path, percent))
+            except Exception:
+                pass
+
+    def feed(self, raw_line):
+        line = raw_line.strip()
+        if not line or '=' not in line:
+            return
+        k, v = line.split('=', 1)
+        progress = self.progress
+        if k == 'out_time_ms':
+            try:
+                encoded_seconds = int(v) / 1000000.0
+                if progress:
+                    progress.update(self.input_path, encoded_seconds=self.time_offset + encoded_seconds * self.time_scale)
+                percent = self.report_percent(encoded_seconds)
+            except Exception:
+                percent = 0
+            # อัพเดททุกครั้งที่เปลี่ยนแปลง (แม้แต่ 1%)
+            if percent != self.last_percent and percent >= 0:
+                self._post(percent)
+                self.last_percent = percent
+        elif k == 'speed':
+            # ตัวอย่าง: speed=2.35x หรือ speed=N/A
+            speed = _to_float(v.rstrip('x').strip())
+            if speed is not None:
+                self.run.speed = speed
+                if progress:
+                    progress.update(self.input_path, speed=speed)
+        elif k == 'total_size' and progress:
+            output_bytes = _to_int(v)
+            if output_bytes is not None:
+                progress.update(self.input_path, output_bytes=output_bytes)
+        elif k == 'progress' and v == 'end':
+            self._post(self.report_percent(self.duration or 0))
+
+
+def _read_progress(proc, run, input_path, duration, message_queue, stop_event, progress, time_offset, time_scale):
+    """อ่าน -progress จาก stdout ของ ffmpeg จนจบ (หรือจนถูกสั่งหยุด ซึ่งจะ terminate process และตั้ง run.cancelled)"""
+    parser = FfmpegProgress(run, input_path, duration, message_queue, progress, time_offset, time_scale)
+    if proc.stdout:
+        for raw_line in proc.stdout:
+            # ตรวจสอบว่าถูกสั่งหยุดหรือไม่
+            if stop_event and stop_event.is_set():
+                proc.terminate()
+                try:
+                    proc.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                run.cancelled = True
+                return
+            parser.feed(raw_line)
+
+
+# --- Segment-parallel: แบ่งไฟล์ยาวที่ keyframe แล้ว encode แต่ละช่วงพร้อมกัน ---
+# ความยาวขั้นต่ำของแต่ละช่วง (วินาที) ไฟล์ที่สั้นกว่านี้จะถูกแบ่งน้อยลงหรือไม่แบ่ง
+MIN_SEGMENT_SECONDS = 30.0
+
+
+def plan_segment_count(duration, segments):
+    """จำนวนช่วงที่จะแบ่งจริง (0 = ไม่แบ่ง) ตามความยาวไฟล์และ MIN_SEGMENT_SECONDS"""
+    if not duration or not segments or segments < 2:
+        return 0
+    count = min(int(segments), int(duration // MIN_SEGMENT_SECONDS))
+    return count if count >= 2 else 0
+
+
+class _SegmentProgress:
+    """รวม % ของแต่ละช่วงเป็น % ของทั้งไฟล์ แล้วส่งต่อไปยัง message_queue จริง"""
+
+    def __init__(self, message_queue, input_path, durations):
+        self.message_queue = message_queue
+        self.input_path = input_path
+        self.durations = durations
+        self.total = sum(durations) or 1.0
+        self._encoded = [0.0] * len(durations)
+        self._last_percent = -1
+        self._lock = threading.Lock()
+
+    def part(self, index):
+        return _SegmentPart(self, index)
+
+    def update(self, index, percent):
+        with self._lock:
+            self._encoded[index] = self.durations[index] * percent / 100
+            total_percent = min(100, int(sum(self._encoded) / self.total * 100))
+            if total_percent == self._last_percent:
+                return
+            self._last_percent = total_percent
+        if self.message_queue:
+            self.message_queue.put(("file_progress", self.input_path, total_percent))
+
+
+class _SegmentPart:
+    """ใช้แทน message_queue ของ run_ffmpeg สำหรับช่วงที่ index"""
+
+    def __init__(self, parent, index):
+        self.parent = parent
+        self.index = index
+
+    def put(self, item):
+        msg_type, _, percent = item
+        if msg_type == 'file_progress':
+            self.parent.update(self.index, percent)
+
+
+def encode_segmented(input_path, temp_output_path, encoder, encoding_settings, bitrate_bps, duration, segments, message_queue=None, stop_event=None, progress=None, executor=None, thread_budget=None, log_path=None, max_parallel=None, job_path=None):
+    """encode ไฟล์เดียวแบบแบ่งช่วง: ตัด video ที่ keyframe (stream copy) → encode แต่ละช่วงใน executor → ต่อด้วย concat demuxer
+
+    ทุก frame อยู่ในช่วงเดียวพอดี (segment muxer ตัดที่ keyframe) จำนวน frame จึงเท่ากับการ encode รอบเดียว
+    audio ถูก copy จากต้นฉบับครั้งเดียวตอนต่อไฟล์
+    ถ้าไม่ส่ง executor จะสร้าง pool ของตัวเองที่ encode พร้อมกันไม่เกิน max_parallel ช่วง (None = ทุกช่วง)
+    job_path = path ของงานที่ใช้เป็น key ของความคืบหน้า ถ้าต่างจาก input_path (เช่น input ที่ staging มาไว้ใน scratch)
+    คืนค่า FfmpegRun ของขั้นตอนที่ล้มเหลว (หรือของขั้นตอนสุดท้ายถ้าสำเร็จ)
+    """
+    work_dir = tempfile.mkdtemp(prefix='.vbr_segments_', dir=os.path.dirname(temp_output_path) or None)
+    creationflags = subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
+    own_executor = None
+    try:
+        # 1) ตัด video stream เป็นช่วงๆ ที่ keyframe ถัดจากจุดแบ่ง (ไม่ encode)
+        split_times = ','.join(f'{duration * i / segments:.3f}' for i in range(1, segments))
+        split_command = [FFMPEG_PATH, '-y', '-v', 'error', '-i', input_path, '-map', '0:v:0', '-c', 'copy',
+                         '-f', 'segment', '-segment_times', split_times, '-reset_timestamps', '1',
+                         os.path.join(work_dir, 'src_%03d.mkv')]
+        split = subprocess.run(split_command, capture_output=True, text=True, encoding='utf-8', errors='replace',
+                               creationflags=creationflags)
+        append_job_log(log_path, split_command, split.stderr)
+        if split.returncode != 0:
+            return FfmpegRun(returncode=split.returncode, stderr=split.stderr)
+        parts = sorted(name for name in os.listdir(work_dir) if name.startswith('src_'))
+        durations = []
+        for name in parts:
+            meta = probe_video(os.path.join(work_dir, name), use_cache=False)
+            durations.append(meta.duration if meta and meta.duration else duration / len(parts))
+        job_path = job_path or input_path
+        reporter = _SegmentProgress(message_queue, job_path, durations)
+
+        # 2) encode แต่ละช่วง (video อย่างเดียว) ใน worker pool
+        def encode_part(index):
+            # แต่ละช่วงจอง thread ของตัวเองตอนเริ่ม (ไม่ใช่ตอนส่งเข้า pool)
+            threads = thread_budget.acquire() if thread_budget and not encoder.hardware else None
+            try:
+                command = ([FFMPEG_PATH, '-y'] + encoder.input_args(encoding_settings) + decoder_thread_args(threads)
+                           + ['-i', os.path.join(work_dir, parts[index])]
+                           + encoder.encode_args(encoding_settings, bitrate_bps, threads)
+                           + ['-an', '-progress', 'pipe:1', '-nostats', os.path.join(work_dir, f'enc_{index:03d}.mkv')])
+                return run_ffmpeg(command, f'{job_path}#{index}', durations[index], reporter.part(index),
+                                  stop_event, progress, log_path=log_path)
+            finally:
+                if threads:
+                    thread_budget.release(threads)
+
+        if executor is None:
+            executor = own_executor = ThreadPoolExecutor(max_workers=min(len(parts), max_parallel or len(parts)))
+        futures = [executor.submit(encode_part, index) for index in range(len(parts))]
+        runs = []
+        for index, future in enumerate(futures):
+            # ช่วงที่ยังไม่ได้เริ่ม (pool เต็ม) ให้ thread นี้ encode เอง เพื่อไม่ให้รอกันจน deadlock
+            runs.append(encode_part(index) if future.cancel() else future.result())
+        for run in runs:
+            if run.cancelled or run.returncode != 0:
+                return run
+
+        # 3) ต่อช่วงที่ encode แล้วด้วย concat demuxer (stream copy) และ copy audio จากต้นฉบับ
+        list_path = os.path.join(work_dir, 'concat.txt')
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for index in range(len(parts)):
+                f.write(f"file 'enc_{index:03d}.mkv'\n")
+        join_command = [FFMPEG_PATH, '-y', '-v', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+                        '-i', input_path, '-map', '0:v', '-map', '1:a:0?', '-c', 'copy', temp_output_path]
+        join = subprocess.run(join_command, capture_output=True, text=True, encoding='utf-8', errors='replace',
+                              creationflags=creationflags)
+        append_job_log(log_path, join_command, join.stderr)
+        return FfmpegRun(returncode=join.returncode, stderr=join.stderr)
+    finally:
+        if own_executor:
+            own_executor.shutdown(wait=True)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def is_hardware_init_error(stderr):
+    """ffmpeg ล้มเหลวเพราะเปิด hardware encoder/decoder/อุปกรณ์ไม่ได้หรือไม่ (ดู HARDWARE_INIT_ERRORS)"""
+    return any(signature in (stderr or '') for signature in HARDWARE_INIT_ERRORS)
+
+
+def plan_scale(metadata, encoder, encoding_settings):
+    """settings ของงานนี้พร้อม scale_size/scale_on_gpu ถ้าต้องย่อภาพตาม encoding_settings["max_height"]
+
+    encoding_settings["scaler"]: 'auto' = GPU ถ้า encoder มี filter ย่อภาพบน GPU และ ffmpeg build นี้มี filter นั้น,
+    'gpu' = เหมือน auto (ถ้าใช้ไม่ได้ก็ใช้ CPU), 'cpu' = swscale เสมอ
+    """
+    size = scaled_size(metadata.width, metadata.height, encoding_settings.get("max_height"))
+    if size is None:
+        return encoding_settings
+    on_gpu = (encoding_settings.get("scaler", 'auto') != 'cpu' and encoder.gpu_scale_filter is not None
+              and has_filter(FFMPEG_PATH, encoder.gpu_scale_filter))
+    return dict(encoding_settings, scale_size=size, scale_on_gpu=on_gpu)
+
+
+def decoder_thread_args(threads):
+    """จำกัด thread ของ decoder ด้วย (ใส่ก่อน -i) ไม่เช่นนั้น decoder จะใช้ thread เท่าจำนวน core"""
+    return ['-threads', str(threads)] if threads else []
+
+
+# สถานะของงาน -> สถานะใน journal (งานที่ถูกยกเลิกจะกลับไปเป็น pending เพื่อรันต่อรอบหน้า)
+JOURNAL_STATES = {
+    STATUS_SUCCESS: STATE_DONE,
+    STATUS_FAILED: STATE_FAILED,
+    STATUS_CANCELLED: STATE_PENDING,
+}
+
+
+# --- ฟังก์ชันประมวลผลวิดีโอเดียว (รันใน Thread) ---
+# ประเภทของขั้นตอนที่ process_video_steps yield ออกมา (engine แบบ asyncio ใช้จำกัดจำนวนพร้อมกันแยกตามประเภท)
+STEP_PROBE = 'probe'
+STEP_ENCODE = 'encode'
+STEP_COPY = 'copy'
+STEP_STAGE = 'stage'
+STEP_FINALIZE = 'finalize'
+
+
+def run_job_steps(steps, trace=None):
+    """รัน generator ของ process_video_steps แบบ synchronous (ทุกขั้นตอนรันใน thread นี้) คืนค่า JobResult
+
+    trace (video_trace.JobTrace) บันทึกเวลาของทุกขั้นตอนและของทั้งงาน
+    """
+    result = None
+    try:
+        step_class, step = next(steps)
+        while True:
+            start = time.perf_counter() if trace else None
+            try:
+                value = step()
+            except Exception as e:
+                if trace:
+                    trace.step(step_class, start)
+                step_class, step = steps.throw(e)
+            else:
+                if trace:
+                    trace.step(step_class, start, value)
+                step_class, step = steps.send(value)
+    except StopIteration as done:
+        result = done.value
+        return result
+    finally:
+        if trace:
+            trace.close(result)
+
+
+def process_single_video(input_path, output_folder, bitrate_reduction_percent, message_queue=None, stop_event=None, encoding_settings=None, metadata=None, progress=None, skip_policy=None, journal=None, input_root=None, executor=None, thread_budget=None, stager=None, tracer=None):
+    """ประมวลผลไฟล์เดียวและรายงานความคืบหน้าผ่าน message_queue (ถ้ามี)
+
+    ถ้าส่ง metadata (จาก prescan_videos) มาแล้ว จะไม่เรียก ffprobe ซ้ำ
+    progress (BatchProgress) ใช้รวมวินาทีที่ encode แล้ว, speed และขนาด output ของทั้ง batch
+    skip_policy (SkipPolicy) ใช้ข้ามไฟล์ที่แปลงแล้วหรือไม่คุ้มค่าจะแปลง
+    journal (BatchJournal) บันทึกสถานะของไฟล์เพื่อให้รันต่อได้หลังโปรแกรมปิด
+    input_root ใช้คงโครงสร้างโฟลเดอร์ย่อยใน output (โหมด recursive)
+    encoding_settings["target_size_mb"] คำนวณ bitrate จากขนาดไฟล์เป้าหมายแทน bitrate_reduction_percent
+    encoding_settings["two_pass"] encode สองรอบ (ถ้า encoder รองรับ) เพื่อให้ได้ขนาดใกล้เป้าหมายมากขึ้น
+    encoding_settings["content_aware"] เลือก bitrate จากการวัดคุณภาพของตัวอย่าง (quality_metric/quality_target)
+    encoding_settings["stream_copy"] คัดลอก stream/remux แทนการ encode ถ้าไม่ต้องลด bitrate (ดู choose_method)
+    encoding_settings["max_height"] ย่อภาพให้ด้านสั้นไม่เกินค่านี้ (เช่น 1080) บน GPU หรือ CPU (ดู plan_scale)
+    encoding_settings["segments"] แบ่งไฟล์ยาวเป็นหลายช่วงแล้ว encode พร้อมกันใน executor (worker pool เดียวกับ batch)
+    encoding_settings["log_dir"] เขียน stderr ทั้งหมดของ ffmpeg ต่อท้าย spool file ของแต่ละงานในโฟลเดอร์นี้
+    thread_budget (ThreadBudget) จำกัดจำนวน thread ของ ffmpeg แต่ละตัว (-threads / x265 pools / SVT-AV1 lp)
+    stager (video_staging.ScratchStager) ให้ ffmpeg อ่าน input และเขียน output ใน scratch ในเครื่อง แล้วอัปโหลดกลับใน background
+    tracer (video_trace.Tracer) บันทึกเวลาของแต่ละขั้นตอน (probe/spawn/encode/finalize) บน thread ของ worker นี้
+    ffmpeg เขียนลงไฟล์ชั่วคราวก่อน แล้วจึง rename เป็นชื่อจริงเมื่อ exit code = 0
+    คืนค่า JobResult
+    """
+    trace = tracer.job(os.path.basename(input_path)) if tracer else None
+    return run_job_steps(process_video_steps(input_path, output_folder, bitrate_reduction_percent, message_queue, stop_event, encoding_settings, metadata, progress, skip_policy, journal, input_root, executor, thread_budget, stager), trace)
+
+
+def process_video_steps(input_path, output_folder, bitrate_reduction_percent, message_queue=None, stop_event=None, encoding_settings=None, metadata=None, progress=None, skip_policy=None, journal=None, input_root=None, executor=None, thread_budget=None, stager=None):
+    """ขั้นตอนของ process_single_video ในรูป generator
+
+    ทุกครั้งที่ต้องรันคำสั่งภายนอก (ffprobe, ffmpeg, การวัดคุณภาพ) หรือย้าย output จะ yield (STEP_*, step) โดย step เป็น callable
+    ที่ไม่มี argument แล้วรับผลลัพธ์ของ step() กลับมาทาง send() (หรือ exception ทาง throw())
+    ผู้เรียกจึงเลือกได้ว่าจะรันแต่ละขั้นตอนอย่างไร (run_job_steps หรือ video_async) คืนค่า JobResult เมื่อจบ
+    """
+    filename = os.path.basename(input_path)
+    file_ext = pathlib.Path(filename).suffix.lower()
+    start_time = time.monotonic()
+    result = JobResult(input_path=input_path)
+
+    def finish(status, message, **values):
+        result.status = status
+        result.message = message
+        for key, value in values.items():
+            setattr(result, key, value)
+        result.wall_time = time.monotonic() - start_time
+        if journal and status in JOURNAL_STATES and result.output_path:
+            journal.set_state(input_path, JOURNAL_STATES[status], result.output_path,
+                              error=result.error_tail or None)
+        if message_queue:
+            # สถานะสุดท้ายของไฟล์ (GUI คืนแถว progress ของไฟล์นี้ไม่ว่าจะสำเร็จ/ล้มเหลว/ข้าม/ยกเลิก)
+            try:
+                message_queue.put(("file_done", input_path, status))
+            except Exception:
+                pass
+        return result
+    
+    # ใช้ค่า default ถ้าไม่ได้ส่ง encoding_settings มา
+    if encoding_settings is None:
+        encoding_settings = PRESETS["พื้นฐาน (Basic)"]
+    
+    # ตรวจสอบว่าถูกสั่งหยุดหรือไม่
+    if stop_event and stop_event.is_set():
+        return finish(STATUS_CANCELLED, f"⚠️ ยกเลิก: {filename}")
+
+    if not os.path.isfile(input_path) or file_ext not in VIDEO_EXTENSIONS:
+        return finish(STATUS_SKIPPED, f"ข้าม: {filename} (ไม่ใช่วิดีโอที่รองรับ)")
+
+    # ดึงข้อมูลวิดีโอด้วย ffprobe ครั้งเดียว (ใช้ cache ถ้าไฟล์ไม่เปลี่ยน)
+    try:
+        if metadata is None:
+            metadata = yield STEP_PROBE, functools.partial(probe_video, input_path)
+            # โหมด streaming: เพิ่มความยาวของไฟล์นี้เข้าไปในยอดรวมของ batch
+            if progress and metadata and metadata.duration:
+                progress.add_duration(metadata.duration)
+    except FileNotFoundError:
+        return finish(STATUS_FAILED, FFMPEG_NOT_FOUND_MESSAGE)
+
+    if metadata is None:
+        return finish(STATUS_FAILED, f"❌ ข้าม: {filename} (ไม่สามารถดึงข้อมูล Bitrate/Duration ได้)")
+
+    result.input_size = metadata.size or None
+    result.duration = metadata.duration
+
+    duration = metadata.duration
+    original_bitrate_bps = metadata.estimated_video_bitrate
+
+    # ตรวจสอบว่า original_bitrate_bps ไม่เป็น None ก่อนคำนวณ
+    if original_bitrate_bps is None:
+        return finish(STATUS_FAILED, f"❌ ข้าม: {filename} (ไม่สามารถดึงข้อมูล Bitrate ได้)")
+
+    original_bitrate_mbps = original_bitrate_bps / 1_000_000
+    target_size = None
+    if encoding_settings.get("target_size_mb"):
+        # โหมด target size: คำนวณ bitrate จาก budget ขนาดไฟล์และความยาววิดีโอ
+        target_size = int(float(encoding_settings["target_size_mb"]) * 1024 * 1024)
+        result.target_size = target_size
+        new_bitrate_bps = compute_target_bitrate(metadata, target_size)
+        if new_bitrate_bps is None:
+            return finish(STATUS_FAILED, f"❌ ข้าม: {filename} (ไม่ทราบความยาววิดีโอ คำนวณ bitrate จากขนาดเป้าหมายไม่ได้)")
+        if new_bitrate_bps < MIN_TARGET_VIDEO_BITRATE:
+            return finish(STATUS_FAILED, f"❌ ข้าม: {filename} (ขนาดเป้าหมาย {format_size(target_size)} เล็กเกินไปสำหรับความยาว {format_duration(duration)})")
+        # ไม่เพิ่ม bitrate เกินต้นฉบับ (ไฟล์ที่เล็กกว่าเป้าหมายอยู่แล้วจะได้ bitrate เดิม)
+        new_bitrate_bps = min(new_bitrate_bps, original_bitrate_bps)
+    else:
+        reduction_factor = 1.0 - (bitrate_reduction_percent / 100.0)
+        new_bitrate_bps = int(original_bitrate_bps * reduction_factor)
+    new_bitrate_mbps = new_bitrate_bps / 1_000_000
+    result.original_bitrate = original_bitrate_bps
+    result.new_bitrate = new_bitrate_bps
+
+    # fast path: codec เดิมใช้ต่อได้และไม่ต้องลด bitrate → คัดลอก stream (หรือย้าย container) แทนการ encode
+    method = choose_method(metadata, input_path, new_bitrate_bps, encoding_settings)
+    result.method = method
+    output_path = get_output_path(input_path, output_folder, input_root)
+    if method == METHOD_REMUX:
+        output_path = os.path.splitext(output_path)[0] + REMUX_EXTENSION
+    if method != METHOD_ENCODE:
+        new_bitrate_bps = original_bitrate_bps
+        new_bitrate_mbps = original_bitrate_mbps
+        result.new_bitrate = new_bitrate_bps
+    result.output_path = output_path
+
+    skip_reason = get_skip_reason(skip_policy, input_path, output_path, metadata, new_bitrate_bps, method)
+    if skip_reason:
+        return finish(STATUS_SKIPPED, f"⏭️ ข้าม: {filename} ({skip_reason})")
+
+    encoder = None
+    quality_summary = ''
+    if method == METHOD_ENCODE:
+        # เลือก encoder backend (แปลง preset เป็น flags ของ encoder นั้นๆ)
+        try:
+            encoder = get_encoder(encoding_settings)
+        except FileNotFoundError:
+            return finish(STATUS_FAILED, FFMPEG_NOT_FOUND_MESSAGE)
+
+        # Content-aware: ลอง encode ตัวอย่างหลาย bitrate แล้วเลือกค่าต่ำสุดที่ผ่านเกณฑ์คุณภาพ
+        if encoding_settings.get("content_aware") and not target_size:
+            choice = yield STEP_ENCODE, functools.partial(content_aware_bitrate, input_path, metadata, encoder,
+                                                           encoding_settings, stop_event, message_queue)
+            if stop_event and stop_event.is_set():
+                return finish(STATUS_CANCELLED, f"⚠️ ยกเลิก: {filename}")
+            if choice is None:
+                quality_summary = " | วัดคุณภาพตัวอย่างไม่สำเร็จ (ใช้ % การลดแทน)"
+            else:
+                new_bitrate_bps = choice['bitrate']
+                new_bitrate_mbps = new_bitrate_bps / 1_000_000
+                result.new_bitrate = new_bitrate_bps
+                result.quality_metric = choice['metric']
+                result.quality_score = choice['score']
+                warning = "" if choice['met'] else " ⚠️ ไม่ถึงเป้าหมาย"
+                quality_summary = f" | {choice['metric'].upper()} {choice['score']:.3f} (เป้าหมาย {choice['target']:g}){warning}"
+                skip_reason = get_skip_reason(skip_policy, input_path, output_path, metadata, new_bitrate_bps, method)
+                if skip_reason:
+                    return finish(STATUS_SKIPPED, f"⏭️ ข้าม: {filename} ({skip_reason})")
+
+    try:
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    except OSError as e:
+        return finish(STATUS_FAILED, f"❌ Error: ไม่สามารถสร้างโฟลเดอร์ output สำหรับ {filename}: {e}")
+    # ไฟล์ชั่วคราวที่ค้างจากรอบก่อน (โปรแกรมปิดกะทันหันระหว่าง encode/อัปโหลด) ไม่มีใครใช้ต่อแล้ว
+    _remove_quietly(partial_output_path(output_path))
+
+    # staging: ffmpeg อ่าน input ที่ copy มาไว้ใน scratch และเขียน output ลง scratch (อัปโหลดกลับเมื่อสำเร็จ)
+    source_path = input_path
+    if stager:
+        stage_start = time.monotonic()
+        source_path = yield STEP_STAGE, functools.partial(stager.acquire, input_path, stop_event)
+        result.stage_wait = time.monotonic() - stage_start
+        if source_path is None:
+            return finish(STATUS_CANCELLED, f"⚠️ ยกเลิก: {filename}")
+        try:
+            temp_output_path = stager.scratch_output_path(output_path)
+        except OSError as e:
+            return finish(STATUS_FAILED, f"❌ Error: ไม่สามารถสร้างไฟล์ใน scratch สำหรับ {filename}: {e}")
+    else:
+        temp_output_path = partial_output_path(output_path)
+
+    log_path = None
+    if encoding_settings.get("log_dir"):
+        try:
+            os.makedirs(encoding_settings["log_dir"], exist_ok=True)
+            log_path = job_log_path(encoding_settings["log_dir"], input_path, input_root)
+        except OSError:
+            log_path = None
+    result.log_path = log_path
+
+    two_pass = False
+    segments = 0
+    threads = None
+    hardware_encoder = None
+    passlog_dir = None
+    job_settings = encoding_settings
+    # stream copy/remux ไม่ decode/encode วิดีโอ จึงไม่ต้องจอง thread
+    if method == METHOD_ENCODE:
+        two_pass = bool(encoding_settings.get("two_pass")) and encoder.supports_two_pass
+        # two-pass ต้องใช้สถิติของทั้งไฟล์ จึงไม่แบ่งช่วง
+        segments = 0 if two_pass else plan_segment_count(duration, encoding_settings.get("segments"))
+        # จอง thread ตอนเริ่มงาน (โหมดแบ่งช่วงให้แต่ละช่วงจองเอง, hardware encoder ไม่ใช้ CPU thread ของ encoder)
+        threads = thread_budget.acquire() if thread_budget and not segments and not encoder.hardware else None
+
+        # ย่อภาพ (ถ้ากำหนด max_height): บน GPU แบบ zero-copy ถ้าใช้ได้ ไม่เช่นนั้นใช้ swscale บน CPU
+        job_settings = plan_scale(metadata, encoder, encoding_settings)
+        # two-pass: pass 1 เก็บสถิติลง stats file (ไม่มี audio และไม่เขียน output) แล้ว pass 2 ใช้สถิตินั้น encode จริง
+        # stats file อยู่ในโฟลเดอร์ชั่วคราวของแต่ละงาน (ffmpeg รันใน cwd นั้น) เพื่อไม่ให้งานที่รันพร้อมกันเขียนทับกัน
+        if two_pass:
+            passlog_dir = tempfile.mkdtemp(prefix='vbr_passlog_')
+
+    def encode_commands(settings):
+        """คำสั่ง ffmpeg ของแต่ละ pass (stream copy มีคำสั่งเดียว)"""
+        if method != METHOD_ENCODE:
+            return [stream_copy_command(source_path, temp_output_path, metadata)]
+        base_command = [FFMPEG_PATH, '-y'] + encoder.input_args(settings) + decoder_thread_args(threads)
+        base_command += ['-i', os.path.abspath(source_path)]
+        if two_pass:
+            return [
+                base_command + encoder.encode_args(settings, new_bitrate_bps, threads, 1, 'passlog')
+                + ['-an', '-f', 'null', '-progress', 'pipe:1', '-nostats', os.devnull],
+                base_command + encoder.encode_args(settings, new_bitrate_bps, threads, 2, 'passlog')
+                + ['-c:a', 'copy', '-progress', 'pipe:1', '-nostats', os.path.abspath(temp_output_path)],
+            ]
+        # เพิ่ม audio และ progress (เขียนลงไฟล์ชั่วคราวก่อน)
+        return [base_command + encoder.encode_args(settings, new_bitrate_bps, threads)
+                + ['-c:a', 'copy', '-progress', 'pipe:1', '-nostats', temp_output_path]]
+
+    def encode_steps(settings):
+        if segments:
+            return [functools.partial(encode_segmented, os.path.abspath(source_path), temp_output_path, encoder,
+                                      settings, new_bitrate_bps, duration, segments=segments,
+                                      message_queue=message_queue, stop_event=stop_event, progress=progress,
+                                      executor=executor, thread_budget=thread_budget, log_path=log_path,
+                                      job_path=input_path)]
+        commands = encode_commands(settings)
+        pass_share = (duration or 0) / len(commands)
+        return [functools.partial(run_ffmpeg, command, input_path, duration, message_queue, stop_event, progress,
+                                  time_offset=pass_index * pass_share, time_scale=1.0 / len(commands), cwd=passlog_dir,
+                                  log_path=log_path)
+                for pass_index, command in enumerate(commands)]
+
+    try:
+        # ขนาดไฟล์ต้นฉบับได้มาพร้อมกับการ probe แล้ว
+        orig_size = metadata.size or None
+
+        # ส่งสถานะเริ่มต้น 0%
+        if message_queue:
+            try:
+                message_queue.put(("file_progress", input_path, 0))
+            except Exception:
+                pass
+
+        if journal:
+            journal.set_state(input_path, STATE_RUNNING, output_path)
+
+        step_class = STEP_ENCODE if method == METHOD_ENCODE else STEP_COPY
+        steps = encode_steps(job_settings)
+        while True:
+            for step in steps:
+                run = yield step_class, step
+                if run.cancelled:
+                    _remove_quietly(temp_output_path)
+                    return finish(STATUS_CANCELLED, f"⚠️ ยกเลิก: {filename}", speed=run.speed)
+                if run.returncode != 0:
+                    break
+            # ลองใหม่แบบอื่นเฉพาะเมื่อเปิด hardware ไม่ได้ ไฟล์เสียจะล้มเหลวเหมือนเดิมจึงไม่รันซ้ำ
+            hardware_failed = run.returncode != 0 and is_hardware_init_error(run.stderr)
+            if hardware_failed and job_settings.get("scale_on_gpu"):
+                # decode/ย่อบน GPU ไม่ได้ (เช่น GPU decode codec นี้ไม่ได้) → ลองใหม่ด้วย swscale บน CPU
+                job_settings = dict(job_settings, scale_on_gpu=False, scale_fallback=True)
+                steps = encode_steps(job_settings)
+                continue
+            if hardware_failed and method == METHOD_ENCODE and encoder.hardware:
+                # hardware encoder ใช้กับไฟล์นี้ไม่ได้ → encode ใหม่ด้วย libx264 บน CPU (เขียนทับไฟล์ชั่วคราวเดิม)
+                hardware_encoder, encoder = encoder, ENCODER_BACKENDS[CPU_FALLBACK_ENCODER]
+                job_settings = dict(job_settings, encoder=encoder.codec, hwaccel=None, scale_on_gpu=False)
+                if thread_budget and not segments:
+                    threads = thread_budget.acquire()
+                steps = encode_steps(job_settings)
+                continue
+            break
+        ret = run.returncode
+        stderr = run.stderr
+        last_speed = run.speed
+
+        # ส่งสถานะ 100% เมื่อเสร็จสิ้น
+        if message_queue and ret == 0:
+            try:
+                message_queue.put(("file_progress", input_path, 100))
+            except Exception:
+                pass
+
+        error_lines = [l for l in (stderr or '').splitlines() if l.strip()]
+        error_tail = '\n'.join(error_lines[-ERROR_TAIL_LINES:])
+        # ถ้า ffmpeg ไม่รายงาน speed ให้คำนวณจากความยาววิดีโอ / เวลาที่ใช้จริง
+        if last_speed is None and duration and ret == 0:
+            last_speed = duration / max(time.monotonic() - start_time, 1e-6)
+
+        if ret == 0:
+            # encode สำเร็จ: stat แล้วย้ายไฟล์ชั่วคราวไปเป็นชื่อจริง (หรืออัปโหลดผ่าน staging)
+            try:
+                out_size = yield STEP_FINALIZE, functools.partial(finalize_output, temp_output_path, output_path, stager)
+            except OSError as e:
+                _remove_quietly(temp_output_path)
+                return finish(STATUS_FAILED, f"❌ Error ขณะบันทึก {filename}: {e}", returncode=ret, error_tail=error_tail)
+
+            # bitrate reductions
+            try:
+                bitrate_diff_bps = original_bitrate_bps - new_bitrate_bps
+                bitrate_diff_pct = (bitrate_diff_bps / original_bitrate_bps) * 100 if original_bitrate_bps else 0
+            except Exception:
+                bitrate_diff_bps = None
+                bitrate_diff_pct = 0
+
+            # size reductions
+            size_summary = ''
+            if orig_size is not None and out_size is not None:
+                size_diff = orig_size - out_size
+                try:
+                    size_diff_pct = (size_diff / orig_size) * 100 if orig_size else 0
+                except Exception:
+                    size_diff_pct = 0
+                size_summary = f" | size: {format_size(orig_size)} → {format_size(out_size)} ({size_diff_pct:.1f}% , {format_size(size_diff)} saved)"
+
+            # ความแม่นยำเทียบกับขนาดเป้าหมาย
+            target_summary = ''
+            if target_size and out_size is not None:
+                accuracy = out_size / target_size * 100
+                warning = " ⚠️ เกินเป้าหมาย" if out_size > target_size else ""
+                target_summary = f" | target: {format_size(target_size)} ({accuracy:.1f}% ของเป้าหมาย{warning})"
+            if segments:
+                target_summary += f" | แบ่ง encode {segments} ช่วงพร้อมกัน"
+            if job_settings.get("scale_size"):
+                width, height = job_settings["scale_size"]
+                scaler = "GPU" if job_settings.get("scale_on_gpu") else "CPU"
+                if job_settings.get("scale_fallback"):
+                    scaler += " เพราะ GPU ใช้ไม่ได้"
+                target_summary += f" | ย่อเป็น {width}x{height} ({scaler})"
+            if encoding_settings.get("two_pass") and not two_pass and encoder and not encoder.hardware and not hardware_encoder:
+                target_summary += f" | {encoder.codec} ไม่รองรับ two-pass (ใช้ single-pass)"
+            if hardware_encoder:
+                target_summary += f" | {hardware_encoder.codec} ใช้กับไฟล์นี้ไม่ได้ → encode ด้วย {encoder.codec}"
+
+            if method == METHOD_ENCODE:
+                message = f"✅ สำเร็จ: {filename} | {original_bitrate_mbps:.2f} Mbps → {new_bitrate_mbps:.2f} Mbps (-{bitrate_diff_pct:.1f}%)"
+            else:
+                action = f"remux → {REMUX_EXTENSION}" if method == METHOD_REMUX else "stream copy"
+                message = f"✅ สำเร็จ: {filename} | {action} ({metadata.video_codec} {original_bitrate_mbps:.2f} Mbps ไม่ต้อง encode ใหม่)"
+            message += size_summary + target_summary + quality_summary
+            return finish(STATUS_SUCCESS, message, output_size=out_size, speed=last_speed, returncode=ret, error_tail=error_tail)
+        else:
+            _remove_quietly(temp_output_path)
+            if encoder and f"Unknown encoder '{encoder.codec}'" in (stderr or ''):
+                message = f"❌ Error: {filename} - ไม่พบ Encoder {encoder.codec}! (GPU/FFmpeg ไม่รองรับ)"
+            else:
+                last_error = error_lines[-1] if error_lines else 'Unknown error'
+                message = f"❌ Error ขณะแปลง {filename}: {last_error}"
+            return finish(STATUS_FAILED, message, speed=last_speed, returncode=ret, error_tail=error_tail)
+    except FileNotFoundError:
+        return finish(STATUS_FAILED, "❌ Error: ไม่พบ FFmpeg! กรุณาติดตั้ง FFmpeg และเพิ่มใน PATH\nดาวน์โหลดได้ที่: https://ffmpeg.org/download.html")
+    finally:
+        if threads:
+            thread_budget.release(threads)
+        if passlog_dir:
+            shutil.rmtree(passlog_dir, ignore_errors=True)
+
+
+@dataclass
+class BatchSetup:
+    """ค่าของ batch ที่ตรวจสอบแล้ว (ผลของ prepare_batch) ใช้ร่วมกันระหว่าง start_conversion และ video_async"""
+    input_root: str
+    output_folder: str
+    file_source: object  # iterator ของ path ไฟล์วิดีโอ
+    recursive: bool
+    reduction_percent: int
+    max_workers: int
+    encoding_settings: dict
+    encoder: object
+
+
+def prepare_batch(input_folder, output_folder, reduction_percent, max_workers, message_queue, encoding_settings=None, recursive=False, include=None, exclude=None):
+    """ตรวจสอบ input และค่าตั้งค่า, สร้างโฟลเดอร์ output และเลือก encoder ก่อนเริ่ม batch
+
+    คืนค่า BatchSetup หรือ None ถ้าเริ่มงานไม่ได้ (ส่ง error และ done เข้า message_queue แล้ว)
+    """
+    # ใช้ค่า default ถ้าไม่ได้ส่ง encoding_settings มา
+    if encoding_settings is None:
+        encoding_settings = PRESETS["พื้นฐาน (Basic)"]
+
+    # Require input folder (or a single video file) to exist. Output folder will be created automatically if missing.
+    if not (os.path.isdir(input_folder) or os.path.isfile(input_folder)):
+        message_queue.put(("error", "Error", "กรุณาเลือก Input Folder ที่ถูกต้อง"))
+        message_queue.put(("done", None, None))
+        return None
+
+    try:
+        reduction_percent = int(reduction_percent)
+        max_workers = int(max_workers)
+        if not (0 < reduction_percent < 100) or max_workers < 1:
+            raise ValueError
+    except ValueError:
+        message_queue.put(("error", "Error", "เปอร์เซ็นต์/จำนวนงานต้องเป็นตัวเลขที่ถูกต้อง"))
+        message_queue.put(("done", None, None))
+        return None
+
+    # If output_folder not provided, create default 'Output' inside input_folder
+    if not output_folder:
+        base_folder = os.path.dirname(input_folder) if os.path.isfile(input_folder) else input_folder
+        output_folder = os.path.join(base_folder, 'Output')
+        try:
+            os.makedirs(output_folder, exist_ok=True)
+            message_queue.put(("text", f"สร้าง Output Folder อัตโนมัติที่: {output_folder}\n", None))
+        except Exception as e:
+            message_queue.put(("error", "Error", f"ไม่สามารถสร้าง Output Folder: {e}"))
+            message_queue.put(("done", None, None))
+            return None
+    else:
+        # ถ้าโฟลเดอร์ที่ระบุไม่มี ให้สร้างและแจ้งผู้ใช้
+        if not os.path.exists(output_folder):
+            try:
+                os.makedirs(output_folder, exist_ok=True)
+                message_queue.put(("text", f"สร้าง Output Folder: {output_folder}\n", None))
+            except Exception as e:
+                message_queue.put(("error", "Error", f"ไม่สามารถสร้าง Output Folder: {e}"))
+                message_queue.put(("done", None, None))
+                return None
+
+    # แหล่งไฟล์ที่ต้องประมวลผล (generator ไม่สร้าง list ของทั้ง tree)
+    if os.path.isfile(input_folder):
+        # ถ้าเป็นไฟล์ ให้ใช้ไฟล์นั้นเลย
+        single_file = input_folder
+        input_folder = os.path.dirname(input_folder)  # ใช้ parent folder
+        file_source = iter([single_file] if pathlib.Path(single_file).suffix.lower() in VIDEO_EXTENSIONS else [])
+        recursive = False
+    else:
+        # ถ้าเป็นโฟลเดอร์ ให้ค้นหาไฟล์ (ไม่รวมโฟลเดอร์ output ถ้าอยู่ข้างใน)
+        file_source = iter_video_files(input_folder, recursive, include, exclude, skip_dirs=[output_folder])
+
+    # ตรวจสอบ encoder ครั้งเดียวก่อนเริ่ม แล้วส่งชื่อที่เลือกได้ให้ทุกงาน
+    try:
+        encoder = get_encoder(encoding_settings)
+    except FileNotFoundError:
+        message_queue.put(("error", "Error", "ไม่พบ FFmpeg/FFprobe! กรุณาติดตั้ง FFmpeg และเพิ่มใน PATH"))
+        message_queue.put(("done", None, None))
+        return None
+    encoding_settings = dict(encoding_settings, encoder=encoder.codec)
+    return BatchSetup(input_root=input_folder, output_folder=output_folder, file_source=file_source,
+                      recursive=recursive, reduction_percent=reduction_percent, max_workers=max_workers,
+                      encoding_settings=encoding_settings, encoder=encoder)
+
+
+def resumed_job_result(journal, input_path, output_folder, input_root=None):
+    """JobResult แบบข้าม ถ้า journal บันทึกว่าไฟล์นี้แปลงเสร็จแล้ว (input ไม่เปลี่ยนและ output ยังอยู่)"""
+    output_path = get_output_path(input_path, output_folder, input_root)
+    if journal and journal.is_done(input_path, output_path):
+        return JobResult(input_path=input_path, status=STATUS_SKIPPED, output_path=output_path,
+                         message=f"⏭️ ข้าม: {os.path.basename(input_path)} (แปลงเสร็จแล้วในรอบก่อน)")
+    if journal and journal.get_state(input_path) is None:
+        journal.set_state(input_path, STATE_PENDING, output_path)
+    return None
+
+
+def admission_queue(jobs, admission, output_folder, input_root, reduction_percent, encoding_settings, metadata_map, max_held, message_queue):
+    """AdmissionQueue ของ batch: คาดขนาด output จาก metadata ที่ pre-scan ไว้ และแจ้งเมื่อพักงานเพราะพื้นที่ไม่พอ
+
+    admission: True = DeviceAdmission() ค่าเริ่มต้น (ตรวจพื้นที่ว่างอย่างเดียว), None/False = ไม่ตรวจ
+    """
+    if admission is True:
+        admission = DeviceAdmission()
+
+    def plan(input_path):
+        return (get_output_path(input_path, output_folder, input_root),
+                predict_output_size(metadata_map.get(input_path), input_path, reduction_percent, encoding_settings))
+
+    def on_hold(input_path, hold):
+        _, needed, available = hold
+        message_queue.put(("text", f"⏸️ พักงาน {os.path.basename(input_path)}: พื้นที่ว่างของ output ไม่พอ "
+                                   f"(ต้องการ ~{format_size(needed)}, ว่าง {format_size(available)}) รองานอื่นจบก่อน\n", None))
+
+    return AdmissionQueue(jobs, admission or None, plan, max_held, on_hold)
+
+
+def rejected_job_result(input_path, hold, output_folder, input_root=None):
+    """JobResult ของงานที่ AdmissionQueue ตัดออก (พื้นที่ output ไม่พอแม้ไม่มีงานอื่นรันอยู่)"""
+    _, needed, available = hold
+    return JobResult(input_path=input_path, status=STATUS_FAILED,
+                     output_path=get_output_path(input_path, output_folder, input_root),
+                     message=f"❌ ข้าม: {os.path.basename(input_path)} (พื้นที่ว่างของ output ไม่พอ: "
+                             f"ต้องการ ~{format_size(needed)}, ว่าง {format_size(available)})")
+
+
+def settle_uploads(stager, awaiting, journal, on_result):
+    """ส่งผลของงานที่รออัปโหลดจาก scratch (awaiting: {output_path: (input_path, JobResult)}) ให้ on_result เมื่ออัปโหลดเสร็จ
+
+    ถ้าอัปโหลดไม่สำเร็จ งานจะถูกเปลี่ยนเป็นล้มเหลวทั้งในผลลัพธ์และ journal (รอบหน้าจะแปลงไฟล์นี้ใหม่)
+    """
+    for output_path in list(awaiting):
+        done, error = stager.upload_result(output_path)
+        if not done:
+            continue
+        input_path, result = awaiting.pop(output_path)
+        if error is not None:
+            result.status = STATUS_FAILED
+            result.message = f"❌ อัปโหลด {result.filename} กลับปลายทางไม่สำเร็จ: {error}"
+            result.error_tail = error
+            result.output_size = None
+            if journal:
+                journal.set_state(input_path, STATE_FAILED, output_path, error=error)
+        on_result(input_path, result)
+
+
+def save_trace(tracer, summary, message_queue):
+    """เขียนไฟล์ trace ท้าย batch และเก็บ histogram ต่อขั้นตอนไว้ใน summary['trace'] ให้ report_summary แสดง"""
+    try:
+        summary['trace'] = tracer.save()
+    except OSError as e:
+        summary['trace'] = tracer.histograms()
+        message_queue.put(("text", f"⚠️ ไม่สามารถบันทึกไฟล์ trace: {e}\n", None))
+    else:
+        if tracer.path:
+            message_queue.put(("text", f"บันทึก trace ที่: {tracer.path} (เปิดด้วย ui.perfetto.dev หรือ chrome://tracing)\n", None))
+
+
+def report_summary(message_queue, summary):
+    """ส่งสรุปผลท้าย batch (จาก new_summary/add_result_to_summary) เป็นข้อความเข้า message_queue"""
+    message_queue.put(("text", "\n" + "="*60 + "\n", None))
+    message_queue.put(("text", "🎉 สรุปผลการแปลงไฟล์\n", None))
+    message_queue.put(("text", "="*60 + "\n", None))
+    message_queue.put(("text", f"📊 ไฟล์ทั้งหมด: {summary['total']} ไฟล์\n", None))
+    message_queue.put(("text", f"✅ แปลงสำเร็จ: {summary['successful']} ไฟล์\n", None))
+    message_queue.put(("text", f"❌ แปลงไม่สำเร็จ: {summary['failed'] + summary['cancelled']} ไฟล์\n", None))
+    if summary['skipped']:
+        message_queue.put(("text", f"⏭️ ข้าม: {summary['skipped']} ไฟล์\n", None))
+    if set(summary['methods']) - {METHOD_ENCODE}:
+        methods = ' | '.join(f"{method} {count}" for method, count in sorted(summary['methods'].items()))
+        message_queue.put(("text", f"🚀 วิธีแปลง: {methods} ไฟล์\n", None))
+    if summary.get('staging'):
+        message_queue.put(("text", f"📦 Staging: {format_staging_stats(summary['staging'])}\n", None))
+    if summary.get('trace'):
+        message_queue.put(("text", "⏱️ เวลาแต่ละขั้นตอน:\n", None))
+        for line in format_trace_stats(summary['trace']):
+            message_queue.put(("text", f"   {line}\n", None))
+
+    total_original_size = summary['total_original_size']
+    total_output_size = summary['total_output_size']
+    if total_original_size > 0 and total_output_size > 0:
+        total_saved = total_original_size - total_output_size
+        saved_percent = (total_saved / total_original_size) * 100
+        message_queue.put(("text", f"💾 ขนาดไฟล์เดิมรวม: {format_size(total_original_size)}\n", None))
+        message_queue.put(("text", f"💾 ขนาดไฟล์ใหม่รวม: {format_size(total_output_size)}\n", None))
+        message_queue.put(("text", f"🎯 ประหยัดพื้นที่รวม: {format_size(total_saved)} ({saved_percent:.1f}%)\n", None))
+
+    message_queue.put(("text", "="*60 + "\n", None))
+    message_queue.put(("text", "*** การแปลงไฟล์เสร็จสมบูรณ์ ***\n", None))
+
+
+# --- ฟังก์ชันหลักสำหรับ GUI (จัดการการประมวลผล) ---
+def start_conversion(input_folder, output_folder, reduction_percent, max_workers, message_queue, stop_event=None, encoding_settings=None, probe_workers=None, job_order="longest_first", report_path=None, skip_policy=None, resume=True, recursive=False, include=None, exclude=None, adaptive=False, min_workers=None, thread_budget=True, stager=None, admission=True, tracer=None):
+    """ฟังก์ชันที่ถูกเรียกเมื่อกดปุ่มเริ่มแปลง - รันใน Background Thread
+
+    คืนค่า dict สรุปผล (total/successful/failed/..., results = list ของ JobResult) ถ้าไม่พบไฟล์เลยจะได้สรุปที่ total = 0
+    หรือ None ถ้าเริ่มงานไม่ได้ (input/ค่าตั้งค่าไม่ถูกต้อง)
+    report_path: ถ้าระบุ จะบันทึกผลลัพธ์รายไฟล์เป็น CSV/JSON
+    skip_policy: SkipPolicy สำหรับ incremental mode (None = แปลงทุกไฟล์)
+    resume: ใช้ journal ในโฟลเดอร์ output เพื่อข้ามไฟล์ที่แปลงเสร็จแล้วในรอบก่อน
+    recursive: ค้นหาในโฟลเดอร์ย่อยด้วย (โครงสร้างโฟลเดอร์ย่อยจะถูกสร้างซ้ำใน output)
+        โหมดนี้ส่งงานเข้า pool ทันทีที่พบไฟล์ (ไม่มี pre-scan) และไม่เก็บ results ทั้งหมดไว้ใน summary
+    include/exclude: list ของ glob pattern (เทียบกับ path สัมพัทธ์หรือชื่อไฟล์) เช่น ['*.mp4'], ['proxy/*']
+    adaptive: ปรับจำนวนงานพร้อมกันระหว่าง min_workers ถึง max_workers ตาม CPU/memory/speed (AdaptiveScheduler)
+    thread_budget: แบ่ง CPU threads ให้ ffmpeg แต่ละงาน (False = ให้ ffmpeg เลือกเอง แบบเดิม)
+    stager: video_staging.ScratchStager สำหรับ input/output บน network share (ถูก close เมื่อจบ batch)
+    admission: DeviceAdmission (จำกัดงานต่อ device + พักงานที่พื้นที่ output ไม่พอ), True = ตรวจพื้นที่อย่างเดียว, False = ไม่ตรวจ
+    tracer: video_trace.Tracer บันทึกเวลาของแต่ละขั้นตอนต่องาน (ถูก save เมื่อจบ batch และสรุปเป็น histogram)
+    """
+    setup = prepare_batch(input_folder, output_folder, reduction_percent, max_workers, message_queue,
+                          encoding_settings, recursive, include, exclude)
+    if setup is None:
+        return
+    output_folder, input_root, file_source = setup.output_folder, setup.input_root, setup.file_source
+    reduction_percent, max_workers, recursive = setup.reduction_percent, setup.max_workers, setup.recursive
+    encoder, encoding_settings = setup.encoder, setup.encoding_settings
+
+    journal = BatchJournal(output_folder) if resume else None
+    summary = new_summary()
+    # โหมด recursive ไม่เก็บ JobResult ทั้งหมดไว้ใน memory (ใช้ report_path แทน)
+    results = [] if not recursive else None
+    try:
+        report = ReportWriter(report_path) if report_path else None
+    except OSError as e:
+        message_queue.put(("text", f"⚠️ ไม่สามารถสร้างไฟล์รายงาน: {e}\n", None))
+        report = None
+    counters = {'completed': 0, 'total': 0, 'resumed': 0}
+
+    def record(result):
+        add_result_to_summary(summary, result)
+        if results is not None:
+            results.append(result)
+        if report:
+            report.write(result)
+
+    def resumed_result(input_path):
+        return resumed_job_result(journal, input_path, output_folder, input_root)
+
+    if recursive:
+        # Streaming: ค้นหาไฟล์ไปพร้อมกับ encode (probe ภายใน worker) เริ่มงานแรกได้ทันที
+        metadata_map = {}
+        progress = BatchProgress(0, 0)
+
+        def streaming_jobs():
+            # นับไฟล์และข้ามไฟล์ที่แปลงเสร็จแล้วตอนที่ดึงจาก source
+            for input_path in file_source:
+                counters['total'] += 1
+                progress.add_files(1)
+                resumed = resumed_result(input_path)
+                if resumed:
+                    record(resumed)
+                    counters['resumed'] += 1
+                    progress.finish(input_path)
+                    continue
+                yield input_path
+
+        jobs = streaming_jobs()
+        message_queue.put(("init_files", [], None))
+        message_queue.put(("overall_progress", None, 0))
+        message_queue.put(("text", f"ค้นหาไฟล์ในโฟลเดอร์ย่อยและเริ่มประมวลผลพร้อมกัน {max_workers} งาน...\n", None))
+    else:
+        input_files = []
+        for input_path in file_source:
+            resumed = resumed_result(input_path)
+            if resumed:
+                record(resumed)
+                counters['resumed'] += 1
+            else:
+                input_files.append(input_path)
+
+        if not input_files and not counters['resumed']:
+            # ไม่มีไฟล์ให้แปลงไม่ใช่ข้อผิดพลาด: คืนสรุปว่างเหมือนโหมด recursive
+            message_queue.put(("text", f"ไม่พบไฟล์วิดีโอใน: {input_folder}\n", None))
+            if stager:
+                summary['staging'] = stager.close()
+            if report:
+                report.close()
+            message_queue.put(("done", None, None))
+            summary['results'] = []
+            return summary
+        if counters['resumed']:
+            message_queue.put(("text", f"รันต่อจากรอบก่อน: ข้าม {counters['resumed']} ไฟล์ที่แปลงเสร็จแล้ว\n", None))
+
+        # Pre-scan: probe ทุกไฟล์ก่อนด้วย pool แยก เพื่อไม่ให้ encoder slot ว่างระหว่างรอ ffprobe
+        message_queue.put(("text", f"พบ {len(input_files)} ไฟล์. กำลังตรวจสอบข้อมูลวิดีโอ (ffprobe)...\n", None))
+        try:
+            metadata_map = prescan_videos(input_files, probe_workers, stop_event, tracer)
+        except FileNotFoundError:
+            message_queue.put(("error", "Error", "ไม่พบ FFmpeg/FFprobe! กรุณาติดตั้ง FFmpeg และเพิ่มใน PATH"))
+            message_queue.put(("done", None, None))
+            return
+        input_files = order_jobs(input_files, metadata_map, job_order)
+        total_duration = sum(meta.duration or 0 for meta in metadata_map.values() if meta)
+        progress = BatchProgress(total_duration, len(input_files))
+        counters['total'] = len(input_files)
+        jobs = iter(input_files)
+        if stager:
+            stager.schedule(input_files)
+
+        # แจ้ง GUI ให้เตรียม progress bars
+        message_queue.put(("init_files", input_files, None))
+        message_queue.put(("overall_progress", None, 0))  # เริ่มต้น overall progress ที่ 0%
+        message_queue.put(("text", f"ความยาววิดีโอรวม: {format_duration(total_duration)}. กำลังเริ่มประมวลผลพร้อมกัน {max_workers} งาน...\n", None))
+    message_queue.put(("text", f"--- ใช้ Encoder: {encoder.codec} ---\n", None))
+
+    # Adaptive: เริ่มที่ min_workers แล้วปรับขึ้นลงตามโหลดของเครื่อง (pool มี thread เท่ากับ max_workers)
+    scheduler = None
+    if adaptive:
+        scheduler = AdaptiveScheduler(min_workers or default_min_workers(max_workers), max_workers)
+        message_queue.put(("text", f"โหมด Adaptive: เริ่ม {scheduler.limit} งาน (ปรับได้ {scheduler.min_workers}-{max_workers})\n", None))
+        message_queue.put(("workers", scheduler.limit, max_workers))
+
+    def report_progress():
+        stats = progress.snapshot()
+        stats['workers'] = scheduler.limit if scheduler else max_workers
+        message_queue.put(("overall_progress", None, int(stats['percent'])))
+        message_queue.put(("stats", format_progress_stats(stats), stats))
+        return stats
+
+    # แบ่ง core ตามจำนวนงานที่รันพร้อมกัน (ปรับ slots เมื่อ scheduler เปลี่ยน limit หรือเหลืองานน้อยกว่า worker)
+    budget = ThreadBudget(slots=scheduler.limit if scheduler else max_workers) if thread_budget else None
+
+    def in_flight_limit():
+        # adaptive ส่งงานเท่ากับ limit พอดี (ไม่มีงานรอในคิวของ pool) เพื่อให้ limit มีผลทันที
+        return scheduler.limit if scheduler else max_in_flight
+
+    # ใช้ ThreadPoolExecutor เพื่อรันงาน FFmpeg พร้อมกัน
+    # ส่งงานเข้า pool ทีละน้อย (bounded) เพื่อให้ memory คงที่ไม่ว่าจะมีไฟล์มากแค่ไหน
+    max_in_flight = max_workers * 2
+    # admission control: งานที่ device ไม่ว่างหรือพื้นที่ output ไม่พอถูกพักไว้ งานถัดไปที่เริ่มได้จะถูกส่งแทน
+    gate = admission_queue(jobs, admission, output_folder, input_root, reduction_percent, encoding_settings,
+                           metadata_map, max_in_flight, message_queue)
+    if gate.admission and gate.admission.per_device:
+        message_queue.put(("text", f"จำกัดงานพร้อมกัน {gate.admission.per_device} งานต่อ device\n", None))
+
+    # งานที่ encode สำเร็จแต่ output ยังอัปโหลดจาก scratch ไม่เสร็จ {output_path: (input_path, JobResult)}
+    awaiting_upload = {}
+
+    def report_job(input_path, result):
+        counters['completed'] += 1
+        record(result)
+        message_queue.put(("text", f"[{counters['completed']}/{counters['total']}] {result}\n", None))
+
+    def finish_job(input_path, result):
+        gate.release(input_path)
+        progress.finish(input_path, result.duration)
+        if stager:
+            stager.release(input_path)
+            if result.ok:
+                # นับว่าสำเร็จเมื่ออัปโหลดกลับปลายทางเสร็จแล้วเท่านั้น
+                awaiting_upload[result.output_path] = (input_path, result)
+                return
+        report_job(input_path, result)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        while True:
+            while not gate.done and len(futures) < in_flight_limit():
+                # ตรวจสอบว่าถูกสั่งหยุดก่อนส่งงานใหม่
+                if stop_event and stop_event.is_set():
+                    gate.close()
+                    break
+                input_path = gate.next()
+                for rejected_path, hold in gate.rejected:
+                    finish_job(rejected_path, rejected_job_result(rejected_path, hold, output_folder, input_root))
+                gate.rejected.clear()
+                if input_path is None:
+                    break
+                if recursive and stager:
+                    stager.schedule([input_path])
+                # ส่ง message_queue ให้ worker เพื่อรายงานความคืบหน้า
+                future = executor.submit(process_single_video, input_path, output_folder, reduction_percent, message_queue, stop_event, encoding_settings, metadata_map.get(input_path), progress, skip_policy, journal, input_root, executor, budget, stager, tracer)
+                futures[future] = input_path
+
+            if not futures:
+                if gate.done:
+                    break
+                continue
+            if budget:
+                concurrency = scheduler.limit if scheduler else max_workers
+                budget.slots = min(concurrency, len(futures)) if gate.done else concurrency
+
+            # รอผลลัพธ์ (JobResult) และอัปเดต overall progress/ETA เป็นระยะระหว่างที่รอ
+            done, _ = wait(futures, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+            for fut in done:
+                input_path = futures.pop(fut)
+                finish_job(input_path, fut.result())
+            if awaiting_upload:
+                settle_uploads(stager, awaiting_upload, journal, report_job)
+            stats = report_progress()
+            if scheduler:
+                previous = scheduler.limit
+                if scheduler.adjust(stats['speed'], len(futures)) != previous:
+                    message_queue.put(("text", f"⚙️ ปรับจำนวนงานพร้อมกัน: {previous} → {scheduler.limit} ({scheduler.last_reason})\n", None))
+                    message_queue.put(("workers", scheduler.limit, max_workers))
+
+    if stager:
+        message_queue.put(("text", "กำลังรออัปโหลด output ที่เหลือจาก scratch...\n", None))
+        summary['staging'] = stager.close()
+        settle_uploads(stager, awaiting_upload, journal, report_job)
+    if tracer:
+        save_trace(tracer, summary, message_queue)
+
+    # บันทึก cache ของ ffprobe สำหรับการรันครั้งถัดไป
+    PROBE_CACHE.save()
+    QUALITY_CACHE.save()
+    if journal:
+        journal.compact()
+
+    if recursive and counters['total'] == 0:
+        message_queue.put(("text", f"ไม่พบไฟล์วิดีโอใน: {input_folder}\n", None))
+    if recursive and counters['resumed']:
+        message_queue.put(("text", f"รันต่อจากรอบก่อน: ข้าม {counters['resumed']} ไฟล์ที่แปลงเสร็จแล้ว\n", None))
+    if report:
+        report.close()
+        message_queue.put(("text", f"บันทึกรายงานผลลัพธ์ที่: {report_path}\n", None))
+
+    report_summary(message_queue, summary)
+    message_queue.put(("done", None, None))
+    summary['results'] = results if results is not None else []
+    return summary
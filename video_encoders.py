@@ -0,0 +1,318 @@
+"""Encoder backends: แปลง preset (quality/rc/usage/preanalysis) เป็น flags ของแต่ละ encoder
+และตรวจสอบว่า encoder ใดใช้งานได้จริงบนเครื่องนี้"""
+import subprocess
+import sys
+import threading
+
+# ระดับคุณภาพใน PRESETS -> ค่า preset ของแต่ละ encoder (None = Basic)
+X26X_PRESETS = {"speed": "veryfast", "balanced": "medium", "quality": "slow", None: "faster"}
+SVTAV1_PRESETS = {"speed": "10", "balanced": "8", "quality": "5", None: "8"}
+NVENC_PRESETS = {"speed": "p2", "balanced": "p4", "quality": "p6", None: "p4"}
+QSV_PRESETS = {"speed": "veryfast", "balanced": "medium", "quality": "veryslow", None: "medium"}
+VAAPI_COMPRESSION = {"speed": "1", "balanced": "4", "quality": "7", None: None}
+
+# อุปกรณ์ VAAPI ค่าเริ่มต้นบน Linux
+VAAPI_DEVICE = '/dev/dri/renderD128'
+
+# ตัวเลือกการย่อภาพ: auto = GPU ถ้า encoder/ffmpeg รองรับ ไม่เช่นนั้น CPU
+SCALERS = ('auto', 'gpu', 'cpu')
+# flags ของ swscale สำหรับการย่อภาพบน CPU (เร็วกว่า bicubic ที่เป็นค่าเริ่มต้นมาก)
+CPU_SCALE_FLAGS = 'fast_bilinear'
+
+
+def scaled_size(width, height, max_height):
+    """ขนาด (w, h) หลังย่อให้ด้านสั้นไม่เกิน max_height (คงอัตราส่วน, เป็นเลขคู่) หรือ None ถ้าไม่ต้องย่อ
+
+    ใช้ด้านสั้นเพื่อให้วิดีโอแนวตั้ง (เช่น 1080x1920) นับเป็น 1080p เหมือนแนวนอน
+    """
+    if not width or not height or not max_height or min(width, height) <= max_height:
+        return None
+    factor = max_height / min(width, height)
+    return max(2, round(width * factor / 2) * 2), max(2, round(height * factor / 2) * 2)
+
+
+class EncoderBackend:
+    """Backend พื้นฐาน: codec คือชื่อ encoder ใน ffmpeg (เช่น 'libx264', 'h264_nvenc')"""
+    family = ''
+    hardware = False
+    # encoder รองรับ -maxrate/-bufsize แบบ VBR หรือไม่
+    supports_maxrate = True
+    # รองรับ two-pass ด้วย stats file (รันสอง process) หรือไม่
+    supports_two_pass = False
+    # hwaccel ที่ decode ลง GPU memory และ filter ย่อภาพบน GPU (zero-copy) หรือ None ถ้าไม่มี
+    hwaccel = None
+    gpu_scale_filter = None
+
+    def __init__(self, codec):
+        self.codec = codec
+
+    def input_args(self, settings):
+        """arguments ก่อน -i (เช่น hwaccel)"""
+        if settings.get("scale_on_gpu"):
+            # zero-copy: frame ที่ decode แล้วอยู่บน GPU จนถึง encoder
+            return ['-hwaccel', self.hwaccel, '-hwaccel_output_format', self.hwaccel]
+        if settings.get("hwaccel"):
+            return ['-hwaccel', settings["hwaccel"]]
+        return []
+
+    def rate_args(self, bitrate_bps):
+        kbps = f"{bitrate_bps // 1000}k"
+        args = ['-b:v', kbps]
+        if self.supports_maxrate:
+            args += ['-maxrate', kbps, '-bufsize', f"{bitrate_bps * 2 // 1000}k"]
+        return args
+
+    def quality_args(self, settings):
+        """flags เฉพาะของ encoder ที่แปลงมาจาก preset"""
+        return []
+
+    def pass_args(self, pass_number, passlog_prefix):
+        """arguments ของ pass ที่ 1/2 (passlog_prefix เป็น path ที่แยกต่อ job)"""
+        return ['-pass', str(pass_number), '-passlogfile', passlog_prefix]
+
+    def thread_args(self, threads):
+        """จำกัดจำนวน thread ของ encoder (ThreadBudget)"""
+        return ['-threads', str(threads)]
+
+    def video_filters(self, settings):
+        """filter ของ video (settings["scale_size"] = ขนาดที่ย่อ, settings["scale_on_gpu"] = ย่อบน GPU)"""
+        if not settings.get("scale_size"):
+            return []
+        width, height = settings["scale_size"]
+        if settings.get("scale_on_gpu"):
+            return [f'{self.gpu_scale_filter}=w={width}:h={height}']
+        return [f'scale={width}:{height}:flags={CPU_SCALE_FLAGS}']
+
+    def output_args(self, settings, bitrate_bps):
+        args = ['-c:v', self.codec]
+        filters = self.video_filters(settings)
+        if filters:
+            args += ['-vf', ','.join(filters)]
+        return args + self.rate_args(bitrate_bps) + self.quality_args(settings)
+
+    def encode_args(self, settings, bitrate_bps, threads=None, pass_number=None, passlog_prefix=None):
+        """output_args พร้อมจำนวน thread และ arguments ของ two-pass (ถ้าระบุ)"""
+        args = self.output_args(settings, bitrate_bps)
+        if threads and not self.hardware:
+            args += self.thread_args(threads)
+        if pass_number:
+            args += self.pass_args(pass_number, passlog_prefix)
+        return args
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.codec!r})"
+
+
+class AmfBackend(EncoderBackend):
+    """AMD AMF: ใช้ค่าใน preset ได้ตรงๆ"""
+    family = 'amf'
+    hardware = True
+
+    def quality_args(self, settings):
+        args = []
+        for key in ("quality", "rc", "usage", "preanalysis"):
+            if settings.get(key):
+                args += [f'-{key}', settings[key]]
+        return args
+
+
+class NvencBackend(EncoderBackend):
+    family = 'nvenc'
+    hardware = True
+    hwaccel = 'cuda'
+    gpu_scale_filter = 'scale_cuda'
+
+    def quality_args(self, settings):
+        args = ['-preset', NVENC_PRESETS.get(settings.get("quality"), "p4")]
+        if settings.get("rc") == "cbr":
+            args += ['-rc', 'cbr']
+        elif settings.get("rc") == "cqp":
+            args += ['-rc', 'constqp']
+        elif settings.get("rc"):
+            args += ['-rc', 'vbr']
+        if settings.get("usage") in ("ultralowlatency", "lowlatency"):
+            args += ['-tune', 'ull' if settings["usage"] == "ultralowlatency" else 'll']
+        if settings.get("preanalysis") == "1":
+            args += ['-rc-lookahead', '20']
+        if settings.get("two_pass"):
+            # NVENC ทำ two-pass ภายใน encoder ใน process เดียว
+            args += ['-multipass', 'fullres']
+        return args
+
+
+class QsvBackend(EncoderBackend):
+    family = 'qsv'
+    hardware = True
+    hwaccel = 'qsv'
+    gpu_scale_filter = 'scale_qsv'
+
+    def quality_args(self, settings):
+        args = ['-preset', QSV_PRESETS.get(settings.get("quality"), "medium")]
+        if settings.get("preanalysis") == "1":
+            args += ['-look_ahead', '1']
+        return args
+
+
+class VaapiBackend(EncoderBackend):
+    """VAAPI (Linux): decode ด้วย CPU/hwaccel แล้ว upload frame ไปที่ GPU ก่อน encode"""
+    family = 'vaapi'
+    hardware = True
+    hwaccel = 'vaapi'
+    gpu_scale_filter = 'scale_vaapi'
+
+    def input_args(self, settings):
+        if settings.get("scale_on_gpu"):
+            return ['-hwaccel', 'vaapi', '-hwaccel_device', VAAPI_DEVICE, '-hwaccel_output_format', 'vaapi']
+        return ['-vaapi_device', VAAPI_DEVICE]
+
+    def video_filters(self, settings):
+        if settings.get("scale_on_gpu"):
+            return super().video_filters(settings)
+        # ย่อบน CPU (ถ้ามี) แล้ว upload frame ไปที่ GPU
+        return super().video_filters(settings) + ['format=nv12', 'hwupload']
+
+    def quality_args(self, settings):
+        args = []
+        level = VAAPI_COMPRESSION.get(settings.get("quality"))
+        if level:
+            args += ['-compression_level', level]
+        if settings.get("rc") == "cbr":
+            args += ['-rc_mode', 'CBR']
+        else:
+            args += ['-rc_mode', 'VBR']
+        return args
+
+
+class X264Backend(EncoderBackend):
+    family = 'x264'
+    supports_two_pass = True
+
+    def quality_args(self, settings):
+        return ['-preset', X26X_PRESETS.get(settings.get("quality"), "faster")]
+
+
+class X265Backend(X264Backend):
+    family = 'x265'
+
+    def encode_args(self, settings, bitrate_bps, threads=None, pass_number=None, passlog_prefix=None):
+        # libx265 รับทั้ง thread pool และ stats file ผ่าน -x265-params ตัวเดียว (ffmpeg ใช้ค่าสุดท้ายถ้าระบุซ้ำ)
+        # stats file ใช้ path สัมพัทธ์เพื่อไม่ให้ ':' ของ drive letter ชนกับตัวคั่น
+        params = []
+        if threads:
+            params.append(f'pools={threads}')
+        if pass_number:
+            params += [f'pass={pass_number}', f'stats={passlog_prefix}.log']
+        args = self.output_args(settings, bitrate_bps)
+        if params:
+            args += ['-x265-params', ':'.join(params)]
+        return args
+
+
+class SvtAv1Backend(EncoderBackend):
+    family = 'svtav1'
+    # SVT-AV1 ใช้ -maxrate ได้เฉพาะโหมด CRF
+    supports_maxrate = False
+    # two-pass (passes/pass/stats) เป็น option ของ SvtAv1EncApp ไม่ใช่ของ library ที่ ffmpeg เรียก จึงใช้ single-pass
+    supports_two_pass = False
+
+    def quality_args(self, settings):
+        return ['-preset', SVTAV1_PRESETS.get(settings.get("quality"), "8")]
+
+    def thread_args(self, threads):
+        # lp = จำนวน logical processor ที่ SVT-AV1 ใช้
+        return ['-svtav1-params', f'lp={threads}']
+
+
+ENCODER_BACKENDS = {
+    backend.codec: backend for backend in [
+        NvencBackend('h264_nvenc'), NvencBackend('hevc_nvenc'),
+        QsvBackend('h264_qsv'), QsvBackend('hevc_qsv'),
+        AmfBackend('h264_amf'), AmfBackend('hevc_amf'),
+        VaapiBackend('h264_vaapi'), VaapiBackend('hevc_vaapi'),
+        X264Backend('libx264'), X265Backend('libx265'), SvtAv1Backend('libsvtav1'),
+    ]
+}
+
+# ลำดับการเลือกอัตโนมัติ (เร็วที่สุดก่อน) - ใช้ H.264 เพื่อให้ใส่ได้ทุก container เดิม
+AUTO_ENCODER_ORDER = ['h264_nvenc', 'h264_qsv', 'h264_amf', 'h264_vaapi', 'libx264', 'libx265', 'libsvtav1']
+
+_detect_lock = threading.Lock()
+_listed_encoders = {}   # ffmpeg_path -> set ของชื่อ encoder จาก `ffmpeg -encoders`
+_usable_encoders = {}   # (ffmpeg_path, codec) -> bool จากการทดลอง encode
+_auto_encoder = {}      # ffmpeg_path -> backend ที่เลือกอัตโนมัติ
+
+
+def _run(command, timeout):
+    return subprocess.run(command, capture_output=True, text=True, encoding='utf-8', errors='replace',
+                          timeout=timeout,
+                          creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0)
+
+
+def parse_encoder_list(output):
+    """ดึงชื่อ video encoder จากผลลัพธ์ของ `ffmpeg -encoders`"""
+    names = set()
+    for line in output.splitlines():
+        parts = line.split()
+        # รูปแบบ: " V....D libx264   libx264 H.264 / AVC ..."
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] == 'V' and parts[1] != '=':
+            names.add(parts[1])
+    return names
+
+
+def list_encoders(ffmpeg_path):
+    """รัน `ffmpeg -encoders` ครั้งเดียวต่อ process แล้ว cache ผลไว้ (raise FileNotFoundError ถ้าไม่พบ ffmpeg)"""
+    with _detect_lock:
+        if ffmpeg_path not in _listed_encoders:
+            try:
+                result = _run([ffmpeg_path, '-hide_banner', '-encoders'], timeout=30)
+                _listed_encoders[ffmpeg_path] = parse_encoder_list(result.stdout)
+            except subprocess.SubprocessError:
+                _listed_encoders[ffmpeg_path] = set()
+        return _listed_encoders[ffmpeg_path]
+
+
+def is_encoder_usable(ffmpeg_path, codec):
+    """ตรวจว่า encoder ใช้ได้จริง: software ดูจาก -encoders, hardware ทดลอง encode 1 frame"""
+    if codec not in list_encoders(ffmpeg_path):
+        return False
+    backend = ENCODER_BACKENDS.get(codec)
+    if backend is None or not backend.hardware:
+        return True
+    key = (ffmpeg_path, codec)
+    with _detect_lock:
+        if key in _usable_encoders:
+            return _usable_encoders[key]
+    settings = {}
+    command = [ffmpeg_path, '-hide_banner', '-v', 'error'] + backend.input_args(settings) + [
+        '-f', 'lavfi', '-i', 'color=black:size=256x256:rate=25:duration=0.2',
+        '-frames:v', '1'] + backend.output_args(settings, 1_000_000) + ['-f', 'null', '-']
+    try:
+        usable = _run(command, timeout=20).returncode == 0
+    except (OSError, subprocess.SubprocessError):
+        usable = False
+    with _detect_lock:
+        _usable_encoders[key] = usable
+    return usable
+
+
+def select_encoder(ffmpeg_path, requested=None):
+    """คืนค่า EncoderBackend ที่จะใช้
+
+    requested: ชื่อ encoder ใน ffmpeg (เช่น 'h264_nvenc') หรือ None/'auto' เพื่อเลือก encoder ที่เร็วที่สุดที่ใช้ได้
+    """
+    if requested and requested != 'auto':
+        return ENCODER_BACKENDS.get(requested) or EncoderBackend(requested)
+    with _detect_lock:
+        if ffmpeg_path in _auto_encoder:
+            return _auto_encoder[ffmpeg_path]
+    chosen = None
+    for codec in AUTO_ENCODER_ORDER:
+        if is_encoder_usable(ffmpeg_path, codec):
+            chosen = ENCODER_BACKENDS[codec]
+            break
+    if chosen is None:
+        # ffmpeg ไม่มี encoder ที่รู้จักเลย ใช้ libx264 แล้วให้ ffmpeg แจ้ง error เอง
+        chosen = ENCODER_BACKENDS['libx264']
+    with _detect_lock:
+        _auto_encoder[ffmpeg_path] = chosen
+    return chosen
@@ -0,0 +1,103 @@
+"""Journal ของ batch: บันทึกสถานะของแต่ละไฟล์ลงโฟลเดอร์ output เพื่อให้รันต่อได้หลังโปรแกรมปิด/ยกเลิก
+
+เก็บเป็น JSON lines แบบ append-only (หนึ่งบรรทัดต่อการเปลี่ยนสถานะ) จึงเขียนได้เร็วและไม่เสียหายถ้าโปรแกรมปิดกลางคัน
+"""
+import json
+import os
+import threading
+import time
+
+JOURNAL_FILENAME = '.video_reducer_journal.jsonl'
+
+STATE_PENDING = 'pending'
+STATE_RUNNING = 'running'
+STATE_DONE = 'done'
+STATE_FAILED = 'failed'
+
+
+def file_fingerprint(path):
+    """(size, mtime_ns) ของไฟล์ หรือ None ถ้าอ่านไม่ได้"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+class BatchJournal:
+    """สถานะของแต่ละ input (pending/running/done/failed) พร้อม fingerprint ของ input"""
+
+    def __init__(self, output_folder):
+        self.path = os.path.join(output_folder, JOURNAL_FILENAME)
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # บรรทัดสุดท้ายอาจเขียนไม่ครบถ้าโปรแกรมปิดกะทันหัน
+                        continue
+                    self._entries[record['input']] = record
+        except OSError:
+            pass
+
+    def _append(self, record):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def get_state(self, input_path):
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(input_path))
+        return entry['state'] if entry else None
+
+    def is_done(self, input_path, output_path):
+        """True ถ้าไฟล์นี้แปลงเสร็จในรอบก่อน, input ไม่เปลี่ยน และ output ยังอยู่
+
+        ใช้ output ที่บันทึกไว้ก่อน (เช่นไฟล์ที่ remux เป็น .mp4 จะมีนามสกุลต่างจาก output_path ที่คาดไว้)
+        """
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(input_path))
+        return (entry is not None and entry['state'] == STATE_DONE
+                and entry.get('fingerprint') == file_fingerprint(input_path)
+                and os.path.exists(entry.get('output') or output_path))
+
+    def set_state(self, input_path, state, output_path=None, error=None):
+        record = {
+            'input': os.path.abspath(input_path),
+            'state': state,
+            'fingerprint': file_fingerprint(input_path),
+            'output': output_path,
+            'time': time.time(),
+        }
+        if error:
+            record['error'] = error
+        with self._lock:
+            self._entries[record['input']] = record
+            try:
+                self._append(record)
+            except OSError:
+                pass
+
+    def compact(self):
+        """เขียน journal ใหม่ให้เหลือบรรทัดเดียวต่อไฟล์ (atomic rename)"""
+        with self._lock:
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    for record in self._entries.values():
+                        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                os.replace(tmp_path, self.path)
+            except OSError:
+                pass
+
+    def counts(self):
+        result = {}
+        with self._lock:
+            for entry in self._entries.values():
+                result[entry['state']] = result.get(entry['state'], 0) + 1
+        return result
@@ -0,0 +1,160 @@
+"""Content-aware bitrate: encode ตัวอย่างสั้นๆ จากหลายช่วงของไฟล์ที่ bitrate ต่างกัน
+แล้ววัดคุณภาพเทียบต้นฉบับด้วย SSIM/PSNR (หรือ VMAF ถ้า ffmpeg มี libvmaf) เพื่อเลือก bitrate ต่ำสุดที่ผ่านเกณฑ์"""
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+QUALITY_METRICS = ('auto', 'vmaf', 'ssim', 'psnr')
+# เกณฑ์คุณภาพค่าเริ่มต้นของแต่ละ metric
+DEFAULT_QUALITY_TARGETS = {'vmaf': 93.0, 'ssim': 0.98, 'psnr': 40.0}
+
+# จำนวนและความยาว (วินาที) ของตัวอย่างที่ตัดจากแต่ละไฟล์
+SAMPLE_COUNT = 3
+SAMPLE_SECONDS = 4.0
+# bitrate ที่ทดลอง (สัดส่วนของ bitrate เดิม เรียงจากน้อยไปมาก)
+CANDIDATE_FRACTIONS = (0.2, 0.3, 0.4, 0.5, 0.65, 0.8)
+
+_SCORE_PATTERNS = {
+    'ssim': re.compile(r'SSIM .*All:([\d.]+)'),
+    'psnr': re.compile(r'PSNR .*average:([\d.]+|inf)'),
+    'vmaf': re.compile(r'VMAF score[:=]\s*([\d.]+)'),
+}
+
+_filter_lock = threading.Lock()
+_listed_filters = {}  # ffmpeg_path -> set ของชื่อ filter จาก `ffmpeg -filters`
+
+
+def _run(command, timeout):
+    return subprocess.run(command, capture_output=True, text=True, encoding='utf-8', errors='replace',
+                          timeout=timeout,
+                          creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0)
+
+
+def has_filter(ffmpeg_path, name):
+    """ตรวจว่า ffmpeg build นี้มี filter ชื่อ name หรือไม่ (cache ผลต่อ process)"""
+    with _filter_lock:
+        if ffmpeg_path not in _listed_filters:
+            names = set()
+            try:
+                output = _run([ffmpeg_path, '-hide_banner', '-filters'], timeout=30).stdout
+                for line in output.splitlines():
+                    parts = line.split()
+                    # รูปแบบ: " ... ssim              VV->V      Calculate the SSIM ..."
+                    if len(parts) >= 3 and '->' in parts[2]:
+                        names.add(parts[1])
+            except (OSError, subprocess.SubprocessError):
+                pass
+            _listed_filters[ffmpeg_path] = names
+        return name in _listed_filters[ffmpeg_path]
+
+
+def resolve_metric(ffmpeg_path, metric='auto'):
+    """'auto' = VMAF ถ้า ffmpeg มี libvmaf ไม่เช่นนั้นใช้ SSIM"""
+    if metric and metric != 'auto':
+        return metric
+    return 'vmaf' if has_filter(ffmpeg_path, 'libvmaf') else 'ssim'
+
+
+def sample_offsets(duration, count=SAMPLE_COUNT, length=SAMPLE_SECONDS):
+    """จุดเริ่มของตัวอย่างที่กระจายเท่าๆ กันตลอดไฟล์ (ไม่รวมช่วงต้น/ท้ายสุด)"""
+    if not duration or duration <= length:
+        return [0.0]
+    count = max(1, min(count, int(duration // length)))
+    step = duration / (count + 1)
+    return [max(0.0, step * (i + 1) - length / 2) for i in range(count)]
+
+
+def parse_score(metric, stderr):
+    """ดึงคะแนนจาก log ของ filter ssim/psnr/libvmaf หรือ None ถ้าไม่พบ"""
+    match = None
+    for match in _SCORE_PATTERNS[metric].finditer(stderr or ''):
+        pass
+    if match is None:
+        return None
+    value = match.group(1)
+    return float('inf') if value == 'inf' else float(value)
+
+
+def score_sample(ffmpeg_path, backend, settings, input_path, offset, length, bitrate_bps, metric, sample_path):
+    """encode ตัวอย่างหนึ่งช่วงที่ bitrate ที่กำหนดแล้ววัดคุณภาพเทียบต้นฉบับช่วงเดียวกัน
+
+    ถ้า settings มี scale_size (ดู plan_scale) ตัวอย่างถูกย่อเหมือน output จริง และต้นฉบับถูกย่อเป็นขนาดเดียวกันก่อนเทียบ
+    """
+    window = ['-ss', f'{offset:.3f}', '-t', f'{length:.3f}']
+    encode = ([ffmpeg_path, '-hide_banner', '-v', 'error', '-y'] + backend.input_args(settings) + window
+              + ['-i', input_path, '-an'] + backend.output_args(settings, bitrate_bps) + ['-f', 'matroska', sample_path])
+    if _run(encode, timeout=600).returncode != 0:
+        return None
+    # input แรก = ตัวอย่างที่ encode แล้ว (distorted), input ที่สอง = ต้นฉบับ (reference)
+    filter_name = 'libvmaf' if metric == 'vmaf' else metric
+    # ต้นฉบับต้องมีขนาดเท่าตัวอย่างที่ถูกย่อ ไม่เช่นนั้น filter วัดคุณภาพจะไม่รับ
+    scale = ''
+    if settings.get("scale_size"):
+        width, height = settings["scale_size"]
+        scale = f'scale={width}:{height},'
+    graph = f'[0:v]setpts=PTS-STARTPTS[d];[1:v]{scale}setpts=PTS-STARTPTS[r];[d][r]{filter_name}'
+    compare = ([ffmpeg_path, '-hide_banner', '-i', sample_path] + window
+               + ['-i', input_path, '-lavfi', graph, '-f', 'null', '-'])
+    result = _run(compare, timeout=600)
+    if result.returncode != 0:
+        return None
+    return parse_score(metric, result.stderr)
+
+
+def choose_bitrate(ffmpeg_path, backend, settings, input_path, duration, original_bitrate_bps, metric, target, stop_event=None):
+    """หา bitrate ต่ำสุดใน CANDIDATE_FRACTIONS ที่ทุกตัวอย่างได้คะแนน >= target (binary search)
+
+    คืนค่า dict {bitrate, score, metric, target, met} หรือ None ถ้าวัดไม่ได้/ถูกยกเลิก
+    ถ้าไม่มี bitrate ใดผ่านเกณฑ์ จะคืนค่า bitrate สูงสุดที่ทดลองพร้อม met=False
+    """
+    candidates = [int(original_bitrate_bps * f) for f in CANDIDATE_FRACTIONS]
+    offsets = sample_offsets(duration)
+    length = min(SAMPLE_SECONDS, duration) if duration else SAMPLE_SECONDS
+    work_dir = tempfile.mkdtemp(prefix='vbr_quality_')
+    scores = {}
+
+    def worst_score(index):
+        # ใช้คะแนนที่แย่ที่สุดของทุกตัวอย่าง เพื่อให้ช่วงที่เคลื่อนไหวมากไม่ถูกเฉลี่ยกลบ
+        if index not in scores:
+            values = []
+            for n, offset in enumerate(offsets):
+                if stop_event and stop_event.is_set():
+                    return None
+                sample_path = os.path.join(work_dir, f'sample_{index}_{n}.mkv')
+                value = score_sample(ffmpeg_path, backend, settings, input_path, offset, length,
+                                     candidates[index], metric, sample_path)
+                if value is None:
+                    return None
+                values.append(value)
+            scores[index] = min(values)
+        return scores[index]
+
+    try:
+        low, high = 0, len(candidates) - 1
+        best = None
+        while low <= high:
+            mid = (low + high) // 2
+            score = worst_score(mid)
+            if score is None:
+                return None
+            if score >= target:
+                best = mid
+                high = mid - 1
+            else:
+                low = mid + 1
+        chosen = best if best is not None else len(candidates) - 1
+        if worst_score(chosen) is None:
+            return None
+        return {
+            'bitrate': candidates[chosen],
+            'score': scores[chosen],
+            'metric': metric,
+            'target': target,
+            'met': best is not None,
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,337 @@
+"""Adaptive scheduler: ปรับจำนวนงาน ffmpeg ที่รันพร้อมกันระหว่าง batch ตาม CPU, memory ที่ว่าง และ speed รวมของ ffmpeg
+และ admission control: จำกัดงานพร้อมกันต่อ device ของ input/output และพักงานที่พื้นที่ output ไม่พอ
+
+ใช้ psutil ถ้าติดตั้งไว้ ไม่เช่นนั้นอ่านจาก /proc (Linux) ถ้าวัดไม่ได้จะปรับจาก speed อย่างเดียว
+"""
+import collections
+import os
+import shutil
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:  # psutil เป็น optional dependency
+    psutil = None
+
+# ปรับจำนวนงานได้บ่อยสุดทุกกี่วินาที (รอให้ ffmpeg ที่เพิ่งเริ่มรายงาน speed ก่อน)
+ADJUST_INTERVAL = 5.0
+# CPU ต่ำกว่านี้ = ยังมี core ว่าง เพิ่มงานได้, สูงกว่านี้ = เต็มแล้ว
+LOW_CPU_PERCENT = 75.0
+HIGH_CPU_PERCENT = 95.0
+# memory ว่างขั้นต่ำที่ต้องเหลือไว้ (สัดส่วนของ memory ทั้งหมด)
+MIN_FREE_MEMORY_FRACTION = 0.10
+# ถ้าเพิ่มงานแล้ว speed รวมเพิ่มไม่ถึงสัดส่วนนี้ ถือว่าเพิ่มแล้วไม่คุ้ม (เครื่องอิ่มตัวแล้ว)
+MIN_SPEED_GAIN = 1.05
+# เพดานที่เรียนรู้ไว้จะถูกลบหลังจากกี่วินาที (โหลดของเครื่องที่ใช้ร่วมกันเปลี่ยนได้ระหว่าง batch)
+CEILING_RETRY_INTERVAL = 120.0
+
+
+def available_cpus():
+    """จำนวน CPU ที่ process นี้ใช้ได้จริง (เคารพ cpuset/affinity ของ container ถ้ามี)"""
+    if hasattr(os, 'sched_getaffinity'):
+        try:
+            return len(os.sched_getaffinity(0)) or 1
+        except OSError:
+            pass
+    return os.cpu_count() or 1
+
+
+class SystemSampler:
+    """วัด CPU utilization (%) และ memory ที่ว่าง (สัดส่วน) ของทั้งเครื่อง คืนค่า None ถ้าวัดไม่ได้"""
+
+    def __init__(self):
+        self._last_cpu_times = None
+
+    def cpu_percent(self):
+        if psutil is not None:
+            return psutil.cpu_percent(interval=None)
+        try:
+            with open('/proc/stat', 'r') as f:
+                values = [int(v) for v in f.readline().split()[1:]]
+        except (OSError, ValueError):
+            return None
+        # idle + iowait
+        idle, total = values[3] + (values[4] if len(values) > 4 else 0), sum(values)
+        last, self._last_cpu_times = self._last_cpu_times, (idle, total)
+        if last is None or total == last[1]:
+            return None
+        return 100.0 * (1 - (idle - last[0]) / (total - last[1]))
+
+    def free_memory_fraction(self):
+        if psutil is not None:
+            memory = psutil.virtual_memory()
+            return memory.available / memory.total if memory.total else None
+        try:
+            info = {}
+            with open('/proc/meminfo', 'r') as f:
+                for line in f:
+                    key, value = line.split(':', 1)
+                    info[key] = int(value.split()[0])
+            return info['MemAvailable'] / info['MemTotal']
+        except (OSError, KeyError, ValueError, ZeroDivisionError):
+            return None
+
+
+class AdaptiveScheduler:
+    """จำนวนงานที่ควรรันพร้อมกัน (limit) ระหว่าง min_workers ถึง max_workers
+
+    เรียก adjust() เป็นระยะจาก loop หลักพร้อม speed รวมและจำนวนงานที่กำลังรัน
+    - memory ว่างต่ำกว่าเกณฑ์ → ลดทันที
+    - CPU ยังว่างและงานเต็ม limit → เพิ่มทีละ 1
+    - เพิ่มแล้ว speed รวมไม่ดีขึ้น (หรือ CPU เต็ม) → ลดกลับและจำไว้เป็นเพดาน
+    """
+
+    def __init__(self, min_workers, max_workers, sampler=None, clock=time.monotonic):
+        self.min_workers = max(1, min(min_workers, max_workers))
+        self.max_workers = max_workers
+        self.limit = self.min_workers
+        self.ceiling = max_workers
+        self.sampler = sampler or SystemSampler()
+        self.clock = clock
+        self.last_cpu = None
+        self.last_reason = ''
+        self._last_adjust = clock()
+        self._speed_before_increase = None
+        self._ceiling_time = None
+        self.sampler.cpu_percent()  # ค่าแรกใช้เป็นจุดอ้างอิงของรอบถัดไป
+
+    def adjust(self, total_speed, running):
+        """คืนค่า limit ใหม่ (อาจเท่าเดิม)"""
+        now = self.clock()
+        if now - self._last_adjust < ADJUST_INTERVAL:
+            return self.limit
+        self._last_adjust = now
+        if self._ceiling_time is not None and now - self._ceiling_time >= CEILING_RETRY_INTERVAL:
+            self.ceiling = self.max_workers
+            self._ceiling_time = None
+        cpu = self.sampler.cpu_percent()
+        free_memory = self.sampler.free_memory_fraction()
+        self.last_cpu = cpu
+
+        if free_memory is not None and free_memory < MIN_FREE_MEMORY_FRACTION:
+            return self._set(self.limit - 1, f"memory ว่าง {free_memory * 100:.0f}%")
+
+        if self._speed_before_increase is not None:
+            # ประเมินผลของการเพิ่มงานครั้งก่อน
+            gained = total_speed >= self._speed_before_increase * MIN_SPEED_GAIN
+            self._speed_before_increase = None
+            if not gained and total_speed > 0:
+                self.ceiling = max(self.min_workers, self.limit - 1)
+                self._ceiling_time = now
+                return self._set(self.limit - 1, f"speed รวมไม่เพิ่ม ({total_speed:.2f}x)")
+
+        if cpu is not None and cpu >= HIGH_CPU_PERCENT and self.limit > self.min_workers:
+            return self._set(self.limit - 1, f"CPU {cpu:.0f}%")
+
+        if running >= self.limit and self.limit < self.ceiling and (cpu is None or cpu < LOW_CPU_PERCENT):
+            self._speed_before_increase = total_speed
+            return self._set(self.limit + 1, f"CPU {cpu:.0f}%" if cpu is not None else "")
+        return self.limit
+
+    def _set(self, limit, reason):
+        limit = max(self.min_workers, min(limit, self.max_workers))
+        if limit != self.limit:
+            self.limit = limit
+            self.last_reason = reason
+        return self.limit
+
+
+def default_min_workers(max_workers):
+    """จำนวนงานเริ่มต้นของโหมด adaptive: ครึ่งหนึ่งของจำนวน core แต่ไม่เกิน max_workers"""
+    return max(1, min(max_workers, available_cpus() // 2))
+
+
+class ThreadBudget:
+    """แบ่ง CPU threads ให้ ffmpeg ที่รันพร้อมกัน เพื่อไม่ให้แต่ละ process สร้าง thread เท่าจำนวน core
+
+    slots = จำนวนงานที่คาดว่าจะรันพร้อมกัน (start_conversion ปรับตาม scheduler และงานที่เหลือ)
+    งานที่เริ่มใหม่ได้ thread ที่ว่างอยู่หารด้วยจำนวน slot ที่ยังว่าง จึงได้ thread มากขึ้นเมื่องานอื่นจบไปแล้ว
+    """
+
+    def __init__(self, total_threads=None, slots=1):
+        self.total_threads = total_threads or available_cpus()
+        self.slots = slots
+        self._in_use = 0
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """จอง thread ให้งานที่กำลังจะเริ่ม คืนค่าจำนวน thread (อย่างน้อย 1)"""
+        with self._lock:
+            free = self.total_threads - self._in_use
+            remaining_slots = max(1, self.slots - self._running)
+            threads = max(1, free // remaining_slots)
+            self._in_use += threads
+            self._running += 1
+            return threads
+
+    def release(self, threads):
+        with self._lock:
+            self._in_use -= threads
+            self._running -= 1
+
+
+# --- Admission control ตาม device ของ input/output ---
+# เผื่อขนาด output เกินค่าที่ประมาณจาก bitrate × ความยาว (VBR, header ของ container)
+OUTPUT_SIZE_MARGIN = 1.10
+
+HOLD_DEVICE = 'device'
+HOLD_SPACE = 'space'
+
+
+def _existing_path(path):
+    """path เองหรือโฟลเดอร์แม่ที่ใกล้ที่สุดที่มีอยู่จริง (output ยังไม่ถูกสร้างตอนตรวจ admission)"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def device_of(path):
+    """device id (st_dev) ของ filesystem ที่เก็บ path หรือ None ถ้าตรวจไม่ได้
+
+    แยกตาม filesystem/partition (สอง partition บนดิสก์ลูกเดียวกันนับเป็นคนละ device)
+    """
+    try:
+        return os.stat(_existing_path(path)).st_dev
+    except OSError:
+        return None
+
+
+def free_bytes(path):
+    """พื้นที่ว่าง (bytes) ของ filesystem ที่เก็บ path หรือ None ถ้าตรวจไม่ได้"""
+    try:
+        return shutil.disk_usage(_existing_path(path)).free
+    except OSError:
+        return None
+
+
+class DeviceAdmission:
+    """ตัดสินว่างานเริ่มได้หรือยังตาม device ของ input และ output
+
+    per_device: จำนวนงานที่อ่านหรือเขียน device เดียวกันพร้อมกันได้สูงสุด (None = ไม่จำกัด)
+        เช่นดิสก์จานหมุนลูกเดียวที่หลายงาน seek แย่งกันจนช้าลงทั้งหมด
+    check_space: จองพื้นที่ output ตามขนาดที่คาดไว้ งานที่พื้นที่ว่าง (หักส่วนที่งานอื่นจองไว้) ไม่พอจะถูกพักไว้
+        การจองคงอยู่จนงานจบแม้ output จะเขียนลงดิสก์ไปบางส่วนแล้ว จึงประเมินแบบเผื่อไว้ก่อน
+    เรียกจาก loop ที่ส่งงานเท่านั้น (ไม่มี lock)
+    """
+
+    def __init__(self, per_device=None, check_space=True):
+        self.per_device = per_device or None
+        self.check_space = check_space
+        self._running = collections.Counter()
+        self._reserved = collections.Counter()
+        self._jobs = {}
+
+    @property
+    def running(self):
+        """จำนวนงานที่ได้รับอนุญาตแล้วและยังไม่ release"""
+        return len(self._jobs)
+
+    def try_admit(self, key, input_path, output_path, predicted_bytes):
+        """จองแล้วคืนค่า None ถ้าเริ่มงานได้ ไม่เช่นนั้นคืนค่าเหตุผลที่ต้องพัก
+
+        (HOLD_DEVICE, device, จำนวนงานบน device) หรือ (HOLD_SPACE, bytes ที่ต้องการ, bytes ที่ว่าง)
+        """
+        output_device = device_of(output_path)
+        devices = {device_of(input_path), output_device} - {None}
+        if self.per_device:
+            for device in devices:
+                if self._running[device] >= self.per_device:
+                    return HOLD_DEVICE, device, self._running[device]
+        reserve = 0
+        if self.check_space and predicted_bytes:
+            reserve = int(predicted_bytes * OUTPUT_SIZE_MARGIN)
+            free = free_bytes(output_path)
+            if free is not None:
+                available = free - self._reserved[output_device]
+                if reserve > available:
+                    return HOLD_SPACE, reserve, max(0, available)
+        for device in devices:
+            self._running[device] += 1
+        self._reserved[output_device] += reserve
+        self._jobs[key] = (devices, output_device, reserve)
+        return None
+
+    def release(self, key):
+        """งานของ key จบแล้ว: คืน slot ของ device และพื้นที่ที่จองไว้"""
+        job = self._jobs.pop(key, None)
+        if job is None:
+            return
+        devices, output_device, reserve = job
+        for device in devices:
+            self._running[device] -= 1
+        self._reserved[output_device] -= reserve
+
+
+class AdmissionQueue:
+    """ส่งงานจาก source ตามลำดับเดิม แต่พักงานที่ DeviceAdmission ยังไม่ให้เริ่ม แล้วลองใหม่ก่อนงานใหม่ทุกครั้ง
+
+    plan(path) คืนค่า (output_path, ขนาด output ที่คาดไว้) พักงานได้ไม่เกิน max_held งาน (ไม่อ่าน source ล่วงหน้าเกินนั้น)
+    งานที่พักเพราะพื้นที่ไม่พอขณะที่ไม่มีงานอื่นรันอยู่จะไม่มีทางเริ่มได้ จึงถูกย้ายไปที่ rejected
+    ให้ผู้เรียกบันทึกเป็นงานล้มเหลว on_hold(path, hold) ถูกเรียกครั้งแรกที่งานถูกพักเพราะพื้นที่ไม่พอ
+    admission=None = ส่งงานตามลำดับโดยไม่ตรวจอะไร
+    """
+
+    def __init__(self, source, admission, plan, max_held, on_hold=None):
+        self.source = iter(source)
+        self.admission = admission
+        self.plan = plan
+        self.max_held = max(1, max_held)
+        self.on_hold = on_hold
+        self.held = collections.deque()
+        self.rejected = []
+        self.exhausted = False
+
+    @property
+    def done(self):
+        return self.exhausted and not self.held
+
+    def _admit(self, job):
+        path, output_path, predicted, _ = job
+        hold = self.admission.try_admit(path, path, output_path, predicted)
+        if hold is None:
+            return True
+        previous = job[3]
+        if hold[0] == HOLD_SPACE and (previous is None or previous[0] != HOLD_SPACE) and self.on_hold:
+            self.on_hold(path, hold)
+        job[3] = hold
+        self.held.append(job)
+        return False
+
+    def next(self):
+        """path ของงานถัดไปที่เริ่มได้ (จองใน admission แล้ว) หรือ None ถ้าตอนนี้ยังไม่มี (ดู done)"""
+        if self.admission is None:
+            path = next(self.source, None)
+            self.exhausted = path is None
+            return path
+        while True:
+            for _ in range(len(self.held)):
+                job = self.held.popleft()
+                if self._admit(job):
+                    return job[0]
+            while not self.exhausted and len(self.held) < self.max_held:
+                path = next(self.source, None)
+                if path is None:
+                    self.exhausted = True
+                    break
+                if self._admit([path, *self.plan(path), None]):
+                    return path
+            if self.admission.running or not self.held:
+                return None
+            # ไม่มีงานรันอยู่ พื้นที่จะไม่ว่างเพิ่ม (งานที่พักเพราะ device ไม่มีในกรณีนี้)
+            self.rejected.extend((job[0], job[3]) for job in self.held)
+            self.held.clear()
+
+    def release(self, path):
+        if self.admission is not None:
+            self.admission.release(path)
+
+    def close(self):
+        """หยุดส่งงาน (ถูกสั่งหยุด): ทิ้งงานที่พักไว้และไม่อ่าน source ต่อ"""
+        self.held.clear()
+        self.exhausted = True
@@ -0,0 +1,275 @@
+"""Staging ผ่าน scratch ในเครื่อง สำหรับ input/output ที่อยู่บน NAS หรือ network share (SMB/NFS)
+
+ffmpeg ที่อ่าน/เขียนผ่าน network โดยตรงถูกจำกัดด้วยความเร็วของ link และ seek ช้า
+ScratchStager copy input ถัดไปมาไว้ใน scratch ล่วงหน้า (จำกัดจำนวนไฟล์และพื้นที่), ให้ ffmpeg เขียน output ลง scratch
+แล้วอัปโหลดกลับปลายทางใน background thread
+"""
+import collections
+import itertools
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+
+from video_converter_core import partial_output_path
+
+# จำนวนไฟล์ที่ copy ไว้ล่วงหน้า (ยังไม่มีงานมาใช้) สูงสุด
+DEFAULT_PREFETCH_DEPTH = 2
+
+_QUEUED = 'queued'
+_COPYING = 'copying'
+_READY = 'ready'
+_IN_USE = 'in_use'
+_DIRECT = 'direct'
+
+
+class _Entry:
+    """input หนึ่งไฟล์ที่ถูก schedule ไว้ (reserve = พื้นที่ที่จองใน scratch สำหรับ input และ output ของงานนี้)"""
+    __slots__ = ('path', 'size', 'reserve', 'local', 'state', 'released')
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        # output ของการลด bitrate ไม่ใหญ่กว่า input จึงจองพื้นที่ไว้สองเท่าของ input
+        self.reserve = size * 2
+        self.local = None
+        self.state = _QUEUED
+        self.released = False
+
+
+class ScratchStager:
+    """copy input ล่วงหน้าและอัปโหลด output กลับใน background โดยใช้ scratch ไม่เกิน max_bytes
+
+    ลำดับการใช้งาน: schedule(paths) ตามลำดับที่จะ encode → งานเรียก acquire(path) ได้ path ใน scratch
+    → เขียน output ที่ scratch_output_path() → upload() เมื่อสำเร็จ → release(path) เมื่องานจบ (ทุกสถานะ)
+    → upload_result() จนกว่าอัปโหลดจะเสร็จ → close() ท้าย batch (รออัปโหลดที่ค้างอยู่)
+    ไฟล์ที่ใหญ่เกินพื้นที่ scratch หรือ copy ไม่สำเร็จจะถูกอ่านจากต้นทางโดยตรง
+    """
+
+    def __init__(self, scratch_dir, max_bytes=None, prefetch_depth=DEFAULT_PREFETCH_DEPTH, message_queue=None):
+        os.makedirs(scratch_dir, exist_ok=True)
+        self.root = tempfile.mkdtemp(prefix='vbr_scratch_', dir=scratch_dir)
+        self.max_bytes = max_bytes or shutil.disk_usage(self.root).free
+        self.prefetch_depth = max(0, int(prefetch_depth))
+        self.message_queue = message_queue
+        self.stats = {
+            'staged': 0, 'direct': 0, 'input_bytes': 0, 'input_seconds': 0.0,
+            'uploaded': 0, 'upload_failed': 0, 'output_bytes': 0, 'output_seconds': 0.0,
+            'wait_seconds': 0.0,
+        }
+        self._cond = threading.Condition()
+        self._entries = {}
+        self._pending = collections.deque()
+        self._ahead = set()  # path ที่กำลัง copy หรือ copy เสร็จแล้วแต่ยังไม่มีงานมาใช้
+        self._used = 0
+        self._closed = False
+        self._names = itertools.count()
+        self._uploads = queue.Queue()
+        self._upload_results = {}  # output_path -> None (สำเร็จ) หรือข้อความ error เมื่ออัปโหลดเสร็จแล้ว
+        self._prefetcher = threading.Thread(target=self._prefetch_loop, daemon=True)
+        self._uploader = threading.Thread(target=self._upload_loop, daemon=True)
+        self._prefetcher.start()
+        self._uploader.start()
+
+    def _local_path(self, kind, path):
+        # แต่ละไฟล์อยู่ในโฟลเดอร์ย่อยของตัวเอง ชื่อไฟล์จึงเหมือนต้นฉบับ (ข้อความ/progress แสดงชื่อเดิม)
+        folder = os.path.join(self.root, kind, str(next(self._names)))
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, os.path.basename(path))
+
+    def _post(self, text):
+        if self.message_queue:
+            self.message_queue.put(("text", text, None))
+
+    # --- input ---
+    def schedule(self, paths):
+        """เพิ่ม input ที่จะ encode (ตามลำดับ) ให้ prefetcher copy ล่วงหน้า"""
+        with self._cond:
+            for path in paths:
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    continue
+                entry = _Entry(path, size)
+                if entry.reserve > self.max_bytes:
+                    entry.state = _DIRECT
+                else:
+                    self._pending.append(entry)
+                self._entries[path] = entry
+            self._cond.notify_all()
+
+    def _prefetch_loop(self):
+        while True:
+            with self._cond:
+                while not self._closed and not (
+                        self._pending and len(self._ahead) < self.prefetch_depth
+                        and self._used + self._pending[0].reserve <= self.max_bytes):
+                    self._cond.wait()
+                if self._closed:
+                    return
+                entry = self._pending.popleft()
+                self._start_copy(entry)
+            self._copy_in(entry)
+
+    def _start_copy(self, entry):
+        entry.state = _COPYING
+        self._ahead.add(entry.path)
+        self._used += entry.reserve
+
+    def _copy_in(self, entry):
+        """copy input ลง scratch (เรียกนอก lock) ถ้าไม่สำเร็จจะให้งานอ่านจากต้นทางแทน"""
+        local = None
+        start = time.monotonic()
+        try:
+            local = self._local_path('in', entry.path)
+            shutil.copyfile(entry.path, local)
+        except OSError:
+            if local:
+                _remove_quietly(local)
+            local = None
+        elapsed = time.monotonic() - start
+        with self._cond:
+            if local:
+                self.stats['input_bytes'] += entry.size
+                self.stats['input_seconds'] += elapsed
+            if local and not entry.released:
+                entry.local = local
+                entry.state = _READY
+                self.stats['staged'] += 1
+            else:
+                if local:
+                    _remove_quietly(local)
+                entry.state = _DIRECT
+                self._ahead.discard(entry.path)
+                self._used -= entry.reserve
+            self._cond.notify_all()
+
+    def acquire(self, path, stop_event=None):
+        """path ที่ ffmpeg ควรอ่าน (copy ใน scratch หรือ path เดิม) รอถ้ากำลัง copy อยู่
+
+        ถ้า prefetcher ยังไม่ถึงไฟล์นี้ งานจะ copy เอง (ถ้ามีพื้นที่) คืนค่า None ถ้าถูกสั่งหยุดระหว่างรอ
+        """
+        start = time.monotonic()
+        try:
+            with self._cond:
+                entry = self._entries.get(path)
+                if entry is None:
+                    return path
+                copy_here = entry.state == _QUEUED and self._used + entry.reserve <= self.max_bytes
+                if entry.state == _QUEUED:
+                    self._pending.remove(entry)
+                    if copy_here:
+                        self._start_copy(entry)
+                    else:
+                        entry.state = _DIRECT
+            if copy_here:
+                self._copy_in(entry)
+            with self._cond:
+                while entry.state == _COPYING:
+                    if stop_event and stop_event.is_set():
+                        return None
+                    self._cond.wait(0.5)
+                if entry.state == _READY:
+                    entry.state = _IN_USE
+                    self._ahead.discard(path)
+                    self._cond.notify_all()
+                    return entry.local
+                self.stats['direct'] += 1
+                return path
+        finally:
+            with self._cond:
+                self.stats['wait_seconds'] += time.monotonic() - start
+
+    def release(self, path):
+        """งานของ path จบแล้ว (ทุกสถานะ): ลบ copy ใน scratch และคืนพื้นที่ที่จองไว้"""
+        with self._cond:
+            entry = self._entries.pop(path, None)
+            if entry is None:
+                return
+            entry.released = True
+            if entry.state == _QUEUED:
+                self._pending.remove(entry)
+            elif entry.state in (_READY, _IN_USE):
+                _remove_quietly(entry.local)
+                self._ahead.discard(path)
+                self._used -= entry.reserve
+            self._cond.notify_all()
+
+    # --- output ---
+    def scratch_output_path(self, output_path):
+        """ไฟล์ชั่วคราวใน scratch ที่ ffmpeg เขียนแทน partial_output_path(output_path)"""
+        return self._local_path('out', partial_output_path(output_path))
+
+    def upload(self, local_path, output_path):
+        """ส่ง output ที่ encode เสร็จแล้วให้ uploader copy กลับปลายทาง (rename เป็นชื่อจริงเมื่อ copy เสร็จ)"""
+        size = os.path.getsize(local_path)
+        with self._cond:
+            self._used += size
+        self._uploads.put((local_path, output_path, size))
+
+    def _upload_loop(self):
+        while True:
+            item = self._uploads.get()
+            if item is None:
+                self._uploads.task_done()
+                return
+            local_path, output_path, size = item
+            remote_partial = partial_output_path(output_path)
+            start = time.monotonic()
+            try:
+                shutil.copyfile(local_path, remote_partial)
+                os.replace(remote_partial, output_path)
+            except OSError as e:
+                _remove_quietly(remote_partial)
+                with self._cond:
+                    self.stats['upload_failed'] += 1
+                    # ไฟล์ local ที่เก็บไว้ให้ผู้ใช้ไม่นับรวมในพื้นที่ของ prefetch (ไม่เช่นนั้น budget จะหายไปถาวร)
+                    self._used -= size
+                    self._upload_results[output_path] = str(e)
+                    self._cond.notify_all()
+                self._post(f"⚠️ อัปโหลด {os.path.basename(output_path)} ไม่สำเร็จ: {e} (ไฟล์อยู่ที่ {local_path})\n")
+            else:
+                _remove_quietly(local_path)
+                with self._cond:
+                    self.stats['uploaded'] += 1
+                    self.stats['output_bytes'] += size
+                    self.stats['output_seconds'] += time.monotonic() - start
+                    self._used -= size
+                    self._upload_results[output_path] = None
+                    self._cond.notify_all()
+            self._uploads.task_done()
+
+    def upload_result(self, output_path):
+        """ผลการอัปโหลด output_path: (False, None) ยังไม่เสร็จ, (True, None) สำเร็จ, (True, error) ไม่สำเร็จ
+
+        ผลที่อ่านแล้วถูกลบออก (เรียกครั้งเดียวต่อไฟล์หลังจากได้ done = True)
+        """
+        with self._cond:
+            if output_path not in self._upload_results:
+                return False, None
+            return True, self._upload_results.pop(output_path)
+
+    def close(self):
+        """รออัปโหลดที่ค้างอยู่ หยุด thread และลบ scratch (เก็บไว้ถ้ามีไฟล์ที่อัปโหลดไม่สำเร็จ) เรียกซ้ำได้"""
+        if self._closed:
+            return self.stats
+        self._uploads.join()
+        self._uploads.put(None)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._prefetcher.join()
+        self._uploader.join()
+        if not self.stats['upload_failed']:
+            shutil.rmtree(self.root, ignore_errors=True)
+        return self.stats
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
@@ -0,0 +1,192 @@
+"""Trace ของ batch: บันทึกช่วงเวลา (span) ของแต่ละขั้นตอนต่องานและต่อ worker
+
+ขั้นตอนที่บันทึก: probe (ffprobe), stage (รอ scratch), spawn (สร้าง process ffmpeg), encode/copy (ffmpeg ทำงาน),
+finalize (stat + rename/อัปโหลด output) และ job (ทั้งงาน) export เป็น Chrome trace event JSON
+(เปิดด้วย https://ui.perfetto.dev หรือ chrome://tracing) และสรุปเป็น histogram ต่อขั้นตอนท้าย batch
+ไม่ส่ง tracer (None) = ไม่บันทึกอะไรเลย ผู้เรียกตรวจแค่ `if tracer` ต่อขั้นตอน
+"""
+import collections
+import json
+import os
+import threading
+import time
+
+# ขอบบนของแต่ละช่อง histogram (วินาที)
+HISTOGRAM_BUCKETS = (0.01, 0.1, 1.0, 10.0, 60.0, 600.0)
+# ลำดับการแสดงขั้นตอนในสรุป (ขั้นตอนอื่นต่อท้ายตามชื่อ)
+STAGE_ORDER = ('probe', 'stage', 'spawn', 'encode', 'copy', 'finalize', 'job')
+
+
+class JobTrace:
+    """span ของงานหนึ่งงาน อยู่บนแถว (tid) เดียวกันใน trace: thread ของ worker หรือ lane ของ engine แบบ asyncio"""
+
+    __slots__ = ('tracer', 'name', 'tid', 'start', '_lane')
+
+    def __init__(self, tracer, name, tid, lane=None):
+        self.tracer = tracer
+        self.name = name
+        self.tid = tid
+        self._lane = lane
+        self.start = time.perf_counter()
+
+    def step(self, stage, start, value=None, **args):
+        """บันทึกขั้นตอนที่เริ่มที่ start และเพิ่งจบ ถ้าผลลัพธ์เป็น FfmpegRun จะแยกช่วง spawn ออกจากช่วงที่ ffmpeg ทำงาน"""
+        end = time.perf_counter()
+        spawn_time = getattr(value, 'spawn_time', None)
+        if spawn_time is not None:
+            self.tracer.add('spawn', start, start + spawn_time, self.tid, file=self.name)
+            start += spawn_time
+        self.tracer.add(stage, start, end, self.tid, file=self.name, **args)
+
+    def close(self, result=None):
+        """บันทึก span ของทั้งงาน (พร้อมสถานะจาก JobResult) และคืน lane"""
+        args = {'file': self.name}
+        if result is not None:
+            args.update(status=result.status, method=result.method)
+        self.tracer.add('job', self.start, time.perf_counter(), self.tid, **args)
+        self.release()
+
+    def release(self):
+        """คืน lane โดยไม่บันทึก span ของทั้งงาน (เช่น probe ตอน pre-scan)"""
+        if self._lane is not None:
+            self.tracer._release_lane(self._lane)
+            self._lane = None
+
+
+class Tracer:
+    """เก็บ span ทั้งหมดของ batch ใน memory (thread-safe) แล้วเขียนเป็นไฟล์ JSON ตอน save()"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.pid = os.getpid()
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._events = []
+        self._durations = collections.defaultdict(list)
+        self._threads = {}
+        self._free_lanes = []
+        self._lanes = 0
+
+    def add(self, stage, start, end, tid=None, **args):
+        """บันทึก span (start/end จาก time.perf_counter) ลง tid ที่ระบุ หรือ thread ปัจจุบัน"""
+        if tid is None:
+            tid = self.thread_id()
+        event = {'name': stage, 'cat': 'stage', 'ph': 'X', 'pid': self.pid, 'tid': tid,
+                 'ts': round((start - self._origin) * 1e6, 1), 'dur': round((end - start) * 1e6, 1)}
+        if args:
+            event['args'] = args
+        with self._lock:
+            self._events.append(event)
+            self._durations[stage].append(end - start)
+
+    def span(self, stage, **args):
+        """context manager สำหรับ span บน thread ปัจจุบัน (เช่น probe ตอน pre-scan)"""
+        return _Span(self, stage, args)
+
+    def thread_id(self):
+        """tid ของ thread ปัจจุบัน (ตั้งชื่อแถวใน trace ตามชื่อ thread)"""
+        thread = threading.current_thread()
+        tid = thread.ident
+        if tid not in self._threads:
+            with self._lock:
+                self._threads[tid] = thread.name
+        return tid
+
+    def job(self, name):
+        """เริ่ม JobTrace บน thread ปัจจุบัน (engine แบบ thread: หนึ่ง worker รันหนึ่งงานต่อครั้ง)"""
+        return JobTrace(self, name, self.thread_id())
+
+    def job_lane(self, name):
+        """เริ่ม JobTrace บน lane ที่ว่างอยู่ (engine แบบ asyncio: ทุกงานอยู่บน thread เดียวกัน)"""
+        with self._lock:
+            if self._free_lanes:
+                lane = min(self._free_lanes)
+                self._free_lanes.remove(lane)
+            else:
+                self._lanes += 1
+                lane = self._lanes
+            # tid ติดลบเพื่อไม่ชนกับ ident ของ thread จริง
+            self._threads[-lane] = f'lane {lane}'
+        return JobTrace(self, name, -lane, lane)
+
+    def _release_lane(self, lane):
+        with self._lock:
+            self._free_lanes.append(lane)
+
+    def histograms(self):
+        """สรุปต่อขั้นตอน {stage: {'count', 'total', 'p50', 'p90', 'max', 'buckets'}} (buckets ตาม HISTOGRAM_BUCKETS + เกินช่องสุดท้าย)"""
+        with self._lock:
+            durations = {stage: sorted(values) for stage, values in self._durations.items()}
+        stats = {}
+        for stage, values in durations.items():
+            buckets = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+            for value in values:
+                index = 0
+                while index < len(HISTOGRAM_BUCKETS) and value > HISTOGRAM_BUCKETS[index]:
+                    index += 1
+                buckets[index] += 1
+            stats[stage] = {
+                'count': len(values), 'total': sum(values), 'max': values[-1],
+                'p50': _percentile(values, 0.5), 'p90': _percentile(values, 0.9), 'buckets': buckets,
+            }
+        return stats
+
+    def save(self):
+        """เขียน trace ลง path (ถ้ากำหนด) คืนค่า histograms()"""
+        if self.path:
+            with self._lock:
+                metadata = [{'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'tid': 0,
+                             'args': {'name': 'video_bitrate_reducer'}}]
+                metadata += [{'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': name}}
+                             for tid, name in self._threads.items()]
+                events = metadata + self._events
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+        return self.histograms()
+
+
+class _Span:
+    __slots__ = ('tracer', 'stage', 'args', 'start')
+
+    def __init__(self, tracer, stage, args):
+        self.tracer = tracer
+        self.stage = stage
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.add(self.stage, self.start, time.perf_counter(), **self.args)
+        return False
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def _format_seconds(seconds):
+    if seconds < 0.01:
+        return f"{seconds * 1000:.1f}ms"
+    if seconds < 1:
+        return f"{seconds * 1000:.0f}ms"
+    return f"{seconds:.1f}s" if seconds < 600 else f"{seconds / 60:.0f}m"
+
+
+def _bucket_label(index):
+    if index < len(HISTOGRAM_BUCKETS):
+        return f"≤{HISTOGRAM_BUCKETS[index]:g}s"
+    return f">{HISTOGRAM_BUCKETS[-1]:g}s"
+
+
+def format_trace_stats(stats):
+    """บรรทัดสรุปของแต่ละขั้นตอนจาก Tracer.histograms() เรียงตาม STAGE_ORDER"""
+    order = {stage: index for index, stage in enumerate(STAGE_ORDER)}
+    lines = []
+    for stage in sorted(stats, key=lambda s: (order.get(s, len(order)), s)):
+        s = stats[stage]
+        buckets = ' '.join(f"{_bucket_label(i)}:{n}" for i, n in enumerate(s['buckets']) if n)
+        lines.append(f"{stage:<9} {s['count']:>5} ครั้ง | รวม {_format_seconds(s['total'])} | p50 {_format_seconds(s['p50'])}"
+                     f" | p90 {_format_seconds(s['p90'])} | max {_format_seconds(s['max'])} | {buckets}")
+    return lines
@@ -0,0 +1,468 @@
+"""Watch-folder daemon: เฝ้าโฟลเดอร์ input แล้วแปลงไฟล์ใหม่อัตโนมัติ
+
+ไฟล์จะเข้าคิวเมื่อขนาดและ mtime ไม่เปลี่ยนนาน --settle วินาที (copy/บันทึกเสร็จแล้ว)
+คิวเก็บใน SQLite ในโฟลเดอร์ output (priority, จำนวนครั้งที่ลอง, error ล่าสุด) จึงทำงานต่อได้หลังโปรแกรมปิด
+
+ตัวอย่าง:
+    python video_watch.py run /mnt/ingest -o /mnt/reduced -w 2 --priority "urgent/*=10" -R
+    python video_watch.py status /mnt/reduced
+    python video_watch.py add /mnt/reduced /mnt/ingest/keynote.mp4 --priority 100
+"""
+import argparse
+import fnmatch
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from typing import Optional
+
+from video_converter_cli import (EXIT_OK, EXIT_SETUP_ERROR, add_encoding_arguments, add_skip_arguments, emit_jsonl,
+                                 emit_text, encoding_settings_from_args, skip_policy_from_args)
+from video_converter_core import (STATUS_CANCELLED, STATUS_FAILED, get_encoder, iter_video_files,
+                                  process_single_video, PROBE_CACHE, QUALITY_CACHE)
+from video_journal import file_fingerprint
+from video_scheduler import ThreadBudget
+
+QUEUE_FILENAME = '.video_reducer_queue.sqlite'
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+# ไฟล์ต้องไม่เปลี่ยนนานกี่วินาทีจึงถือว่าเขียนเสร็จแล้ว
+DEFAULT_SETTLE_SECONDS = 10.0
+# ค้นหาไฟล์ใหม่ทุกกี่วินาที
+DEFAULT_POLL_INTERVAL = 2.0
+# จำนวนครั้งที่ลองแปลงต่อไฟล์ก่อนเลิก
+DEFAULT_MAX_ATTEMPTS = 3
+# รอก่อนลองใหม่ (วินาที × จำนวนครั้งที่ล้มเหลว)
+RETRY_DELAY = 30.0
+# รอ lock ของฐานข้อมูลคิวนานสุดกี่วินาที (เช่น `add`/`status` จาก process อื่นกำลังเขียนอยู่)
+DB_BUSY_TIMEOUT = 5.0
+
+
+@dataclass
+class QueuedJob:
+    input_path: str
+    priority: int = 0
+    attempts: int = 0
+    state: str = JOB_QUEUED
+    error: Optional[str] = None
+    output_path: Optional[str] = None
+
+
+class JobQueue:
+    """คิวงานแบบถาวรใน SQLite: งานที่ priority สูงกว่าออกก่อน ถ้าเท่ากันงานที่เข้าคิวก่อนออกก่อน"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # isolation_level=None = autocommit ทุกคำสั่ง (ใช้ BEGIN IMMEDIATE เองตอน claim)
+        self._db = sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT, check_same_thread=False, isolation_level=None)
+        self._db.execute(f'PRAGMA busy_timeout = {int(DB_BUSY_TIMEOUT * 1000)}')
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''CREATE TABLE IF NOT EXISTS jobs (
+            input_path TEXT PRIMARY KEY,
+            priority INTEGER NOT NULL DEFAULT 0,
+            state TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            fingerprint TEXT,
+            not_before REAL NOT NULL DEFAULT 0,
+            error TEXT,
+            output_path TEXT,
+            created REAL NOT NULL,
+            updated REAL NOT NULL)''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS jobs_order ON jobs (state, priority DESC, created)')
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def enqueue(self, input_path, priority=0):
+        """เพิ่มไฟล์เข้าคิว คืนค่า True ถ้าเป็นงานใหม่ (ไฟล์ที่เคยเข้าคิวแล้วและไม่เปลี่ยนจะไม่ถูกเพิ่มซ้ำ)"""
+        input_path = os.path.abspath(input_path)
+        fingerprint = json.dumps(file_fingerprint(input_path))
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT fingerprint FROM jobs WHERE input_path = ?', (input_path,)).fetchone()
+            if row is not None and row[0] == fingerprint:
+                return False
+            # ไฟล์ใหม่ หรือไฟล์เดิมที่ถูกเขียนทับ → เริ่มนับครั้งที่ลองใหม่
+            self._db.execute('''INSERT OR REPLACE INTO jobs
+                (input_path, priority, state, attempts, fingerprint, not_before, error, output_path, created, updated)
+                VALUES (?, ?, ?, 0, ?, 0, NULL, NULL, ?, ?)''',
+                             (input_path, priority, JOB_QUEUED, fingerprint, now, now))
+            return True
+
+    def set_priority(self, input_path, priority):
+        """เปลี่ยน priority ของงานที่อยู่ในคิว คืนค่า True ถ้าพบงาน"""
+        with self._lock:
+            cursor = self._db.execute('UPDATE jobs SET priority = ?, updated = ? WHERE input_path = ?',
+                                      (priority, time.time(), os.path.abspath(input_path)))
+            return cursor.rowcount > 0
+
+    def claim(self):
+        """หยิบงานถัดไปที่ถึงเวลาแล้วและเปลี่ยนเป็น running หรือคืนค่า None ถ้าคิวว่าง
+
+        ถ้าฐานข้อมูลถูก process อื่น lock ไว้นานเกิน DB_BUSY_TIMEOUT ก็คืนค่า None (worker จะลองใหม่รอบถัดไป)
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                self._db.execute('BEGIN IMMEDIATE')
+                row = self._db.execute('''SELECT input_path, priority, attempts FROM jobs
+                    WHERE state = ? AND not_before <= ? ORDER BY priority DESC, created LIMIT 1''',
+                                       (JOB_QUEUED, now)).fetchone()
+                if row is not None:
+                    self._db.execute('UPDATE jobs SET state = ?, attempts = attempts + 1, updated = ? WHERE input_path = ?',
+                                     (JOB_RUNNING, now, row[0]))
+                self._db.execute('COMMIT')
+            except sqlite3.Error as e:
+                if self._db.in_transaction:
+                    self._db.execute('ROLLBACK')
+                if isinstance(e, sqlite3.OperationalError) and 'locked' in str(e):
+                    return None
+                raise
+        if row is None:
+            return None
+        return QueuedJob(input_path=row[0], priority=row[1], attempts=row[2] + 1, state=JOB_RUNNING)
+
+    def complete(self, input_path, output_path=None):
+        self._update(input_path, state=JOB_DONE, error=None, output_path=output_path)
+
+    def fail(self, input_path, error, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """บันทึกความล้มเหลว: กลับเข้าคิวพร้อมเวลารอ ถ้ายังลองไม่ครบ max_attempts ไม่เช่นนั้นเป็น failed คืนค่าสถานะใหม่"""
+        with self._lock:
+            row = self._db.execute('SELECT attempts FROM jobs WHERE input_path = ?', (input_path,)).fetchone()
+        attempts = row[0] if row else max_attempts
+        if attempts < max_attempts:
+            self._update(input_path, state=JOB_QUEUED, error=error, not_before=time.time() + RETRY_DELAY * attempts)
+            return JOB_QUEUED
+        self._update(input_path, state=JOB_FAILED, error=error)
+        return JOB_FAILED
+
+    def release(self, input_path):
+        """คืนงานที่ถูกยกเลิกกลางคัน (เช่นปิด daemon) กลับเข้าคิวโดยไม่นับเป็นครั้งที่ลอง"""
+        with self._lock:
+            self._db.execute('UPDATE jobs SET state = ?, attempts = MAX(attempts - 1, 0), updated = ? WHERE input_path = ?',
+                             (JOB_QUEUED, time.time(), input_path))
+
+    def recover(self):
+        """งานที่ค้างเป็น running จากรอบก่อน (โปรแกรมปิดกะทันหัน) กลับเข้าคิว คืนค่าจำนวนงาน"""
+        with self._lock:
+            cursor = self._db.execute('UPDATE jobs SET state = ?, attempts = MAX(attempts - 1, 0), updated = ? WHERE state = ?',
+                                      (JOB_QUEUED, time.time(), JOB_RUNNING))
+            return cursor.rowcount
+
+    def counts(self):
+        """จำนวนงานในแต่ละสถานะ"""
+        with self._lock:
+            rows = self._db.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall()
+        counts = {JOB_QUEUED: 0, JOB_RUNNING: 0, JOB_DONE: 0, JOB_FAILED: 0}
+        counts.update(dict(rows))
+        return counts
+
+    def depth(self):
+        """backlog: จำนวนงานที่รอแปลง (รวมงานที่รอลองใหม่)"""
+        return self.counts()[JOB_QUEUED]
+
+    def jobs(self, states=None):
+        """รายการงาน (เรียงตามลำดับที่จะถูกหยิบ)"""
+        query = 'SELECT input_path, priority, attempts, state, error, output_path FROM jobs'
+        params = ()
+        if states:
+            query += f" WHERE state IN ({','.join('?' * len(states))})"
+            params = tuple(states)
+        with self._lock:
+            rows = self._db.execute(query + ' ORDER BY priority DESC, created', params).fetchall()
+        return [QueuedJob(*row) for row in rows]
+
+    def _update(self, input_path, **values):
+        values['updated'] = time.time()
+        columns = ', '.join(f'{key} = ?' for key in values)
+        with self._lock:
+            self._db.execute(f'UPDATE jobs SET {columns} WHERE input_path = ?', tuple(values.values()) + (input_path,))
+
+
+class StabilityTracker:
+    """จำ (size, mtime) ล่าสุดของแต่ละไฟล์ ไฟล์ที่ไม่เปลี่ยนนาน settle_seconds ถือว่าเขียนเสร็จแล้ว"""
+
+    def __init__(self, settle_seconds=DEFAULT_SETTLE_SECONDS, clock=time.monotonic):
+        self.settle_seconds = settle_seconds
+        self.clock = clock
+        self._seen = {}  # path -> [fingerprint, เวลาที่เห็นครั้งแรกหลังเปลี่ยน, รายงานแล้วหรือยัง]
+
+    def update(self, paths):
+        """รับ path ที่พบในรอบนี้ คืนค่า path ที่เพิ่งนิ่งครบ settle_seconds (รายงานครั้งเดียวจนกว่าไฟล์จะเปลี่ยนอีก)"""
+        now = self.clock()
+        stable = []
+        present = set()
+        for path in paths:
+            fingerprint = file_fingerprint(path)
+            if fingerprint is None:
+                continue
+            present.add(path)
+            entry = self._seen.get(path)
+            if entry is None or entry[0] != fingerprint:
+                self._seen[path] = [fingerprint, now, False]
+            elif not entry[2] and now - entry[1] >= self.settle_seconds:
+                entry[2] = True
+                stable.append(path)
+        # ลืมไฟล์ที่ถูกลบหรือย้ายออกไปแล้ว
+        for path in set(self._seen) - present:
+            del self._seen[path]
+        return stable
+
+    @property
+    def settling(self):
+        """จำนวนไฟล์ที่ยังรอให้นิ่ง"""
+        return sum(1 for entry in self._seen.values() if not entry[2])
+
+
+def parse_priority_rules(rules):
+    """แปลง ['urgent/*=10', '*.mov=5'] เป็น [(pattern, priority)] (raise ValueError ถ้ารูปแบบผิด)"""
+    parsed = []
+    for rule in rules or ():
+        pattern, _, value = rule.rpartition('=')
+        if not pattern:
+            raise ValueError(rule)
+        parsed.append((pattern, int(value)))
+    return parsed
+
+
+class WatchDaemon:
+    """เฝ้าโฟลเดอร์ แล้วแปลงไฟล์ที่นิ่งแล้วด้วย process_single_video ตามลำดับในคิว
+
+    ส่ง ("backlog", depth, counts) ทาง message_queue เมื่อจำนวนงานในคิวเปลี่ยน
+    """
+
+    def __init__(self, watch_folder, output_folder, reduction_percent, encoding_settings, message_queue,
+                 stop_event=None, max_workers=2, settle_seconds=DEFAULT_SETTLE_SECONDS,
+                 poll_interval=DEFAULT_POLL_INTERVAL, max_attempts=DEFAULT_MAX_ATTEMPTS, recursive=False,
+                 include=None, exclude=None, priority_rules=None, skip_policy=None, job_queue=None):
+        self.watch_folder = watch_folder
+        self.output_folder = output_folder or os.path.join(watch_folder, 'Output')
+        self.reduction_percent = reduction_percent
+        self.encoding_settings = encoding_settings
+        self.message_queue = message_queue
+        self.stop_event = stop_event or threading.Event()
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.recursive = recursive
+        self.include = include
+        self.exclude = exclude
+        self.priority_rules = priority_rules or []
+        self.skip_policy = skip_policy
+        os.makedirs(self.output_folder, exist_ok=True)
+        self.queue = job_queue or JobQueue(os.path.join(self.output_folder, QUEUE_FILENAME))
+        self.tracker = StabilityTracker(settle_seconds)
+        self._last_counts = None
+
+    def priority_for(self, input_path):
+        """priority จากกฎแรกที่ตรงกับ path สัมพัทธ์หรือชื่อไฟล์ (ไม่ตรงเลย = 0)"""
+        rel_path = os.path.relpath(input_path, self.watch_folder).replace(os.sep, '/')
+        name = os.path.basename(input_path)
+        for pattern, priority in self.priority_rules:
+            if fnmatch.fnmatch(rel_path, pattern) or fnmatch.fnmatch(name, pattern):
+                return priority
+        return 0
+
+    def scan(self):
+        """ค้นหาไฟล์ในโฟลเดอร์ แล้วเพิ่มไฟล์ที่นิ่งแล้วเข้าคิว คืนค่าจำนวนไฟล์ที่เพิ่ม"""
+        paths = [path for path in iter_video_files(self.watch_folder, self.recursive, self.include, self.exclude,
+                                                   skip_dirs=[self.output_folder])
+                 # ข้ามไฟล์ซ่อน (เช่นไฟล์ชั่วคราวของโปรแกรมที่กำลังเขียน)
+                 if not os.path.basename(path).startswith('.')]
+        added = 0
+        for path in self.tracker.update(paths):
+            if self.queue.enqueue(path, self.priority_for(path)):
+                added += 1
+                self.message_queue.put(("text", f"📥 เข้าคิว: {os.path.relpath(path, self.watch_folder)}\n", None))
+        return added
+
+    def report_backlog(self):
+        counts = self.queue.counts()
+        if counts != self._last_counts:
+            self._last_counts = counts
+            self.message_queue.put(("backlog", counts[JOB_QUEUED], counts))
+
+    def run(self):
+        """วนเฝ้าโฟลเดอร์และแปลงไฟล์จนกว่า stop_event จะถูก set"""
+        recovered = self.queue.recover()
+        if recovered:
+            self.message_queue.put(("text", f"รันต่อจากรอบก่อน: {recovered} งานที่ค้างอยู่กลับเข้าคิว\n", None))
+        try:
+            encoder = get_encoder(self.encoding_settings)
+        except FileNotFoundError:
+            self.message_queue.put(("error", "Error", "ไม่พบ FFmpeg/FFprobe! กรุณาติดตั้ง FFmpeg และเพิ่มใน PATH"))
+            return
+        settings = dict(self.encoding_settings, encoder=encoder.codec)
+        self.message_queue.put(("text", f"👀 เฝ้าโฟลเดอร์: {self.watch_folder} → {self.output_folder} "
+                                        f"(พร้อมกัน {self.max_workers} งาน, Encoder: {encoder.codec})\n", None))
+
+        budget = ThreadBudget(slots=self.max_workers)
+        futures = {}
+        next_scan = 0.0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while not self.stop_event.is_set() or futures:
+                now = time.monotonic()
+                if not self.stop_event.is_set() and now >= next_scan:
+                    self.scan()
+                    next_scan = now + self.poll_interval
+                while not self.stop_event.is_set() and len(futures) < self.max_workers:
+                    job = self.queue.claim()
+                    if job is None:
+                        break
+                    future = executor.submit(process_single_video, job.input_path, self.output_folder,
+                                             self.reduction_percent, self.message_queue, self.stop_event, settings,
+                                             None, None, self.skip_policy, None, self.watch_folder, executor, budget)
+                    futures[future] = job
+                self.report_backlog()
+                if not futures:
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+                done, _ = wait(futures, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._record(futures.pop(future), future.result())
+                # cache ของ ffprobe/คุณภาพ ใช้ร่วมกับการรันครั้งถัดไป
+                if done:
+                    PROBE_CACHE.save()
+                    QUALITY_CACHE.save()
+        self.report_backlog()
+
+    def _record(self, job, result):
+        if result.status == STATUS_CANCELLED:
+            self.queue.release(job.input_path)
+        elif result.status == STATUS_FAILED:
+            error = result.error_tail or result.message
+            state = self.queue.fail(job.input_path, error, self.max_attempts)
+            if state == JOB_QUEUED:
+                self.message_queue.put(("text", f"{result} (จะลองใหม่ ครั้งที่ {job.attempts + 1}/{self.max_attempts})\n", None))
+                return
+        else:
+            # สำเร็จหรือข้าม (เช่น output ใหม่กว่าอยู่แล้ว) ไม่ต้องแปลงซ้ำจนกว่าไฟล์จะเปลี่ยน
+            self.queue.complete(job.input_path, result.output_path)
+        self.message_queue.put(("text", f"{result}\n", None))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="เฝ้าโฟลเดอร์แล้วลด Bitrate ของไฟล์วิดีโอใหม่อัตโนมัติ")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help="เฝ้าโฟลเดอร์และแปลงไฟล์จนกว่าจะกด Ctrl+C")
+    run.add_argument('input', help="โฟลเดอร์ที่เฝ้า")
+    run.add_argument('-o', '--output', default='', help="โฟลเดอร์ output (ค่าเริ่มต้น: <input>/Output) คิวถูกเก็บไว้ที่นี่")
+    run.add_argument('-w', '--workers', type=int, default=2, help="จำนวนไฟล์ที่แปลงพร้อมกัน (ค่าเริ่มต้น 2)")
+    run.add_argument('--settle', type=float, default=DEFAULT_SETTLE_SECONDS, help="ไฟล์ต้องไม่เปลี่ยนนานกี่วินาทีก่อนเข้าคิว")
+    run.add_argument('--poll', type=float, default=DEFAULT_POLL_INTERVAL, help="ค้นหาไฟล์ใหม่ทุกกี่วินาที")
+    run.add_argument('--retries', type=int, default=DEFAULT_MAX_ATTEMPTS, help="จำนวนครั้งที่ลองแปลงต่อไฟล์")
+    run.add_argument('--priority', action='append', default=None, metavar='GLOB=N', help="priority ของไฟล์ที่ตรงกับ pattern (ระบุได้หลายครั้ง, ค่ามากทำก่อน)")
+    run.add_argument('-R', '--recursive', action='store_true', help="เฝ้าโฟลเดอร์ย่อยด้วย")
+    run.add_argument('--include', action='append', default=None, metavar='GLOB', help="เฉพาะไฟล์ที่ตรงกับ pattern")
+    run.add_argument('--exclude', action='append', default=None, metavar='GLOB', help="ไม่รวมไฟล์ที่ตรงกับ pattern")
+    run.add_argument('--format', choices=['text', 'jsonl'], default='text', help="รูปแบบการแสดงผล")
+    add_encoding_arguments(run)
+    add_skip_arguments(run)
+
+    status = sub.add_parser('status', help="แสดงจำนวนงานในคิว")
+    status.add_argument('output', help="โฟลเดอร์ output ของ daemon")
+    status.add_argument('--list', action='store_true', help="แสดงรายการงานที่รอ/ล้มเหลว")
+    status.add_argument('--json', action='store_true', help="แสดงผลเป็น JSON")
+
+    add = sub.add_parser('add', help="เพิ่มไฟล์เข้าคิว (หรือเปลี่ยน priority)")
+    add.add_argument('output', help="โฟลเดอร์ output ของ daemon")
+    add.add_argument('files', nargs='+', help="ไฟล์วิดีโอ")
+    add.add_argument('--priority', type=int, default=0, help="ค่ามากทำก่อน")
+    return parser
+
+
+def run_daemon(args):
+    encoding_settings = encoding_settings_from_args(args)
+    if encoding_settings is None:
+        sys.stderr.write(f"ไม่รู้จัก preset: {args.preset}\n")
+        return EXIT_SETUP_ERROR
+    if not 0 < args.reduction < 100:
+        sys.stderr.write("--reduction ต้องอยู่ระหว่าง 1-99\n")
+        return EXIT_SETUP_ERROR
+    if not os.path.isdir(args.input):
+        sys.stderr.write(f"ไม่พบโฟลเดอร์: {args.input}\n")
+        return EXIT_SETUP_ERROR
+    try:
+        priority_rules = parse_priority_rules(args.priority)
+    except ValueError as e:
+        sys.stderr.write(f"--priority ต้องอยู่ในรูป GLOB=N: {e}\n")
+        return EXIT_SETUP_ERROR
+
+    message_queue = queue.Queue()
+    stop_event = threading.Event()
+    daemon = WatchDaemon(args.input, args.output, args.reduction, encoding_settings, message_queue, stop_event,
+                         max_workers=args.workers, settle_seconds=args.settle, poll_interval=args.poll,
+                         max_attempts=args.retries, recursive=args.recursive, include=args.include,
+                         exclude=args.exclude, priority_rules=priority_rules,
+                         skip_policy=skip_policy_from_args(args))
+    worker = threading.Thread(target=daemon.run, daemon=True)
+    worker.start()
+
+    text_state = {}
+    while True:
+        try:
+            msg_type, title, message = message_queue.get(timeout=0.5)
+        except queue.Empty:
+            if not worker.is_alive():
+                break
+            continue
+        except KeyboardInterrupt:
+            # Ctrl+C: หยุดรับงานใหม่ งานที่กำลังแปลงจะถูกยกเลิกและกลับเข้าคิว
+            stop_event.set()
+            sys.stderr.write("\nกำลังหยุด daemon...\n")
+            continue
+        if args.format == 'jsonl':
+            emit_jsonl(msg_type, title, message, sys.stdout)
+        else:
+            emit_text(msg_type, title, message, sys.stdout, text_state)
+    daemon.queue.close()
+    return EXIT_OK
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == 'run':
+        return run_daemon(args)
+
+    queue_path = os.path.join(args.output, QUEUE_FILENAME)
+    if not os.path.exists(queue_path):
+        sys.stderr.write(f"ไม่พบคิวใน: {args.output}\n")
+        return EXIT_SETUP_ERROR
+    job_queue = JobQueue(queue_path)
+    try:
+        if args.command == 'add':
+            for path in args.files:
+                if not job_queue.enqueue(path, args.priority):
+                    job_queue.set_priority(path, args.priority)
+            print(f"backlog: {job_queue.depth()}")
+        else:
+            counts = job_queue.counts()
+            jobs = job_queue.jobs([JOB_QUEUED, JOB_RUNNING, JOB_FAILED]) if args.list else []
+            if args.json:
+                print(json.dumps({'backlog': counts[JOB_QUEUED], 'counts': counts,
+                                  'jobs': [job.__dict__ for job in jobs]}, ensure_ascii=False))
+            else:
+                print(f"backlog: {counts[JOB_QUEUED]} | running {counts[JOB_RUNNING]} | done {counts[JOB_DONE]} | failed {counts[JOB_FAILED]}")
+                for job in jobs:
+                    error = (job.error or '').strip().splitlines()
+                    print(f"  [{job.state}] p={job.priority} attempts={job.attempts} {job.input_path}"
+                          + (f" - {error[-1]}" if error else ''))
+    finally:
+        job_queue.close()
+    return EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())